@@ -0,0 +1,81 @@
+"""
+Measure the overhead that ArrayWithUnits adds to common operations on small,
+frame-sized arrays, such as those processed chunk-by-chunk in a processing
+graph.
+
+Each operation is timed three ways:
+
+    - fast: with cached slicing plans, and dimensions shared between arrays
+    - old: with both of those optimizations disabled, so that every index
+      is translated and every dimension is copied and validated by the
+      constructor.  Other parts of the tree have been sped up since, so this
+      isolates the effect of those two optimizations, rather than
+      reproducing the original timings exactly
+    - numpy: the same operation on a plain numpy array
+"""
+
+from contextlib import contextmanager
+import timeit
+import numpy as np
+from zounds import \
+    ArrayWithUnits, TimeDimension, FrequencyDimension, LinearScale, \
+    FrequencyBand, Milliseconds, TimeSlice
+from zounds.core import axis
+
+
+def microseconds_per_call(stmt, number=20000, repeat=5):
+    times = timeit.repeat(stmt, number=number, repeat=repeat)
+    return min(times) / number * 1e6
+
+
+@contextmanager
+def old_path():
+    """
+    Disable the slicing-plan cache, and route internal construction through
+    the validating constructor
+    """
+    slicing_plan_key = axis._slicing_plan_key
+    with_dimensions = ArrayWithUnits.__dict__['_with_dimensions']
+
+    def construct(cls, arr, dimensions):
+        return ArrayWithUnits.__new__(cls, arr, dimensions)
+
+    axis._slicing_plan_key = lambda index, arr: None
+    ArrayWithUnits._with_dimensions = classmethod(construct)
+    try:
+        yield
+    finally:
+        axis._slicing_plan_key = slicing_plan_key
+        ArrayWithUnits._with_dimensions = with_dimensions
+
+
+if __name__ == '__main__':
+    scale = LinearScale(FrequencyBand(20, 10000), 64)
+    raw = np.zeros((32, 64))
+    arr = ArrayWithUnits(raw, [
+        TimeDimension(Milliseconds(10), Milliseconds(20)),
+        FrequencyDimension(scale)])
+    other = arr.copy()
+    ts = TimeSlice(start=Milliseconds(50), duration=Milliseconds(100))
+
+    cases = [
+        ('construct', lambda: ArrayWithUnits(raw, arr.dimensions), None),
+        ('arr[2:10]', lambda: arr[2:10], lambda: raw[2:10]),
+        ('arr[5]', lambda: arr[5], lambda: raw[5]),
+        ('arr[:, 4:8]', lambda: arr[:, 4:8], lambda: raw[:, 4:8]),
+        ('arr[ts]', lambda: arr[ts], None),
+        ('concatenate', lambda: arr.concatenate(other),
+         lambda: np.concatenate([raw, raw])),
+        ('sum(axis=1)', lambda: arr.sum(axis=1), lambda: raw.sum(axis=1)),
+    ]
+
+    print('operation\tfast (us)\told (us)\tspeedup\tnumpy (us)')
+    for name, awu_func, np_func in cases:
+        fast = microseconds_per_call(awu_func)
+        with old_path():
+            old = microseconds_per_call(awu_func)
+        speedup = old / fast
+        numpy = microseconds_per_call(np_func) if np_func else float('nan')
+        print(
+            '{name:12s}\t{fast:.2f}\t\t{old:.2f}\t\t{speedup:.2f}x\t{numpy:.2f}'
+                .format(**locals()))
@@ -0,0 +1,47 @@
+"""
+Compare the recall and speed of HNSW search against an exact, brute-force
+search, over a synthetic corpus of real-valued features.
+
+Queries are frames from the corpus, perturbed with noise, so that their exact
+neighbors aren't trivially themselves.
+
+Larger values of `M` build a denser graph, more slowly, while larger values
+of `ef` trade search speed for recall, and may be changed without
+rebuilding the graph.
+"""
+
+from zounds.index import HNSWSearch, BruteForceSearch
+from zounds.index.benchmark import synthetic_real_corpus, benchmark
+import numpy as np
+import time
+
+if __name__ == '__main__':
+    corpus = list(synthetic_real_corpus(
+        n_documents=50,
+        frames_per_document=200,
+        n_dims=32,
+        n_clusters=500,
+        noise=0.2,
+        seed=0))
+
+    baseline = BruteForceSearch(iter(corpus))
+    rng = np.random.RandomState(1)
+    frames = baseline.index[rng.randint(0, len(baseline.index), 200)]
+    queries = frames + rng.normal(0, 0.2, frames.shape)
+
+    print('M\tbuild (s)\tef\trecall@10\tqps\tbaseline qps')
+    for M in [8, 16]:
+        start = time.time()
+        index = HNSWSearch(iter(corpus), M=M, ef_construction=100, seed=0)
+        build_time = time.time() - start
+        for ef in [10, 25, 50, 100]:
+            index.ef = ef
+            result, baseline_result = benchmark(index, baseline, queries, k=10)
+            print('{M}\t{build_time:.1f}\t\t{ef}\t{recall:.3f}\t\t{qps:.1f}'
+                  '\t{baseline_qps:.1f}'.format(
+                M=M,
+                build_time=build_time,
+                ef=ef,
+                recall=result.recall,
+                qps=result.queries_per_second,
+                baseline_qps=baseline_result.queries_per_second))
@@ -0,0 +1,41 @@
+"""
+Compare the recall and speed of multi-probe LSH search against an exact,
+brute-force search, over a synthetic corpus of binary codes.
+
+Increasing the probe radius, or the number of tables, trades speed for
+recall.
+"""
+
+from zounds.index import MultiProbeLSHSearch, HammingDistanceBruteForceSearch
+from zounds.index.benchmark import synthetic_binary_corpus, benchmark
+from random import choice
+
+if __name__ == '__main__':
+    corpus = list(synthetic_binary_corpus(
+        n_documents=200,
+        frames_per_document=500,
+        n_bits=128,
+        n_clusters=1000,
+        noise=0.05,
+        seed=0))
+
+    baseline = HammingDistanceBruteForceSearch(iter(corpus))
+    queries = [choice(baseline.index) for _ in range(200)]
+
+    print('tables\tradius\trecall@10\tqps\tbaseline qps')
+    for n_tables in [4, 8, 16]:
+        for probe_radius in [0, 1, 2]:
+            index = MultiProbeLSHSearch(
+                iter(corpus),
+                n_tables=n_tables,
+                bits_per_table=20,
+                probe_radius=probe_radius,
+                seed=0)
+            result, baseline_result = benchmark(index, baseline, queries, k=10)
+            print('{n_tables}\t{probe_radius}\t{recall:.3f}\t\t{qps:.1f}'
+                  '\t{baseline_qps:.1f}'.format(
+                n_tables=n_tables,
+                probe_radius=probe_radius,
+                recall=result.recall,
+                qps=result.queries_per_second,
+                baseline_qps=baseline_result.queries_per_second))
@@ -42,7 +42,21 @@ if not on_rtd:
                 '-Wall',
                 '-fno-strict-aliasing'
             ])
-        extension_modules = [countbits]
+        hnswgraph = Extension(
+            name='hnswgraph',
+            sources=['zounds/index/hnswgraph.pyx'],
+            include_dirs=[np.get_include()],
+            extra_compile_args=[
+                '-c',
+                '-shared',
+                '-pthread',
+                '-fPIC',
+                '-fwrapv',
+                '-O3',
+                '-Wall',
+                '-fno-strict-aliasing'
+            ])
+        extension_modules = [countbits, hnswgraph]
     except ImportError:
         extension_modules = []
 
@@ -91,6 +105,7 @@ setup(
     ],
     package_data={
         'nputil': ['*.pyx', '*.pyxbld'],
+        'index': ['*.pyx', '*.pyxbld'],
         'ui': ['*.html', '*.js']
     },
     scripts=['bin/zounds-quickstart'],
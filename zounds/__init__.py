@@ -52,7 +52,8 @@ from .ui import \
 
 from .index import \
     SearchResults, HammingDb, HammingIndex, BruteForceSearch, \
-    HammingDistanceBruteForceSearch
+    HammingDistanceBruteForceSearch, ProductQuantizationSearch, \
+    MultiProbeLSHSearch, HNSWSearch, HNSWIndex
 
 from .basic import \
     Slice, Sum, Max, Pooled, process_dir, stft, audio_graph, with_onsets, \
@@ -4,7 +4,7 @@ import numpy as np
 from featureflow import Node, NotEnoughData
 
 from zounds.timeseries import VariableRateTimeSeries
-from zounds.core import ArrayWithUnits
+from zounds.core import ArrayWithUnits, ArrayWithUnitsBuffer
 
 
 class Merge(Node):
@@ -18,24 +18,18 @@ class Merge(Node):
         if len(needs) < 2:
             raise ValueError(exc_msg)
 
-        self._cache = OrderedDict((id(n), None) for n in list(needs.values()))
+        self._cache = OrderedDict(
+            (id(n), ArrayWithUnitsBuffer()) for n in list(needs.values()))
 
     def _enqueue(self, data, pusher):
-        key = id(pusher)
-        if self._cache[key] is None or self._cache[key].size == 0:
-            self._cache[key] = data
-        else:
-            self._cache[key] = self._cache[key].concatenate(data)
+        self._cache[id(pusher)].append(data)
 
     def _dequeue(self):
-        if any(v is None or len(v) == 0 for v in self._cache.values()):
+        if any(len(v) == 0 for v in self._cache.values()):
             raise NotEnoughData()
         shortest = min(len(v) for v in self._cache.values())
-        output = OrderedDict(
-            (k, v[:shortest]) for k, v in self._cache.items())
-        self._cache = OrderedDict(
-            (k, v[shortest:]) for k, v in self._cache.items())
-        return output
+        return OrderedDict(
+            (k, v.take(shortest)) for k, v in self._cache.items())
 
     def _process(self, data):
         yield ArrayWithUnits.concat(list(data.values()), axis=1)
@@ -45,23 +39,20 @@ class Pooled(Node):
     def __init__(self, op=None, axis=None, needs=None):
         super(Pooled, self).__init__(needs=needs)
         self._timeslices = VariableRateTimeSeries(())
-        self._timeseries = None
+        self._timeseries = ArrayWithUnitsBuffer()
         self._op = op
         self._axis = axis
 
     def _enqueue(self, data, pusher):
         if isinstance(data, ArrayWithUnits):
-            try:
-                self._timeseries = self._timeseries.concatenate(data)
-            except AttributeError:
-                self._timeseries = data
+            self._timeseries.append(data)
         else:
             self._timeslices = self._timeslices.concat(data)
 
     def _dequeue(self):
         if not self._finalized:
             raise NotEnoughData()
-        return self._timeslices, self._timeseries
+        return self._timeslices, self._timeseries.contiguous()
 
     def _process(self, data):
         slices, series = data
@@ -7,5 +7,7 @@ base class for custom, user-defined dimensions.
 
 from .dimensions import Dimension, IdentityDimension
 from .axis import ArrayWithUnits
+from .buffer import ArrayWithUnitsBuffer
 
-__all__ = [Dimension, IdentityDimension, ArrayWithUnits]
+__all__ = [
+    Dimension, IdentityDimension, ArrayWithUnits, ArrayWithUnitsBuffer]
@@ -9,6 +9,34 @@ class CustomSlice(object):
         super(CustomSlice, self).__init__()
 
 
+# the dimensions produced by indexing with a given combination of integers and
+# integer slices, keyed by that index, along with the shape and dimensions of
+# the indexed array.  Each entry also holds on to the indexed array's
+# dimensions, so that the ids used as part of its key can't be re-used
+_slicing_plans = {}
+_max_slicing_plans = 1024
+
+
+def _slicing_plan_key(index, arr):
+    """
+    Produce a hashable key for index, if it contains only integers, integer
+    slices, None and Ellipsis, or None otherwise
+    """
+    key = []
+    for sl in index:
+        t = type(sl)
+        if t is int or sl is None or sl is Ellipsis:
+            key.append(sl)
+        elif t is slice \
+                and (sl.start is None or type(sl.start) is int) \
+                and (sl.stop is None or type(sl.stop) is int) \
+                and (sl.step is None or type(sl.step) is int):
+            key.append((sl.start, sl.stop, sl.step))
+        else:
+            return None
+    return tuple(key), arr.shape, tuple(id(d) for d in arr.dimensions)
+
+
 class ArrayWithUnits(np.ndarray):
     """
     `ArrayWithUnits` is an :class:`numpy.ndarray` subclass that allows for
@@ -48,24 +76,49 @@ class ArrayWithUnits(np.ndarray):
                 'They were {arr.shape} and {dimensions}'.format(**locals()))
 
         obj = np.asarray(arr).view(cls)
-        obj.dimensions = tuple([IdentityDimension() if d is None else d.copy() for d in dimensions])
+        obj.dimensions = tuple(
+            cls._sized_dimension(d, size)
+            for d, size in zip(dimensions, obj.shape))
+        return obj
 
-        for dim, size in zip(obj.dimensions, obj.shape):
-            try:
-                dim.size = size
-            except AttributeError:
-                pass
-            try:
-                dim.validate(size)
-            except AttributeError:
-                pass
+    @staticmethod
+    def _sized_dimension(dim, size):
+        dim = IdentityDimension() if dim is None else dim.copy()
+        try:
+            dim.size = size
+        except AttributeError:
+            pass
+        try:
+            dim.validate(size)
+        except AttributeError:
+            pass
+        return dim
 
+    @classmethod
+    def _with_dimensions(cls, arr, dimensions):
+        """
+        A faster alternative to the constructor, for internal use when
+        `dimensions` belong to existing instances.  Dimensions are never
+        modified once assigned to an instance, so those whose size already
+        matches `arr` are shared, rather than copied and validated again
+        """
+        obj = np.asarray(arr).view(cls)
+        if obj.ndim != len(dimensions):
+            raise ValueError(
+                'arr.ndim and len(dimensions) must match.  '
+                'They were {shape} and {dimensions}'.format(
+                    shape=obj.shape, dimensions=dimensions))
+
+        obj.dimensions = tuple(
+            d if d is not None and getattr(d, 'size', None) == size
+            else cls._sized_dimension(d, size)
+            for d, size in zip(dimensions, obj.shape))
         return obj
 
     @property
     def T(self):
         arr = super(ArrayWithUnits, self).T
-        return ArrayWithUnits(arr, self.dimensions[::-1])
+        return ArrayWithUnits._with_dimensions(arr, self.dimensions[::-1])
 
     def kwargs(self):
         return self.__dict__
@@ -100,7 +153,7 @@ class ArrayWithUnits(np.ndarray):
 
     def squeeze(self):
         zipped = [x for x in zip(self.shape, self.dimensions) if x[0] > 1]
-        return ArrayWithUnits(
+        return ArrayWithUnits._with_dimensions(
             super().reshape([s for s, _ in zipped]),
             [d for _, d in zipped])
 
@@ -117,7 +170,7 @@ class ArrayWithUnits(np.ndarray):
         Produce a new :class:`ArrayWithUnits` instance given some raw data and
         an example instance that has the desired dimensions
         """
-        return ArrayWithUnits(data, example.dimensions)
+        return ArrayWithUnits._with_dimensions(data, example.dimensions)
 
     @classmethod
     def zeros(cls, example):
@@ -143,7 +196,7 @@ class ArrayWithUnits(np.ndarray):
             remaining_axes = sorted(all_axes - reduced_axes)
             new_dims = [self.dimensions[i] for i in remaining_axes]
 
-        return ArrayWithUnits(result, new_dims)
+        return ArrayWithUnits._with_dimensions(result, new_dims)
 
     def sum(self, axis=None, dtype=None, keepdims=False, **kwargs):
         result = super(ArrayWithUnits, self).sum(
@@ -329,8 +382,28 @@ class ArrayWithUnits(np.ndarray):
         if self.ndim == 1 and isinstance(index, int):
             return np.asarray(self)[index]
 
-        index = self._tuplify(index)
-        indices = tuple(self._compute_indices(index))
-        arr = super(ArrayWithUnits, self).__getitem__(indices)
-        new_dims = tuple(self._new_dims(index, arr))
-        return ArrayWithUnits(arr, new_dims)
+        if type(index) is not tuple and type(index) is not list:
+            index = index,
+        else:
+            # a list of slices is treated as one slice per dimension, which
+            # numpy only accepts as a tuple
+            index = tuple(self._tuplify(index))
+
+        key = _slicing_plan_key(index, self)
+        if key is None:
+            indices = tuple(self._compute_indices(index))
+            arr = super(ArrayWithUnits, self).__getitem__(indices)
+            new_dims = tuple(self._new_dims(index, arr))
+            return ArrayWithUnits._with_dimensions(arr, new_dims)
+
+        # integers and integer slices are passed along to numpy unchanged, and
+        # the dimensions they produce only need to be computed once
+        arr = super(ArrayWithUnits, self).__getitem__(index)
+        try:
+            _, new_dims = _slicing_plans[key]
+        except KeyError:
+            new_dims = tuple(self._new_dims(index, arr))
+            if len(_slicing_plans) >= _max_slicing_plans:
+                _slicing_plans.clear()
+            _slicing_plans[key] = (self.dimensions, new_dims)
+        return ArrayWithUnits._with_dimensions(arr, new_dims)
@@ -0,0 +1,128 @@
+from collections import deque
+import numpy as np
+
+
+class ArrayWithUnitsBuffer(object):
+    """
+    Accumulates :class:`ArrayWithUnits` chunks along their first axis, deferring
+    concatenation until a contiguous array is actually requested.
+
+    Processing nodes that repeatedly call :meth:`ArrayWithUnits.concatenate` on
+    a growing cache copy everything they've seen so far for each new chunk.
+    Here, chunks are only concatenated (once) when :meth:`contiguous` is called,
+    and consuming frames from the front of the buffer never copies anything.
+
+    Examples:
+        >>> from zounds import ArrayWithUnits, IdentityDimension
+        >>> from zounds.core.buffer import ArrayWithUnitsBuffer
+        >>> import numpy as np
+        >>> buf = ArrayWithUnitsBuffer()
+        >>> dims = [IdentityDimension()]
+        >>> buf.append(ArrayWithUnits(np.arange(3), dims))
+        >>> buf.append(ArrayWithUnits(np.arange(3, 5), dims))
+        >>> len(buf)
+        5
+        >>> buf.take(4)
+        ArrayWithUnits([0, 1, 2, 3], dtype=int64)
+        >>> len(buf)
+        1
+    """
+
+    def __init__(self):
+        super(ArrayWithUnitsBuffer, self).__init__()
+        self._chunks = deque()
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def dimensions(self):
+        try:
+            return self._chunks[0].dimensions
+        except IndexError:
+            return None
+
+    def append(self, data):
+        """
+        Add a chunk to the end of the buffer
+
+        Args:
+            data (ArrayWithUnits): the new chunk, whose dimensions must match
+                those of chunks already in the buffer
+
+        Raises:
+            ValueError: when dimensions don't match those of chunks already in
+                the buffer
+        """
+        if self._chunks and data.dimensions != self._chunks[0].dimensions:
+            raise ValueError('All dimensions must match to concatenate')
+        self._chunks.append(data)
+        self._length += len(data)
+
+    def contiguous(self):
+        """
+        Concatenate all chunks in the buffer, returning a single
+        :class:`ArrayWithUnits`, or `None` if nothing has been appended.  The
+        concatenated array replaces the chunks, so calling this repeatedly
+        without appending does no further copying
+        """
+        if not self._chunks:
+            return None
+        if len(self._chunks) > 1:
+            example = self._chunks[0]
+            arr = example.from_example(
+                np.concatenate(list(self._chunks)), example)
+            self._chunks = deque([arr])
+        return self._chunks[0]
+
+    def consume(self, n):
+        """
+        Discard the first `n` frames from the buffer, without copying
+
+        Args:
+            n (int): the number of frames to discard
+        """
+        if n < 0:
+            raise ValueError('n must be non-negative, but was {n}'.format(n=n))
+
+        n = min(n, self._length)
+        self._length -= n
+        while n:
+            first = self._chunks[0]
+            if n >= len(first):
+                self._chunks.popleft()
+                n -= len(first)
+            else:
+                self._chunks[0] = first[n:]
+                n = 0
+
+    def take(self, n):
+        """
+        Remove and return the first `n` frames as a single, contiguous
+        :class:`ArrayWithUnits`.  Only the chunks spanned by those frames are
+        concatenated.  Returns `None` if nothing has been appended.
+
+        Args:
+            n (int): the number of frames to return
+        """
+        if n < 0:
+            raise ValueError('n must be non-negative, but was {n}'.format(n=n))
+        if not self._chunks:
+            return None
+
+        n = min(n, self._length)
+        first = self._chunks[0]
+        if n <= len(first):
+            result = first[:n]
+        else:
+            spanned = []
+            remaining = n
+            for chunk in self._chunks:
+                spanned.append(chunk[:remaining])
+                remaining -= len(spanned[-1])
+                if not remaining:
+                    break
+            result = first.from_example(np.concatenate(spanned), first)
+        self.consume(n)
+        return result
@@ -0,0 +1,125 @@
+import unittest2
+import numpy as np
+from .buffer import ArrayWithUnitsBuffer
+from .axis import ArrayWithUnits
+from .dimensions import IdentityDimension
+from zounds.timeseries import \
+    TimeDimension, Seconds, AudioSamples, SR11025, TimeSlice
+
+
+class ArrayWithUnitsBufferTests(unittest2.TestCase):
+    def setUp(self):
+        self.buffer = ArrayWithUnitsBuffer()
+        self.raw = np.random.random_sample((100, 3))
+        self.td = TimeDimension(Seconds(1))
+
+    def _append(self, start, stop):
+        arr = ArrayWithUnits(
+            self.raw[start:stop], [self.td, IdentityDimension()])
+        self.buffer.append(arr)
+        return arr
+
+    def test_empty_buffer(self):
+        self.assertEqual(0, len(self.buffer))
+        self.assertIsNone(self.buffer.dimensions)
+        self.assertIsNone(self.buffer.contiguous())
+        self.assertIsNone(self.buffer.take(10))
+
+    def test_length_is_total_of_all_chunks(self):
+        self._append(0, 10)
+        self._append(10, 25)
+        self.assertEqual(25, len(self.buffer))
+
+    def test_raises_when_dimensions_do_not_match(self):
+        self._append(0, 10)
+        arr = ArrayWithUnits(
+            self.raw[10:20], [TimeDimension(Seconds(2)), IdentityDimension()])
+        self.assertRaises(ValueError, lambda: self.buffer.append(arr))
+
+    def test_contiguous_concatenates_all_chunks(self):
+        self._append(0, 10)
+        self._append(10, 25)
+        self._append(25, 30)
+        result = self.buffer.contiguous()
+        self.assertIsInstance(result, ArrayWithUnits)
+        self.assertIsInstance(result.dimensions[0], TimeDimension)
+        np.testing.assert_array_equal(self.raw[:30], result)
+        self.assertEqual(30, result.dimensions[0].size)
+
+    def test_contiguous_does_not_copy_a_single_chunk(self):
+        arr = self._append(0, 10)
+        self.assertIs(arr, self.buffer.contiguous())
+
+    def test_contiguous_does_not_copy_twice(self):
+        self._append(0, 10)
+        self._append(10, 25)
+        self.assertIs(self.buffer.contiguous(), self.buffer.contiguous())
+
+    def test_consume_within_first_chunk(self):
+        self._append(0, 10)
+        self._append(10, 25)
+        self.buffer.consume(4)
+        self.assertEqual(21, len(self.buffer))
+        np.testing.assert_array_equal(
+            self.raw[4:25], self.buffer.contiguous())
+
+    def test_consume_across_chunks(self):
+        self._append(0, 10)
+        self._append(10, 25)
+        self._append(25, 30)
+        self.buffer.consume(12)
+        self.assertEqual(18, len(self.buffer))
+        np.testing.assert_array_equal(
+            self.raw[12:30], self.buffer.contiguous())
+
+    def test_consume_everything(self):
+        self._append(0, 10)
+        self._append(10, 25)
+        self.buffer.consume(100)
+        self.assertEqual(0, len(self.buffer))
+        self._append(25, 30)
+        np.testing.assert_array_equal(
+            self.raw[25:30], self.buffer.contiguous())
+
+    def test_consume_raises_for_negative_count(self):
+        self.assertRaises(ValueError, lambda: self.buffer.consume(-1))
+
+    def test_take_from_first_chunk(self):
+        self._append(0, 10)
+        self._append(10, 25)
+        result = self.buffer.take(5)
+        np.testing.assert_array_equal(self.raw[:5], result)
+        self.assertEqual(20, len(self.buffer))
+
+    def test_take_across_chunks(self):
+        self._append(0, 10)
+        self._append(10, 25)
+        self._append(25, 30)
+        self.buffer.take(3)
+        result = self.buffer.take(24)
+        self.assertIsInstance(result.dimensions[0], TimeDimension)
+        np.testing.assert_array_equal(self.raw[3:27], result)
+        np.testing.assert_array_equal(
+            self.raw[27:30], self.buffer.contiguous())
+
+    def test_take_more_than_buffered(self):
+        self._append(0, 10)
+        result = self.buffer.take(20)
+        np.testing.assert_array_equal(self.raw[:10], result)
+        self.assertEqual(0, len(self.buffer))
+
+    def test_taken_frames_retain_time_dimension(self):
+        self._append(0, 10)
+        self._append(10, 25)
+        self.buffer.take(10)
+        result = self.buffer.take(10)
+        np.testing.assert_array_equal(
+            self.raw[12:14], result[TimeSlice(Seconds(2), Seconds(2))])
+
+    def test_preserves_audio_samples(self):
+        samples = AudioSamples(np.zeros(100), SR11025())
+        self.buffer.append(samples)
+        self.buffer.append(samples)
+        result = self.buffer.contiguous()
+        self.assertIsInstance(result, AudioSamples)
+        self.assertEqual(200, len(result))
@@ -732,3 +732,58 @@ class CoreTests(unittest2.TestCase):
         self.assertIsInstance(new_arr.dimensions[0], IdentityDimension)
         self.assertIsInstance(new_arr.dimensions[1], IdentityDimension)
         self.assertIsInstance(new_arr.dimensions[2], IdentityDimension)
+
+    def test_slicing_shares_unchanged_dimensions(self):
+        arr = ArrayWithUnits(
+            np.zeros((10, 10)), (IdentityDimension(), IdentityDimension()))
+        sliced = arr[2:5]
+        self.assertIsNot(arr.dimensions[0], sliced.dimensions[0])
+        self.assertIs(arr.dimensions[1], sliced.dimensions[1])
+
+    def test_repeated_slicing_produces_same_dimensions(self):
+        raw = np.random.random_sample((10, 10))
+        arr = ArrayWithUnits(raw, (ContrivedDimension(10), None))
+        first = arr[2:5, 3]
+        second = arr[2:5, 3]
+        np.testing.assert_array_equal(raw[2:5, 3], second)
+        self.assertEqual(first.dimensions, second.dimensions)
+        self.assertIsInstance(second.dimensions[0], ContrivedDimension)
+
+    def test_repeated_slicing_of_different_shapes(self):
+        dims = (IdentityDimension(), IdentityDimension())
+        arr = ArrayWithUnits(np.zeros((10, 10)), dims)
+        self.assertEqual((3, 10), arr[2:5].shape)
+        arr = ArrayWithUnits(np.zeros((4, 10)), dims)
+        sliced = arr[2:5]
+        self.assertEqual((2, 10), sliced.shape)
+        self.assertEqual(2, sliced.dimensions[0].size)
+
+    def test_custom_slices_are_not_affected_by_repeated_integer_slices(self):
+        arr = ContrivedArray(
+            np.zeros((10, 10)), (ContrivedDimension(10), None))
+        arr[2:5]
+        self.assertEqual((2, 10), arr[ContrivedSlice(0, 20)].shape)
+        arr[2:5]
+        self.assertEqual((2, 10), arr[ContrivedSlice(0, 20)].shape)
+
+    def test_fast_construction_validates_mismatched_dimensions(self):
+        arr = ArrayWithUnits(
+            np.zeros((10, 10)), (IdentityDimension(), IdentityDimension()))
+        result = ArrayWithUnits.from_example(np.zeros((3, 10)), arr)
+        self.assertEqual(3, result.dimensions[0].size)
+        self.assertIs(arr.dimensions[1], result.dimensions[1])
+
+    def test_fast_construction_raises_for_wrong_number_of_dimensions(self):
+        arr = ArrayWithUnits(
+            np.zeros((10, 10)), (IdentityDimension(), IdentityDimension()))
+        self.assertRaises(
+            ValueError,
+            lambda: ArrayWithUnits.from_example(np.zeros(10), arr))
+
+    def test_can_slice_with_list_of_slices(self):
+        raw = np.random.random_sample((4, 5))
+        arr = ArrayWithUnits(raw, (IdentityDimension(), IdentityDimension()))
+        sliced = arr[[slice(0, 2), slice(1, 3)]]
+        self.assertEqual((2, 2), sliced.shape)
+        np.testing.assert_array_equal(raw[0:2, 1:3], sliced)
+        self.assertEqual(2, sliced.dimensions[1].size)
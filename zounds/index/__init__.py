@@ -2,4 +2,12 @@ from .index import SearchResults, HammingIndex
 
 from .hammingdb import HammingDb
 
+from .multiindex import MultiIndexHash
+
 from .brute_force import BruteForceSearch, HammingDistanceBruteForceSearch
+
+from .pq import ProductQuantizationSearch
+
+from .lsh import MultiProbeLSHSearch
+
+from .hnsw import HNSW, HNSWSearch, HNSWIndex
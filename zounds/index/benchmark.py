@@ -0,0 +1,107 @@
+import time
+from collections import namedtuple
+import numpy as np
+from zounds.core import ArrayWithUnits, IdentityDimension
+from zounds.timeseries import TimeDimension, Seconds
+
+BenchmarkResult = namedtuple(
+    'BenchmarkResult', ['recall', 'queries_per_second', 'n_queries'])
+
+
+def synthetic_binary_corpus(
+        n_documents=100,
+        frames_per_document=100,
+        n_bits=64,
+        n_clusters=50,
+        noise=0.05,
+        seed=None):
+    """
+    Produce `(_id, feature)` pairs of packed binary codes, similar to those
+    produced by :class:`~zounds.learn.SimHash`.  Codes are drawn from
+    `n_clusters` random centers, with each bit flipped with probability
+    `noise`, so that every code has near, but not identical, neighbors
+    """
+    if n_bits % 64:
+        raise ValueError('n_bits must be a multiple of 64')
+
+    rng = np.random.RandomState(seed)
+    centers = rng.binomial(1, 0.5, (n_clusters, n_bits)).astype(np.uint8)
+    for i in range(n_documents):
+        labels = rng.randint(0, n_clusters, frames_per_document)
+        flips = rng.binomial(1, noise, (frames_per_document, n_bits))
+        bits = centers[labels] ^ flips.astype(np.uint8)
+        packed = np.packbits(bits, axis=-1).view(np.uint64)
+        yield 'doc{i}'.format(**locals()), ArrayWithUnits(
+            packed, [TimeDimension(Seconds(1)), IdentityDimension()])
+
+
+def synthetic_real_corpus(
+        n_documents=100,
+        frames_per_document=100,
+        n_dims=32,
+        n_clusters=50,
+        noise=0.1,
+        seed=None):
+    """
+    Produce `(_id, feature)` pairs of real-valued features, drawn from
+    `n_clusters` gaussian clusters
+    """
+    rng = np.random.RandomState(seed)
+    centers = rng.normal(0, 1, (n_clusters, n_dims))
+    for i in range(n_documents):
+        labels = rng.randint(0, n_clusters, frames_per_document)
+        features = \
+            centers[labels] + rng.normal(0, noise, (frames_per_document, n_dims))
+        yield 'doc{i}'.format(**locals()), ArrayWithUnits(
+            features.astype(np.float32),
+            [TimeDimension(Seconds(1)), IdentityDimension()])
+
+
+def _key(result):
+    _id, ts = result[:2]
+    return _id, ts.start
+
+
+def recall_at_k(expected, actual, k):
+    """
+    The fraction of the `k` results in `expected` that also appear among the
+    first `k` results in `actual`
+    """
+    expected = set(_key(r) for r in list(expected)[:k])
+    if not expected:
+        return 1.0
+    actual = set(_key(r) for r in list(actual)[:k])
+    return len(expected & actual) / len(expected)
+
+
+def _timed(index, queries, k):
+    start = time.time()
+    results = [list(index.search(query, n_results=k)) for query in queries]
+    elapsed = time.time() - start
+    return results, len(queries) / max(elapsed, 1e-9)
+
+
+def benchmark(index, baseline, queries, k=10):
+    """
+    Compare an approximate index against an exact `baseline`, such as
+    :class:`HammingDistanceBruteForceSearch`
+
+    Args:
+        index: the index under test, with a `search(query, n_results)` method
+        baseline: an exact index over the same data
+        queries (iterable): the query features
+        k (int): the number of results requested for each query
+
+    Returns:
+        a tuple of `(index_result, baseline_result)`, each a
+        :class:`BenchmarkResult` with the mean recall@k and queries per
+        second.  The baseline's recall is always 1
+    """
+    queries = list(queries)
+    expected, baseline_qps = _timed(baseline, queries, k)
+    actual, qps = _timed(index, queries, k)
+    recall = np.mean([
+        recall_at_k(e, a, k) for e, a in zip(expected, actual)])
+    return \
+        BenchmarkResult(recall, qps, len(queries)), \
+        BenchmarkResult(1.0, baseline_qps, len(queries))
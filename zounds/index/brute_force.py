@@ -2,21 +2,71 @@ import numpy as np
 from scipy.spatial.distance import cdist
 from .index import SearchResults
 from random import choice
-from zounds.timeseries import ConstantRateTimeSeries
+from zounds.timeseries import TimeSlice
 from zounds.nputil import packed_hamming_distance
 
 
+def top_k(distances, k):
+    """
+    Return the indices of the `k` smallest `distances`, in ascending order,
+    without sorting the entire array.  Ties are broken by index, so results
+    match those of a stable sort
+    """
+    distances = np.asarray(distances)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if k < len(distances):
+        threshold = distances[np.argpartition(distances, k - 1)[k - 1]]
+        better = np.flatnonzero(distances < threshold)
+        tied = np.flatnonzero(distances == threshold)[:k - len(better)]
+        indices = np.concatenate([better, tied])
+    else:
+        indices = np.arange(len(distances))
+    return indices[np.argsort(distances[indices], kind='stable')]
+
+
 class BaseBruteForceSearch(object):
+    """
+    Keeps every example from `gen` in memory, along with a columnar table
+    mapping each frame back to its document and time slice.
+
+    Rather than storing an `(_id, TimeSlice)` tuple for every frame, only the
+    id, frame frequency and duration of each *document* are stored, along with
+    an array of the row offsets at which each document begins.  Results are
+    materialized only for the frames actually returned by a search.
+    """
+
     def __init__(self, gen):
+        super(BaseBruteForceSearch, self).__init__()
         index = []
-        self._ids = []
+        self._document_ids = []
+        self._frequencies = []
+        self._durations = []
+        offsets = [0]
         for _id, example in gen:
+            td = example.dimensions[0]
             index.append(example)
-            crts = ConstantRateTimeSeries(example)
-            for ts, _ in crts.iter_slices():
-                self._ids.append((_id, ts))
+            self._document_ids.append(_id)
+            self._frequencies.append(td.frequency)
+            self._durations.append(td.duration)
+            offsets.append(offsets[-1] + len(example))
+        self._offsets = np.array(offsets, dtype=np.int64)
         self.index = np.concatenate(index)
 
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def _result(self, i):
+        doc = np.searchsorted(self._offsets, i, side='right') - 1
+        position = int(i - self._offsets[doc])
+        ts = TimeSlice(
+            duration=self._durations[doc],
+            start=self._frequencies[doc] * position)
+        return self._document_ids[doc], ts
+
+    def _results(self, indices):
+        return (self._result(i) for i in indices)
+
     def search(self, query, n_results=10):
         raise NotImplementedError()
 
@@ -33,8 +83,8 @@ class BruteForceSearch(BaseBruteForceSearch):
     def search(self, query, n_results=10):
         distances = cdist(
             query[None, ...], self.index, metric=self.distance_metric)
-        indices = np.argsort(distances[0])[:n_results]
-        return SearchResults(query, (self._ids[i] for i in indices))
+        indices = top_k(distances[0], n_results)
+        return SearchResults(query, self._results(indices))
 
 
 class HammingDistanceBruteForceSearch(BaseBruteForceSearch):
@@ -43,5 +93,5 @@ class HammingDistanceBruteForceSearch(BaseBruteForceSearch):
 
     def search(self, query, n_results=10):
         scores = packed_hamming_distance(query, self.index)
-        indices = np.argsort(scores)[:n_results]
-        return SearchResults(query, (self._ids[i] for i in indices))
+        indices = top_k(scores, n_results)
+        return SearchResults(query, self._results(indices))
@@ -0,0 +1,90 @@
+import os
+import numpy as np
+
+
+class CodeFile(object):
+    """
+    An append-only sidecar file holding a contiguous array of fixed-width
+    records (e.g., `(id, code)` pairs), which is memory-mapped for reading.
+
+    Writes go straight to the file at an explicit row offset, so the caller is
+    responsible for serializing writers and for keeping track of how many rows
+    are valid.  The file grows geometrically, and the mapping is only
+    refreshed when a reader needs to see rows beyond what it has mapped, so
+    many processes can share the same pages without parsing anything.
+
+    Args:
+        path (str): the path to the sidecar file, which will be created if it
+            does not exist
+        dtype (np.dtype): the record dtype
+        min_rows (int): the smallest number of rows the file will be grown to
+    """
+
+    def __init__(self, path, dtype, min_rows=1024):
+        super(CodeFile, self).__init__()
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.min_rows = min_rows
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._data = np.zeros(0, dtype=self.dtype)
+        self._position = 0
+
+    def close(self):
+        if self._fd is None:
+            return
+        self._data = np.zeros(0, dtype=self.dtype)
+        os.close(self._fd)
+        self._fd = None
+
+    def _file_rows(self):
+        return os.fstat(self._fd).st_size // self.dtype.itemsize
+
+    def _remap(self):
+        n_rows = self._file_rows()
+        if not n_rows:
+            self._data = np.zeros(0, dtype=self.dtype)
+            return
+        self._data = np.memmap(
+            self.path, dtype=self.dtype, mode='r', shape=(n_rows,))
+
+    @property
+    def logical_size(self):
+        """
+        The number of valid rows visible to this reader
+        """
+        return self._position
+
+    @property
+    def physical_size(self):
+        """
+        The number of rows currently mapped into memory
+        """
+        return len(self._data)
+
+    @property
+    def logical_data(self):
+        """
+        A read-only, memory-mapped view of the valid rows
+        """
+        return self._data[:self._position]
+
+    def sync(self, n_rows):
+        """
+        Make the first `n_rows` rows of the file visible to this reader,
+        re-mapping the file if it has grown
+        """
+        if n_rows > self.physical_size:
+            self._remap()
+        self._position = n_rows
+
+    def write(self, position, records):
+        """
+        Write `records` into the file, starting at row `position`
+        """
+        records = np.ascontiguousarray(records, dtype=self.dtype)
+        stop = position + len(records)
+        file_rows = self._file_rows()
+        if stop > file_rows:
+            n_rows = max(stop, 2 * file_rows, self.min_rows)
+            os.ftruncate(self._fd, n_rows * self.dtype.itemsize)
+        os.pwrite(self._fd, records.tobytes(), position * self.dtype.itemsize)
@@ -1,17 +1,39 @@
 import lmdb
-from zounds.nputil import Growable, packed_hamming_distance
+from zounds.nputil import \
+    Growable, packed_hamming_distance, packed_hamming_distances, \
+    packed_hamming_top_k
+from .multiindex import MultiIndexHash
+from .codefile import CodeFile
+from .sharded import ShardedSearch
 import numpy as np
 from multiprocessing.dummy import Pool as ThreadPool
 from multiprocessing import cpu_count
 import os
 import binascii
+import struct
+
+_DOCUMENT_NUMBER = struct.Struct('>Q')
+
+# big-endian, so that LMDB's lexicographic key order is insertion order
+_SEQUENCE = struct.Struct('>Q')
 
 
 class HammingDb(object):
-    def __init__(self, path, map_size=1000000000, code_size=8, writeonly=False):
+    def __init__(
+            self,
+            path,
+            map_size=1000000000,
+            code_size=8,
+            writeonly=False,
+            multi_index=False,
+            memory_mapped=True,
+            n_shards=None):
+
         super(HammingDb, self).__init__()
 
         self.writeonly = writeonly
+        self._code_file = None
+        self._sharded = None
 
         if not os.path.exists(path):
             os.makedirs(path)
@@ -44,17 +66,42 @@ class HammingDb(object):
             self.code_size = code_size
 
         self.index = self.env.open_db(b'index')
-        self._append_buffer = self._recarray(1)
+        self.documents = self.env.open_db(b'documents')
+        self.document_numbers = self.env.open_db(b'document_numbers')
+        self.sequence = self.env.open_db(b'sequence')
+        self.tombstones = self.env.open_db(b'tombstones')
+        self.document_rows = self.env.open_db(b'document_rows', dupsort=True)
         self._code_bytearray = bytearray(b'a' * self.code_size)
         self._code_buffer = np.frombuffer(self._code_bytearray, dtype=np.uint64)
         self._codes = None
-        self._ids = set()
+        self._dead = None
+        with self.env.begin() as txn:
+            self._generation = self._generation_of(txn)
+        if memory_mapped:
+            self._code_file = CodeFile(
+                self._code_file_path(self._generation),
+                self._recarray(0).dtype)
+        self._multi_index = None
+        if multi_index and not writeonly:
+            self._multi_index = MultiIndexHash(self.code_size)
         self._catch_up_on_in_memory_store()
 
+        if n_shards and not writeonly:
+            if self._code_file is None:
+                raise ValueError(
+                    'n_shards requires a memory-mapped code file')
+            self._sharded = ShardedSearch(
+                self._code_file.path, self._code_file.dtype, n_shards)
+
         self._thread_count = cpu_count()
         self._pool = ThreadPool(processes=self._thread_count)
 
     def close(self):
+        if self._sharded is not None:
+            self._sharded.close()
+            self._sharded = None
+        if self._code_file is not None:
+            self._code_file.close()
         self.env.close()
 
     def __del__(self):
@@ -74,17 +121,184 @@ class HammingDb(object):
         with self.env.begin() as txn:
             return txn.get(key, db=self.metadata)
 
-    def _catch_up_on_in_memory_store(self):
-        self._initialize_in_memory_store()
+    def document_number(self, _id):
+        """
+        Return a small integer uniquely identifying the document _id, assigning
+        a new one if it hasn't been seen before
+        """
+        key = _id.encode() if isinstance(_id, str) else _id
+        with self.env.begin() as txn:
+            number = txn.get(key, db=self.document_numbers)
+        if number is not None:
+            return _DOCUMENT_NUMBER.unpack(number)[0]
+
+        with self.env.begin(write=True) as txn:
+            number = txn.get(key, db=self.document_numbers)
+            if number is None:
+                number = _DOCUMENT_NUMBER.pack(
+                    txn.stat(self.documents)['entries'])
+                txn.put(number, key, db=self.documents)
+                txn.put(key, number, db=self.document_numbers)
+        return _DOCUMENT_NUMBER.unpack(number)[0]
+
+    def document_id(self, number):
+        """
+        Return the document id assigned the number `number`, or `None`
+        """
+        with self.env.begin() as txn:
+            return txn.get(_DOCUMENT_NUMBER.pack(number), db=self.documents)
+
+    def _generation_of(self, txn):
+        return int(txn.get(b'generation', default=b'0', db=self.metadata))
+
+    def _code_file_path(self, generation):
+        # compaction writes a new file, rather than truncating one that other
+        # processes may have mapped
+        filename = \
+            'codes.{generation}.mmap'.format(**locals()) if generation \
+            else 'codes.mmap'
+        return os.path.join(self.path, filename)
+
+    def _reset(self, generation):
+        """
+        Discard every row loaded so far, e.g. after another instance has
+        compacted the database, and load them again
+        """
+        self._generation = generation
+        self._dead = None
+        if self._multi_index is not None:
+            self._multi_index.invalidate()
+
+        if self._code_file is None:
+            self._codes = None
+            self._catch_up_on_in_memory_store()
+            return
+
+        dtype = self._code_file.dtype
+        self._code_file.close()
+        self._code_file = CodeFile(self._code_file_path(generation), dtype)
+        self._catch_up_on_in_memory_store()
+
+        if self._sharded is not None:
+            n_shards = self._sharded.n_shards
+            self._sharded.close()
+            self._sharded = ShardedSearch(
+                self._code_file.path, self._code_file.dtype, n_shards)
+
+    def _code_rows(self, txn):
+        return int(txn.get(b'coderows', default=b'0', db=self.metadata))
+
+    def _catch_up_on_code_file(self, rebuild=False):
+        with self.env.begin() as txn:
+            n_rows = self._code_rows(txn)
+            n_entries = txn.stat(self.index)['entries']
+
+        if rebuild or n_rows > n_entries:
+            # the sidecar file no longer lines up with the sequence numbers
+            n_rows = self._rebuild_code_file()
+        elif n_rows < n_entries:
+            # the sidecar file is missing, or a writer that doesn't maintain
+            # it has appended to the index
+            n_rows = self._rebuild_code_file(rebuild=False)
+
+        if not self.writeonly:
+            self._codes = self._code_file
+            self._code_file.sync(n_rows)
+
+    def _sequence_is_stale(self, txn):
+        return \
+            txn.stat(self.sequence)['entries'] != \
+            txn.stat(self.index)['entries']
+
+    def _check_sequence(self):
+        """
+        Assign insertion-sequence numbers to every entry, if the index was
+        written by a version that didn't maintain them
+        """
         with self.env.begin() as txn:
+            if not self._sequence_is_stale(txn):
+                return False
+
+        with self.env.begin(write=True) as txn:
+            if not self._sequence_is_stale(txn):
+                return False
+            txn.drop(self.sequence, delete=False)
             cursor = txn.cursor(db=self.index)
-            for i, bundle in enumerate(cursor.iternext(keys=True, values=True)):
-                _id, value = bundle
-                if _id in self._ids:
-                    continue
+            with txn.cursor(db=self.sequence) as sequence:
+                ids = cursor.iternext(keys=True, values=False)
+                sequence.putmulti(
+                    ((_SEQUENCE.pack(i), _id) for i, _id in enumerate(ids)),
+                    append=True)
+        return True
+
+    def _iter_sequence(self, txn, start=0):
+        """
+        Yield `(id, code)` for every entry from sequence number `start`
+        onward, in insertion order
+        """
+        with txn.cursor(db=self.sequence) as cursor:
+            if not cursor.set_range(_SEQUENCE.pack(start)):
+                return
+            for _id in cursor.iternext(keys=False, values=True):
+                value = txn.get(_id, db=self.index)
+                yield _id, value[:self.code_size]
+
+    def _read_records(self, txn, start=0, chunksize=100000):
+        """
+        Yield chunks of `(id, code)` records from sequence number `start`
+        onward
+        """
+        records = self._recarray(chunksize)
+        n_buffered = 0
+        for _id, code in self._iter_sequence(txn, start):
+            records[n_buffered]['id'] = _id
+            records[n_buffered]['code'] = np.frombuffer(code, dtype=np.uint64)
+            n_buffered += 1
+            if n_buffered == chunksize:
+                yield records
+                n_buffered = 0
+        if n_buffered:
+            yield records[:n_buffered]
+
+    def _rebuild_code_file(self, rebuild=True, chunksize=100000):
+        """
+        Write codes to the sidecar file in sequence order, either from
+        scratch, or only those appended since it was last written
+        """
+        if rebuild and self._multi_index is not None:
+            self._multi_index.invalidate()
 
-                code = value[:self.code_size]
-                self._add_code(_id, code)
+        with self.env.begin(write=True) as txn:
+            n_rows = 0 if rebuild else self._code_rows(txn)
+            for records in self._read_records(txn, n_rows, chunksize):
+                self._code_file.write(n_rows, records)
+                n_rows += len(records)
+            txn.put(b'coderows', str(n_rows).encode(), db=self.metadata)
+        return n_rows
+
+    def _catch_up_on_in_memory_store(self):
+        # if sequence numbers are re-assigned, rows already loaded may no
+        # longer line up with them
+        reset = self._check_sequence()
+
+        if self._code_file is not None:
+            self._catch_up_on_code_file(rebuild=reset)
+            return
+
+        if self.writeonly:
+            return
+
+        if reset:
+            self._codes = None
+            if self._multi_index is not None:
+                self._multi_index.invalidate()
+
+        self._initialize_in_memory_store()
+
+        # only the rows appended since the last catch-up are read
+        with self.env.begin() as txn:
+            for records in self._read_records(txn, self._codes.logical_size):
+                self._codes.extend(records)
 
     def __len__(self):
         with self.env.begin() as txn:
@@ -121,41 +335,281 @@ class HammingDb(object):
                     ({self.code_size}), but was {code_len}'''
             raise ValueError(fmt.format(**locals()))
 
-    def _add_code(self, _id, code):
-        if self.writeonly:
-            return
-
-        arr = self._append_buffer
-        arr[0]['id'] = _id
-        arr[0]['code'] = self._np_code(code)
-        self._codes.append(arr)
-        self._ids.add(_id)
-
     def _check_for_external_modifications(self):
-        if self.__len__() != self._codes.logical_size:
+        with self.env.begin() as txn:
+            generation = self._generation_of(txn)
+            n_entries = txn.stat(self.index)['entries']
+
+        if generation != self._generation:
+            self._reset(generation)
+        elif n_entries != self._codes.logical_size:
             self._catch_up_on_in_memory_store()
 
     def _new_id(self):
         return binascii.hexlify(os.urandom(16))
 
+    def _encode(self, x):
+        try:
+            return x.encode()
+        except AttributeError:
+            return x
+
     def append(self, code, data):
-        self._validate_code_size(code)
-        self._initialize_in_memory_store()
+        self.extend([code], [data])
+
+    def extend(
+            self,
+            codes,
+            data,
+            metadata=None,
+            documents=None,
+            replace=False):
+        """
+        Append many entries in a single write transaction
+
+        Args:
+            codes: a sequence of codes, or a two-dimensional uint8 array with
+                `code_size` columns
+            data: a sequence of data to store with each code
+            metadata (dict): metadata keys and values to set in the same
+                transaction, e.g., to checkpoint progress atomically
+            documents: an optional sequence of the document each entry belongs
+                to, so that entries can later be deleted by document
+            replace (bool): if `True`, first delete any existing entries
+                belonging to the documents in `documents`
+        """
+        if isinstance(codes, np.ndarray):
+            codes = np.ascontiguousarray(codes, dtype=np.uint8) \
+                .reshape((len(codes), -1))
+            codes = [code.tobytes() for code in codes]
+        else:
+            codes = [self._encode(code) for code in codes]
 
+        data = [self._encode(d) for d in data]
+
+        if len(codes) != len(data):
+            raise ValueError('codes and data must have the same length')
+
+        if documents is not None:
+            documents = [self._encode(d) for d in documents]
+            if len(documents) != len(codes):
+                raise ValueError(
+                    'codes and documents must have the same length')
+        elif replace:
+            raise ValueError('replace requires documents')
+
+        for code in codes:
+            self._validate_code_size(code)
+
+        if not codes:
+            if metadata:
+                with self.env.begin(write=True) as txn:
+                    self._put_metadata(txn, metadata)
+            return
+
+        if self._code_file is None:
+            self._initialize_in_memory_store()
+
+        records = self._recarray(len(codes))
+        records['id'] = [self._new_id() for _ in codes]
+        records['code'] = np.frombuffer(b''.join(codes), dtype=np.uint64) \
+            .reshape(records['code'].shape)
+
+        while True:
+            with self.env.begin(write=True) as txn:
+                generation = self._generation_of(txn)
+                if generation == self._generation:
+                    if replace:
+                        self._delete_documents(txn, set(documents))
+                    self._put_entries(txn, records, codes, data, documents)
+                    self._put_metadata(txn, metadata)
+                    if self._code_file is not None:
+                        self._extend_code_file(txn, records)
+                    else:
+                        self._add_codes(records)
+                    return
+
+            # the database was compacted by another instance, so rows must be
+            # re-loaded before new ones can be appended
+            self._reset(generation)
+
+    def _put_entries(self, txn, records, codes, data, documents):
+        with txn.cursor(db=self.index) as cursor:
+            cursor.putmulti(
+                (_id, code + d)
+                for _id, code, d in zip(records['id'], codes, data))
+
+        # LMDB only allows a single write transaction at a time, across all
+        # processes, so sequence numbers are never handed out twice
+        start = txn.stat(self.sequence)['entries']
+        with txn.cursor(db=self.sequence) as cursor:
+            cursor.putmulti(
+                ((_SEQUENCE.pack(start + i), _id)
+                 for i, _id in enumerate(records['id'])),
+                append=True)
+
+        if documents is not None:
+            with txn.cursor(db=self.document_rows) as cursor:
+                cursor.putmulti(zip(documents, records['id']), dupdata=True)
+
+    def _tombstone(self, txn, ids):
+        n_deleted = 0
+        for _id in ids:
+            if txn.get(_id, db=self.index) is None:
+                continue
+            if txn.put(_id, b'', db=self.tombstones, overwrite=False):
+                n_deleted += 1
+        return n_deleted
+
+    def _delete_documents(self, txn, documents):
+        n_deleted = 0
+        with txn.cursor(db=self.document_rows) as cursor:
+            for document in documents:
+                if not cursor.set_key(document):
+                    continue
+                ids = list(cursor.iternext_dup())
+                n_deleted += self._tombstone(txn, ids)
+                txn.delete(document, db=self.document_rows)
+        return n_deleted
+
+    def delete(self, ids):
+        """
+        Mark entries as deleted.  They'll no longer be returned from
+        searches, but will continue to take up space until `compact` is
+        called.
+
+        Returns the number of entries newly deleted
+        """
+        ids = [self._encode(_id) for _id in ids]
         with self.env.begin(write=True) as txn:
-            _id = self._new_id()
-            try:
-                code = code.encode()
-            except AttributeError:
-                pass
+            return self._tombstone(txn, ids)
+
+    def delete_document(self, document):
+        """
+        Mark every entry belonging to `document` (see `extend`) as deleted.
+
+        Returns the number of entries newly deleted
+        """
+        with self.env.begin(write=True) as txn:
+            return self._delete_documents(txn, [self._encode(document)])
+
+    @property
+    def n_deleted(self):
+        """
+        The number of deleted entries that haven't yet been compacted away
+        """
+        with self.env.begin() as txn:
+            return txn.stat(self.tombstones)['entries']
+
+    def compact(self, reload=True):
+        """
+        Permanently remove deleted entries, re-assigning sequence numbers and
+        writing a new memory-mapped code file that contains only live
+        entries.  Other instances, including those in other processes, reload
+        their rows the next time they search or append.
+
+        Args:
+            reload (bool): if `False`, this instance also waits until its next
+                search or append to reload its rows, so that compaction can
+                run in a background thread while searches continue
+
+        Returns the number of entries removed
+        """
+        with self.env.begin(write=True) as txn:
+            with txn.cursor(db=self.tombstones) as cursor:
+                dead = set(cursor.iternext(keys=True, values=False))
+            if not dead:
+                return 0
+
+            for _id in dead:
+                txn.delete(_id, db=self.index)
+            txn.drop(self.tombstones, delete=False)
+
+            with txn.cursor(db=self.sequence) as cursor:
+                live = [
+                    _id for _id in cursor.iternext(keys=False, values=True)
+                    if _id not in dead]
+            txn.drop(self.sequence, delete=False)
+            with txn.cursor(db=self.sequence) as cursor:
+                cursor.putmulti(
+                    ((_SEQUENCE.pack(i), _id) for i, _id in enumerate(live)),
+                    append=True)
+            del live
+
+            generation = self._generation_of(txn) + 1
+            txn.put(
+                b'generation', str(generation).encode(), db=self.metadata)
+
+            n_rows = 0
+            if self._code_file is not None:
+                code_file = CodeFile(
+                    self._code_file_path(generation), self._code_file.dtype)
+                for records in self._read_records(txn):
+                    code_file.write(n_rows, records)
+                    n_rows += len(records)
+                code_file.close()
+            txn.put(b'coderows', str(n_rows).encode(), db=self.metadata)
+
+        if reload:
+            self._reset(generation)
+
+        if self._code_file is not None:
             try:
-                data = data.encode()
-            except AttributeError:
+                # instances that still have the old file mapped keep its
+                # pages, and will map the new file before reading more rows
+                os.remove(self._code_file_path(generation - 1))
+            except OSError:
                 pass
-            txn.put(_id, code + data, db=self.index)
-            self._add_code(_id, code)
 
-    def _random_code(self):
+        return len(dead)
+
+    def _dead_rows(self):
+        """
+        Return the indices of rows that have been deleted, but not yet
+        compacted away
+        """
+        with self.env.begin() as txn:
+            n_dead = txn.stat(self.tombstones)['entries']
+            if not n_dead:
+                return np.zeros(0, dtype=np.int64)
+
+            # tombstones only accumulate until the next compaction, so their
+            # count identifies the current set
+            key = (self._generation, n_dead, self._codes.logical_size)
+            if self._dead is not None and self._dead[0] == key:
+                return self._dead[1]
+
+            with txn.cursor(db=self.tombstones) as cursor:
+                dead_ids = np.array(
+                    list(cursor.iternext(keys=True, values=False)),
+                    dtype='S32')
+
+        rows = np.flatnonzero(
+            np.isin(self._codes.logical_data['id'], dead_ids))
+        self._dead = (key, rows)
+        return rows
+
+    def _put_metadata(self, txn, metadata):
+        for key, value in (metadata or {}).items():
+            txn.put(key, value, db=self.metadata)
+
+    def _add_codes(self, records):
+        if self.writeonly:
+            return
+
+        self._codes.extend(records)
+
+    def _extend_code_file(self, txn, records):
+        # LMDB only allows a single write transaction at a time, across all
+        # processes, so the row count read here can't change until commit
+        position = self._code_rows(txn)
+        self._code_file.write(position, records)
+        n_rows = position + len(records)
+        txn.put(b'coderows', str(n_rows).encode(), db=self.metadata)
+        if not self.writeonly:
+            self._code_file.sync(n_rows)
+
+    def random_code(self):
         with self.env.begin() as txn:
             with txn.cursor(self.index) as cursor:
                 code = None
@@ -166,38 +620,317 @@ class HammingDb(object):
                     continue
 
     def random_search(self, n_results, multithreaded=False, sort=False):
-        code = self._random_code()
+        code = self.random_code()
         return code, self.search(code, n_results, multithreaded, sort=sort)
 
-    def search(self, code, n_results, multithreaded=False, sort=False):
+    def _logical_codes(self):
+        codes = self._codes.logical_data['code']
+        if codes.ndim == 1:
+            codes = codes[..., None]
+        return codes
 
+    def _check_searchable(self):
         if self.writeonly:
             error_msg = 'searches may not be performed in writeonly mode'
             raise RuntimeError(error_msg)
 
+    def _selected_rows(self, mask=None, ids=None, dead=None):
+        """
+        Resolve a row filter into an array of row indices, or `None` if every
+        row is eligible.  Filters are evaluated over the in-memory id column,
+        so no payloads are read for rejected rows.  Deleted rows are never
+        selected
+
+        Args:
+            mask: a boolean array with one entry per row, or a callable that
+                is passed the array of ids and returns such an array
+            ids: a collection of ids, to which results will be restricted
+        """
+        if mask is None and ids is None:
+            return None
+
+        id_column = self._codes.logical_data['id']
+        selected = np.ones(len(id_column), dtype=np.bool_)
+
+        if ids is not None:
+            ids = np.array([self._encode(_id) for _id in ids], dtype='S32')
+            selected &= np.isin(id_column, ids)
+
+        if callable(mask):
+            mask = mask(id_column)
+
+        if mask is not None:
+            mask = np.asarray(mask, dtype=np.bool_)
+            if mask.shape != selected.shape:
+                raise ValueError(
+                    'mask must have one entry per row ({n_rows}), but had '
+                    'shape {mask.shape}'.format(
+                        n_rows=len(selected), mask=mask))
+            selected &= mask
+
+        if dead is not None:
+            selected[dead] = False
+
+        return np.flatnonzero(selected)
+
+    def _exclude(self, indices, dead, n_results=None):
+        if len(dead):
+            indices = indices[~np.isin(indices, dead)]
+        return indices[:n_results]
+
+    def _prepare_query(self, code):
+        self._check_searchable()
         self._validate_code_size(code)
         self._check_for_external_modifications()
-        query = self._np_code(code)
+        return self._np_code(code).copy()
+
+    def search_ids(
+            self,
+            code,
+            n_results,
+            multithreaded=False,
+            sort=False,
+            mask=None,
+            ids=None):
+        """
+        Find the entries nearest to code, returning their ids, rather than
+        the data stored with them.  Results may be restricted to rows
+        selected by `mask` and/or `ids` (see `radius_search_ids`)
+        """
+        query = self._prepare_query(code)
+        codes = self._logical_codes()
+        dead = self._dead_rows()
+        rows = self._selected_rows(mask, ids, dead)
+
+        if rows is not None:
+            # only the selected rows take part in the distance computation
+            indices, _ = packed_hamming_top_k(query, codes[rows], n_results)
+            indices = rows[indices]
+            return self._codes.logical_data[indices]['id']
+
+        # fetch enough extra results that, once deleted rows are removed,
+        # n_results remain, sorting them so the best are kept
+        n_candidates = min(n_results + len(dead), len(codes))
+        sort = sort or len(dead) > 0
+
+        if self._multi_index is not None:
+            # multi-index hashing only examines rows that share a nearby
+            # substring with the query, and always returns sorted results
+            indices, _ = self._multi_index.search(query, codes, n_candidates)
+        elif self._sharded is not None:
+            indices = self._sharded.search(
+                query, self._codes.logical_size, n_candidates, sort=sort)
+        else:
+            indices = self._linear_search(
+                query, codes, n_candidates, multithreaded, sort)
+
+        indices = self._exclude(indices, dead, n_results)
+        return self._codes.logical_data[indices]['id']
+
+    def radius_search_ids(self, code, radius, mask=None, ids=None):
+        """
+        Find every entry within `radius` bits of `code`, returning their ids,
+        sorted by ascending distance
+
+        Args:
+            code (bytes): the query code
+            radius (int): the maximum hamming distance, inclusive
+            mask: a boolean array with one entry per row, or a callable that
+                is passed the array of ids and returns such an array.  Only
+                rows where the mask is `True` are considered
+            ids: a collection of ids, to which results will be restricted
+        """
+        if radius < 0:
+            raise ValueError('radius must be non-negative')
+
+        query = self._prepare_query(code)
+        codes = self._logical_codes()
+        dead = self._dead_rows()
+        rows = self._selected_rows(mask, ids, dead)
+
+        if self._multi_index is not None:
+            indices, _ = self._multi_index.search(
+                query, codes, len(codes), max_radius=radius)
+            if rows is not None:
+                indices = indices[np.isin(indices, rows)]
+            indices = self._exclude(indices, dead)
+        else:
+            if rows is None:
+                distances = packed_hamming_distance(query, codes)
+                rows = np.arange(len(codes))
+            else:
+                distances = packed_hamming_distance(query, codes[rows])
+            within = distances <= radius
+            order = np.argsort(distances[within], kind='stable')
+            indices = self._exclude(rows[within][order], dead)
+
+        return self._codes.logical_data[indices]['id']
+
+    def radius_search(self, code, radius, mask=None, ids=None):
+        """
+        Find every entry within `radius` bits of `code`, yielding the data
+        stored with each, nearest first.  See `radius_search_ids`
+        """
+        nearest = self.radius_search_ids(code, radius, mask, ids)
+        for payload in self.payloads(nearest):
+            yield payload
+
+    def payloads(self, ids):
+        """
+        Fetch the data stored with each id, in a single read transaction
+        """
+        with self.env.begin() as txn:
+            return [txn.get(_id, db=self.index)[self.code_size:] for _id in ids]
+
+    def search(
+            self,
+            code,
+            n_results,
+            multithreaded=False,
+            sort=False,
+            mask=None,
+            ids=None):
+        nearest = self.search_ids(
+            code, n_results, multithreaded, sort, mask, ids)
+        for payload in self.payloads(nearest):
+            yield payload
+
+    def search_many_ids(
+            self,
+            codes,
+            n_results,
+            sort=False,
+            query_tile_size=64,
+            code_tile_size=4096):
+        """
+        Search for many codes at once, amortizing the cost of checking for
+        external modifications over all of them.  Distances are computed in
+        `query_tile_size` x `code_tile_size` blocks, small enough to stay in
+        cache, and a running top-k is kept for each query.
+
+        Returns a list containing an array of ids for each query
+        """
+        self._check_searchable()
+        for code in codes:
+            self._validate_code_size(code)
+        self._check_for_external_modifications()
 
-        codes = self._codes.logical_data['code']
+        queries = np.frombuffer(b''.join(codes), dtype=np.uint64) \
+            .reshape((len(codes), self.code_size // 8))
+        db_codes = self._logical_codes()
 
-        if codes.ndim == 1:
-            codes = codes[..., None]
+        # as in search_ids, over-fetch to make up for deleted rows
+        dead = self._dead_rows()
+        n_candidates = min(n_results + len(dead), len(db_codes))
+        sort = sort or len(dead) > 0
 
-        if not multithreaded:
-            scores = packed_hamming_distance(query, codes)
+        if self._multi_index is not None:
+            indices = [
+                self._multi_index.search(query, db_codes, n_candidates)[0]
+                for query in queries]
         else:
-            n_codes = len(codes)
-            chunksize = max(1, n_codes // self._thread_count)
-            scores = np.concatenate(self._pool.map(
-                lambda x: packed_hamming_distance(query, x),
-                (codes[i: i + chunksize] for i in
-                 range(0, n_codes, chunksize))))
+            indices = self._tiled_search(
+                queries,
+                db_codes,
+                n_candidates,
+                sort,
+                query_tile_size,
+                code_tile_size)
+
+        ids = self._codes.logical_data['id']
+        return [ids[self._exclude(row, dead, n_results)] for row in indices]
+
+    def search_many(
+            self,
+            codes,
+            n_results,
+            sort=False,
+            query_tile_size=64,
+            code_tile_size=4096):
+        """
+        Search for many codes at once, as in `search_many_ids`, reading all
+        the results in a single read transaction.
+
+        Returns a list containing a list of results for each query
+        """
+        ids = self.search_many_ids(
+            codes, n_results, sort, query_tile_size, code_tile_size)
+        if not ids:
+            return []
+        payloads = iter(self.payloads(np.concatenate(ids)))
+        return [[next(payloads) for _ in row] for row in ids]
+
+    def _tiled_search(
+            self,
+            queries,
+            codes,
+            n_results,
+            sort,
+            query_tile_size,
+            code_tile_size):
+
+        n_codes = len(codes)
+        n_results = min(n_results, n_codes)
+        results = []
+
+        for q in range(0, len(queries), query_tile_size):
+            query_tile = queries[q: q + query_tile_size]
+            shape = (len(query_tile), 0)
+            best_indices = np.zeros(shape, dtype=np.int64)
+            best_scores = np.zeros(shape, dtype=np.uint16)
+
+            for c in range(0, n_codes, code_tile_size):
+                scores = packed_hamming_distances(
+                    query_tile, codes[c: c + code_tile_size])
+                indices = np.broadcast_to(
+                    np.arange(c, c + scores.shape[1]), scores.shape)
+                scores = np.concatenate([best_scores, scores], axis=1)
+                indices = np.concatenate([best_indices, indices], axis=1)
+
+                if scores.shape[1] > n_results:
+                    # keep only the best n_results candidates seen so far for
+                    # each query
+                    partitioned = np.argpartition(
+                        scores, n_results - 1, axis=1)[:, :n_results]
+                    scores = np.take_along_axis(scores, partitioned, axis=1)
+                    indices = np.take_along_axis(indices, partitioned, axis=1)
+
+                best_scores, best_indices = scores, indices
+
+            if sort:
+                order = np.argsort(best_scores, axis=1, kind='stable')
+                best_indices = np.take_along_axis(best_indices, order, axis=1)
+
+            results.append(best_indices)
+
+        if not results:
+            return np.zeros((0, n_results), dtype=np.int64)
+
+        return np.concatenate(results)
+
+    def _linear_search(self, query, codes, n_results, multithreaded, sort):
+        if not multithreaded:
+            # the kernel keeps a bounded heap of the best candidates, and
+            # returns them already sorted
+            indices, _ = packed_hamming_top_k(query, codes, n_results)
+            return indices
+
+        # the kernel releases the GIL, so these threads run in parallel
+        n_codes = len(codes)
+        chunksize = max(1, n_codes // self._thread_count)
+        scores = np.concatenate(self._pool.map(
+            lambda x: packed_hamming_distance(query, x),
+            (codes[i: i + chunksize] for i in
+             range(0, n_codes, chunksize))))
 
         # argpartition will ensure that the lowest scores will all be
         # withing the first n_results elements, but makes no guarantees
         # about the ordering *within* n_results
-        partitioned_indices = np.argpartition(scores, n_results)[:n_results]
+        if n_results < n_codes:
+            partitioned_indices = \
+                np.argpartition(scores, n_results)[:n_results]
+        else:
+            partitioned_indices = np.arange(n_codes)
 
         if sort:
             # since argpartition doesn't guarantee that the results are
@@ -211,8 +944,4 @@ class HammingDb(object):
             # particular order
             indices = partitioned_indices
 
-        nearest = self._codes.logical_data[indices]['id']
-
-        with self.env.begin() as txn:
-            for _id in nearest:
-                yield txn.get(_id, db=self.index)[self.code_size:]
+        return indices
@@ -0,0 +1,734 @@
+import os
+import threading
+from random import choice
+import numpy as np
+from .brute_force import BaseBruteForceSearch
+from .index import BaseIndex, SearchResults, timestamped_frames
+from zounds.nputil import Growable, safe_unit_norm
+from zounds.timeseries import TimeSlice, Picoseconds
+from hnswgraph import search_layer, connect
+
+
+class HNSW(object):
+    """
+    A hierarchical navigable small world graph (Malkov and Yashunin,
+    "Efficient and robust approximate nearest neighbor search using
+    Hierarchical Navigable Small World graphs") over real-valued vectors.
+
+    Each vector is inserted into a randomly-chosen number of layers, with
+    exponentially fewer vectors in each successive layer.  Searches descend
+    greedily through the sparse upper layers to find a good entry point, and
+    then perform a best-first search of the dense bottom layer.
+
+    Searching each layer, and choosing and linking the neighbors of newly
+    inserted vectors, are performed by the compiled `hnswgraph` extension,
+    which doesn't hold the GIL while searching.
+
+    Args:
+        dim (int): the dimension of the vectors
+        M (int): the number of neighbors each vector is linked to in each
+            layer.  Vectors in the bottom layer may have up to `2 * M`
+        ef_construction (int): the size of the candidate list used when
+            choosing neighbors for newly-inserted vectors.  Larger values build
+            a better graph, more slowly
+        distance_metric (str): either `euclidean` or `cosine`
+        seed (int): a seed for choosing the number of layers for each vector
+    """
+
+    def __init__(
+            self,
+            dim,
+            M=16,
+            ef_construction=200,
+            distance_metric='euclidean',
+            seed=None):
+
+        super(HNSW, self).__init__()
+
+        if distance_metric not in ('euclidean', 'cosine'):
+            raise ValueError(
+                'distance_metric must be either euclidean or cosine')
+
+        if M < 2:
+            raise ValueError('M must be at least two')
+
+        self.dim = dim
+        self.M = M
+        self.ef_construction = ef_construction
+        self.distance_metric = distance_metric
+        self.seed = seed
+        self._rng = np.random.RandomState(seed)
+        self._level_multiplier = 1 / np.log(M)
+
+        self._vectors = Growable(np.zeros((1024, dim), dtype=np.float32))
+        self._levels = Growable(np.zeros(1024, dtype=np.int8))
+        # the bottom layer is dense, so its links are stored as a matrix,
+        # padded with -1
+        self._base = Growable(np.zeros((1024, 2 * M), dtype=np.int32))
+        # the upper layers are sparse, so each has a row of links only for
+        # the nodes that belong to it, along with the row for each node, or -1
+        self._upper_rows = []
+        self._upper_links = []
+        self.entry_point = -1
+        self.max_level = -1
+
+    def __len__(self):
+        return self._vectors.logical_size
+
+    @property
+    def vectors(self):
+        return self._vectors.logical_data
+
+    @property
+    def _cosine(self):
+        return self.distance_metric == 'cosine'
+
+    def _prepare(self, x):
+        x = np.asarray(x, dtype=np.float32).reshape((-1, self.dim))
+        if self._cosine:
+            x = safe_unit_norm(x).astype(np.float32)
+        return np.ascontiguousarray(x)
+
+    def _layer(self, level):
+        """
+        Return the links of `level`, along with the row of links belonging to
+        each node, which is `None` for the bottom layer, where every node has
+        a row
+        """
+        if level == 0:
+            return self._base.data, None
+        return \
+            self._upper_links[level - 1].data, \
+            self._upper_rows[level - 1].data
+
+    def _neighbors(self, node, level):
+        links, rows = self._layer(level)
+        row = node if rows is None else rows[node]
+        if row < 0:
+            return np.zeros(0, dtype=np.int32)
+        links = links[row]
+        return links[links >= 0]
+
+    def _search_layer(self, query, entry_points, ef, level):
+        """
+        Best-first search of a single layer, returning a tuple of
+        `(distances, nodes)` for the (at most) `ef` nearest nodes found,
+        nearest first
+        """
+        links, rows = self._layer(level)
+        return search_layer(
+            self._vectors.data,
+            links,
+            rows,
+            query,
+            np.asarray(entry_points, dtype=np.int64),
+            ef,
+            self._cosine,
+            len(self))
+
+    def _random_level(self):
+        return int(-np.log(1 - self._rng.uniform()) * self._level_multiplier)
+
+    def _append(self, vector, level):
+        node = len(self)
+        self._vectors.append(vector)
+        self._levels.append(level)
+        self._base.append(np.full(2 * self.M, -1, dtype=np.int32))
+
+        while len(self._upper_rows) < level:
+            # a new layer, which none of the existing nodes belong to
+            rows = np.full(max(1024, 2 * node), -1, dtype=np.int32)
+            self._upper_rows.append(Growable(rows, position=node))
+            self._upper_links.append(
+                Growable(np.zeros((1024, self.M), dtype=np.int32)))
+
+        for l, (rows, links) in enumerate(
+                zip(self._upper_rows, self._upper_links)):
+            if l < level:
+                rows.append(links.logical_size)
+                links.append(np.full(self.M, -1, dtype=np.int32))
+            else:
+                rows.append(-1)
+
+        return node
+
+    def _insert(self, vector):
+        level = self._random_level()
+        node = self._append(vector, level)
+
+        if self.entry_point < 0:
+            self.entry_point = node
+            self.max_level = level
+            return node
+
+        entry_points = [self.entry_point]
+        for l in range(self.max_level, level, -1):
+            _, nearest = self._search_layer(vector, entry_points, 1, l)
+            entry_points = nearest[:1]
+
+        for l in range(min(level, self.max_level), -1, -1):
+            distances, nearest = self._search_layer(
+                vector, entry_points, self.ef_construction, l)
+            links, rows = self._layer(l)
+            connect(
+                self._vectors.data,
+                links,
+                rows,
+                node,
+                nearest,
+                distances,
+                self.M,
+                self._cosine)
+            entry_points = nearest
+
+        if level > self.max_level:
+            self.entry_point = node
+            self.max_level = level
+
+        return node
+
+    def add(self, vectors):
+        """
+        Insert each of `vectors` into the graph, returning their indices
+        """
+        vectors = self._prepare(vectors)
+        return np.array(
+            [self._insert(vector) for vector in vectors], dtype=np.int64)
+
+    def search(self, query, k=10, ef=50):
+        """
+        Find the (approximately) `k` nearest vectors to `query`
+
+        Args:
+            query (np.ndarray): the query vector
+            k (int): the number of results to return
+            ef (int): the size of the candidate list kept while searching the
+                bottom layer.  Larger values improve recall, at the cost of
+                speed.  Values smaller than `k` are treated as `k`
+
+        Returns:
+            a tuple of `(indices, distances)`, nearest first
+        """
+        if self.entry_point < 0 or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        query = self._prepare(query)[0]
+        entry_points = [self.entry_point]
+        for l in range(self.max_level, 0, -1):
+            _, nearest = self._search_layer(query, entry_points, 1, l)
+            entry_points = nearest[:1]
+
+        distances, indices = self._search_layer(
+            query, entry_points, max(ef, k), 0)
+        return indices[:k], distances[:k]
+
+    def _arrays(self):
+        arrays = dict(
+            vectors=self.vectors,
+            levels=self._levels.logical_data,
+            base=self._base.logical_data,
+            params=np.array([
+                self.dim,
+                self.M,
+                self.ef_construction,
+                self.entry_point,
+                self.max_level,
+                -1 if self.seed is None else self.seed], dtype=np.int64),
+            distance_metric=np.array(self.distance_metric))
+
+        for l, (rows, links) in enumerate(
+                zip(self._upper_rows, self._upper_links)):
+            rows = rows.logical_data
+            nodes = np.flatnonzero(rows >= 0).astype(np.int32)
+            arrays['upper_nodes_{l}'.format(**locals())] = nodes
+            arrays['upper_links_{l}'.format(**locals())] = \
+                links.logical_data[rows[nodes]]
+
+        return arrays
+
+    def save(self, f, **extra):
+        """
+        Write the graph, along with any `extra` arrays, to the file-like
+        object `f`
+        """
+        arrays = self._arrays()
+        arrays.update(extra)
+        np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, arrays):
+        """
+        Re-create a graph from the arrays written by `save`, e.g., the result
+        of `np.load`
+        """
+        dim, M, ef_construction, entry_point, max_level, seed = \
+            arrays['params'].tolist()
+        hnsw = cls(
+            dim,
+            M=M,
+            ef_construction=ef_construction,
+            distance_metric=str(arrays['distance_metric']),
+            seed=None if seed < 0 else seed)
+
+        vectors = arrays['vectors']
+        n = len(vectors)
+        hnsw._vectors = Growable(vectors.astype(np.float32), position=n)
+        hnsw._levels = Growable(arrays['levels'].copy(), position=n)
+        hnsw._base = Growable(
+            arrays['base'].astype(np.int32), position=n)
+        hnsw.entry_point = entry_point
+        hnsw.max_level = max_level
+
+        for l in range(max(0, max_level)):
+            nodes = arrays['upper_nodes_{l}'.format(**locals())]
+            links = arrays['upper_links_{l}'.format(**locals())]
+            rows = np.full(max(1, n), -1, dtype=np.int32)
+            rows[nodes] = np.arange(len(nodes), dtype=np.int32)
+            hnsw._upper_rows.append(Growable(rows, position=n))
+            hnsw._upper_links.append(Growable(
+                np.ascontiguousarray(links, dtype=np.int32),
+                position=len(nodes)))
+
+        return hnsw
+
+def atomic_save(path, save):
+    """
+    Call `save` with a temporary file, which then replaces the file at `path`,
+    so that readers never see a partially-written file
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    tmp_path = '{path}.tmp'.format(**locals())
+    with open(tmp_path, 'wb') as f:
+        save(f)
+    os.replace(tmp_path, path)
+
+
+class HNSWSearch(BaseBruteForceSearch):
+    """
+    Approximate nearest-neighbor search over real-valued features, such as
+    learned embeddings, using an in-memory :class:`HNSW` graph
+
+    Args:
+        gen (generator): a generator of `(_id, feature)` tuples, as for
+            :class:`BruteForceSearch`
+        M (int): the number of neighbors each frame is linked to
+        ef_construction (int): the size of the candidate list used while
+            building the graph
+        ef (int): the size of the candidate list used while searching
+        distance_metric (str): either `euclidean` or `cosine`
+        seed (int): a seed for building the graph
+
+    See Also:
+        :class:`BruteForceSearch`
+        :class:`HNSWIndex`
+    """
+
+    def __init__(
+            self,
+            gen,
+            M=16,
+            ef_construction=200,
+            ef=50,
+            distance_metric='euclidean',
+            seed=None):
+
+        super(HNSWSearch, self).__init__(gen)
+        self.ef = ef
+        vectors = self.index.reshape((len(self.index), -1))
+        self.graph = HNSW(
+            vectors.shape[1],
+            M=M,
+            ef_construction=ef_construction,
+            distance_metric=distance_metric,
+            seed=seed)
+        self.graph.add(vectors)
+
+    def search(self, query, n_results=10):
+        indices, _ = self.graph.search(query, n_results, self.ef)
+        return SearchResults(query, self._results(indices))
+
+
+class HNSWIndex(BaseIndex):
+    """
+    A persistent, incrementally-updated :class:`HNSW` index over a
+    real-valued feature, such as a learned embedding, of `document`.
+
+    The graph, along with a table mapping each of its vectors to a document
+    and time slice, is saved to a single file alongside any
+    :class:`HammingIndex` databases under `path`.  Each save replaces the
+    file atomically, so that the index on disk always reflects some prefix of
+    the event log, and indexing may resume from it after a restart.  Since
+    the whole graph is rewritten each time, writes are not saved
+    immediately.  The index is saved by :meth:`flush` and :meth:`close`, when
+    listening stops, and otherwise only once the number of frames written
+    since the last save reaches the number saved then, so that the total cost
+    of saving stays linear in the number of frames indexed.
+
+    Deleted and replaced frames remain in the graph, where they still help to
+    route searches, until more than `max_dead_fraction` of the graph is
+    dead, at which point it's rebuilt from the live frames alone.
+
+    Args:
+        document: the document class the feature belongs to
+        feature: the feature to index.  Each frame should be a
+            one-dimensional, real-valued vector
+        version: the version of the feature to index, defaulting to the
+            feature's current version
+        path (str): the directory in which the index file is stored
+        listen (bool): if `True`, index new documents in a background thread,
+            as they're processed
+        M (int): the number of neighbors each frame is linked to
+        ef_construction (int): the size of the candidate list used while
+            inserting frames
+        ef (int): the size of the candidate list used while searching, which
+            trades speed for recall, and may be changed at any time
+        distance_metric (str): either `euclidean` or `cosine`
+        seed (int): a seed for building the graph
+        n_indexing_workers (int): the number of threads loading features
+        max_pending_events (int): the maximum number of events being loaded,
+            or waiting to be written, at any time
+        index_batch_size (int): the maximum number of documents written at
+            once
+        max_dead_fraction (float): the fraction of frames in the graph that may
+            be deleted or replaced before it's compacted
+
+    See Also:
+        :class:`HammingIndex`
+        :class:`HNSWSearch`
+    """
+
+    def __init__(
+            self,
+            document,
+            feature,
+            version=None,
+            path='',
+            listen=False,
+            M=16,
+            ef_construction=200,
+            ef=50,
+            distance_metric='euclidean',
+            seed=None,
+            n_indexing_workers=1,
+            max_pending_events=64,
+            index_batch_size=64,
+            max_dead_fraction=0.5):
+
+        super(HNSWIndex, self).__init__(
+            document,
+            feature,
+            n_indexing_workers=n_indexing_workers,
+            max_pending_events=max_pending_events,
+            index_batch_size=index_batch_size)
+        self.path = path
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef = ef
+        self.distance_metric = distance_metric
+        self.seed = seed
+
+        if not 0 <= max_dead_fraction < 1:
+            raise ValueError('max_dead_fraction must be in the range [0, 1)')
+        self.max_dead_fraction = max_dead_fraction
+
+        version = version or self.feature.version
+
+        self.hnsw_path = os.path.join(
+            self.path, 'hnsw.{self.feature.key}.{version}.npz'
+                .format(**locals()))
+
+        self._lock = threading.Lock()
+        self._init()
+
+        if os.path.exists(self.hnsw_path):
+            self._load()
+
+        if listen:
+            self.listen()
+
+    def _init(self):
+        self.graph = None
+        self._timestamp = b''
+        self._document_ids = []
+        self._document_numbers = {}
+        # one row per frame in the graph, in insertion order
+        self._row_documents = Growable(np.zeros(1024, dtype=np.int32))
+        self._row_starts = Growable(np.zeros(1024, dtype=np.int64))
+        self._row_durations = Growable(np.zeros(1024, dtype=np.int64))
+        self._row_live = Growable(np.zeros(1024, dtype=np.bool_))
+        # the number of frames in the graph when it was last saved, and
+        # whether anything has changed since
+        self._n_saved = 0
+        self._dirty = False
+
+    def _load(self):
+        with np.load(self.hnsw_path) as arrays:
+            self.graph = HNSW.load(arrays)
+            self._timestamp = arrays['timestamp'].item()
+            self._document_ids = arrays['document_ids'].tolist()
+            self._document_numbers = dict(
+                (_id, i) for i, _id in enumerate(self._document_ids))
+            for name in ('documents', 'starts', 'durations', 'live'):
+                column = arrays[name].copy()
+                setattr(
+                    self,
+                    '_row_{name}'.format(**locals()),
+                    Growable(column, position=len(column)))
+        self._n_saved = len(self._row_live.logical_data)
+
+    def _save(self):
+        def save(f):
+            self.graph.save(
+                f,
+                timestamp=np.array(self._timestamp),
+                document_ids=np.array(self._document_ids, dtype=np.str_),
+                documents=self._row_documents.logical_data,
+                starts=self._row_starts.logical_data,
+                durations=self._row_durations.logical_data,
+                live=self._row_live.logical_data)
+
+        atomic_save(self.hnsw_path, save)
+        self._n_saved = len(self._row_live.logical_data)
+        self._dirty = False
+
+    def _maybe_save(self):
+        if self.graph is None:
+            return
+        n_frames = len(self._row_live.logical_data)
+        if n_frames - self._n_saved >= self._n_saved:
+            self._save()
+
+    def flush(self):
+        """
+        Save any frames written or deleted since the index was last saved
+        """
+        with self._lock:
+            if self._dirty and self.graph is not None:
+                self._save()
+
+    def close(self):
+        try:
+            self.stop()
+        except:
+            pass
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _listen(self, raise_when_empty=False):
+        try:
+            super(HNSWIndex, self)._listen(raise_when_empty=raise_when_empty)
+        finally:
+            self.flush()
+
+    def __len__(self):
+        return int(self._row_live.logical_data.sum())
+
+    def _last_indexed_timestamp(self):
+        return self._timestamp
+
+    def _prepare(self, _id):
+        """
+        Load the feature for document `_id`, returning a tuple of `(_id,
+        frames, starts, durations)`, with times in picoseconds.  `frames` is
+        `None` if the feature is empty
+        """
+        feature = self.feature(_id=_id, persistence=self.document)
+        frames, starts, durations = timestamped_frames(feature)
+        if not len(frames):
+            return _id, None, None, None
+
+        frames = np.asarray(frames, dtype=np.float32)
+        return _id, frames.reshape((len(frames), -1)), starts, durations
+
+    def _delete_document(self, _id):
+        try:
+            document_number = self._document_numbers[_id]
+        except KeyError:
+            return 0
+        rows = self._row_documents.logical_data == document_number
+        live = self._row_live.logical_data
+        n_deleted = int((live & rows).sum())
+        live[rows] = False
+        if n_deleted:
+            self._dirty = True
+        return n_deleted
+
+    def _n_dead(self):
+        live = self._row_live.logical_data
+        return len(live) - int(live.sum())
+
+    def _compact(self):
+        live = self._row_live.logical_data
+        rows = np.flatnonzero(live)
+        n_removed = len(live) - len(rows)
+        if not n_removed:
+            return 0
+
+        if not len(rows):
+            timestamp = self._timestamp
+            self._init()
+            self._timestamp = timestamp
+            self._dirty = True
+            return n_removed
+
+        graph = HNSW(
+            self.graph.dim,
+            M=self.M,
+            ef_construction=self.ef_construction,
+            distance_metric=self.distance_metric,
+            seed=self.seed)
+        graph.add(self.graph.vectors[rows])
+        self.graph = graph
+
+        for name in ('documents', 'starts', 'durations', 'live'):
+            attr = '_row_{name}'.format(**locals())
+            column = getattr(self, attr).logical_data[rows]
+            setattr(self, attr, Growable(column, position=len(column)))
+
+        self._dirty = True
+        return n_removed
+
+    def _maybe_compact(self):
+        n_frames = len(self._row_live.logical_data)
+        if n_frames and self._n_dead() > self.max_dead_fraction * n_frames:
+            self._compact()
+
+    def compact(self):
+        """
+        Rebuild the graph from live frames alone, permanently removing
+        deleted and replaced frames.
+
+        Returns:
+            the number of frames removed
+        """
+        with self._lock:
+            n_removed = self._compact()
+            if n_removed:
+                self._save()
+        return n_removed
+
+    def _write(self, prepared, timestamp=b''):
+        """
+        Insert the frames for any number of documents, replacing any
+        previously indexed for the same documents, and record the event-log
+        timestamp the index is now up to date with
+        """
+        try:
+            timestamp = timestamp.encode()
+        except AttributeError:
+            pass
+
+        with self._lock:
+            for _id, frames, starts, durations in prepared:
+                self._delete_document(_id)
+                if frames is None:
+                    continue
+
+                if self.graph is None:
+                    self.graph = HNSW(
+                        frames.shape[1],
+                        M=self.M,
+                        ef_construction=self.ef_construction,
+                        distance_metric=self.distance_metric,
+                        seed=self.seed)
+
+                try:
+                    document_number = self._document_numbers[_id]
+                except KeyError:
+                    document_number = len(self._document_ids)
+                    self._document_ids.append(_id)
+                    self._document_numbers[_id] = document_number
+
+                self.graph.add(frames)
+                self._row_documents.extend(
+                    np.full(len(frames), document_number, dtype=np.int32))
+                self._row_starts.extend(starts)
+                self._row_durations.extend(durations)
+                self._row_live.extend(np.ones(len(frames), dtype=np.bool_))
+
+            self._timestamp = timestamp
+            self._dirty = True
+            self._maybe_compact()
+            self._maybe_save()
+
+    def add(self, _id, timestamp=b''):
+        """
+        Index every frame of document `_id`, replacing any frames previously
+        indexed for it
+        """
+        self._write([self._prepare(_id)], timestamp)
+
+    def delete(self, _id):
+        """
+        Remove every frame of document `_id` from search results.  Deleted
+        frames remain in the graph, where they still help to route searches,
+        until it's compacted
+        """
+        with self._lock:
+            n_deleted = self._delete_document(_id)
+            self._maybe_compact()
+        return n_deleted
+
+    def _result(self, row):
+        document = self._document_ids[self._row_documents.data[row]]
+        ts = TimeSlice(
+            start=Picoseconds(int(self._row_starts.data[row])),
+            duration=Picoseconds(int(self._row_durations.data[row])))
+        return document, ts
+
+    def decode_query(self, binary_query):
+        return np.frombuffer(binary_query, dtype=np.float32)
+
+    def encode_query(self, feature):
+        if isinstance(feature, bytes):
+            return feature
+        return np.asarray(feature, dtype=np.float32).tobytes()
+
+    def random_search(self, n_results, ef=None):
+        with self._lock:
+            rows = np.flatnonzero(self._row_live.logical_data)
+            if not len(rows):
+                return SearchResults(b'', [])
+            query = self.graph.vectors[choice(rows)].copy()
+        return self.search(query, n_results, ef=ef)
+
+    def search(self, feature, n_results, ef=None):
+        """
+        Find the (approximately) `n_results` frames nearest to `feature`
+
+        Args:
+            feature (np.ndarray): the query vector, or its encoded bytes
+            n_results (int): the number of results to return
+            ef (int): overrides the index's `ef` for this search
+        """
+        code = self.encode_query(feature)
+        query = self.decode_query(code)
+        ef = ef or self.ef
+
+        with self._lock:
+            if self.graph is None:
+                return SearchResults(code, [])
+
+            live = self._row_live.logical_data
+            n_live = int(live.sum())
+            if not n_live:
+                return SearchResults(code, [])
+            # deleted frames are still in the graph, so ask for enough extra
+            # results that filtering them out should still leave n_results.
+            # Compaction bounds the dead fraction, and so this inflation
+            n_candidates = min(
+                len(live),
+                int(np.ceil(n_results * len(live) / n_live)))
+            indices, _ = self.graph.search(
+                query, n_candidates, max(ef, n_candidates))
+            indices = indices[live[indices]][:n_results]
+            results = [self._result(i) for i in indices]
+
+        return SearchResults(code, results)
@@ -0,0 +1,450 @@
+from __future__ import division
+cimport numpy as np
+import numpy as np
+from libc.stdlib cimport malloc, realloc, free
+
+INT_DTYPE = np.int64
+ctypedef np.int64_t INT_DTYPE_t
+
+LINK_DTYPE = np.int32
+ctypedef np.int32_t LINK_DTYPE_t
+
+FLOAT_DTYPE = np.float32
+ctypedef np.float32_t FLOAT_DTYPE_t
+
+cimport cython
+
+
+cdef struct Heap:
+    FLOAT_DTYPE_t *d
+    INT_DTYPE_t *n
+    Py_ssize_t size
+    Py_ssize_t capacity
+    # when true, the heap's root is its largest, rather than smallest, item
+    bint largest
+
+
+cdef inline bint _before(
+        Heap *h,
+        FLOAT_DTYPE_t da,
+        INT_DTYPE_t na,
+        FLOAT_DTYPE_t db,
+        INT_DTYPE_t nb) noexcept nogil:
+    if h.largest:
+        return da > db or (da == db and na > nb)
+    return da < db or (da == db and na < nb)
+
+
+cdef int _heap_init(Heap *h, Py_ssize_t capacity, bint largest) noexcept nogil:
+    if capacity < 1:
+        capacity = 1
+    h.d = <FLOAT_DTYPE_t *>malloc(capacity * sizeof(FLOAT_DTYPE_t))
+    h.n = <INT_DTYPE_t *>malloc(capacity * sizeof(INT_DTYPE_t))
+    h.size = 0
+    h.capacity = capacity
+    h.largest = largest
+    return h.d == NULL or h.n == NULL
+
+
+cdef void _heap_free(Heap *h) noexcept nogil:
+    free(h.d)
+    free(h.n)
+
+
+cdef int _heap_push(
+        Heap *h, FLOAT_DTYPE_t d, INT_DTYPE_t n) noexcept nogil:
+    cdef Py_ssize_t pos, parent
+    cdef FLOAT_DTYPE_t *new_d
+    cdef INT_DTYPE_t *new_n
+
+    if h.size == h.capacity:
+        new_d = <FLOAT_DTYPE_t *>realloc(
+            h.d, 2 * h.capacity * sizeof(FLOAT_DTYPE_t))
+        if new_d == NULL:
+            return 1
+        h.d = new_d
+        new_n = <INT_DTYPE_t *>realloc(
+            h.n, 2 * h.capacity * sizeof(INT_DTYPE_t))
+        if new_n == NULL:
+            return 1
+        h.n = new_n
+        h.capacity *= 2
+
+    pos = h.size
+    h.size += 1
+    while pos > 0:
+        parent = (pos - 1) // 2
+        if not _before(h, d, n, h.d[parent], h.n[parent]):
+            break
+        h.d[pos] = h.d[parent]
+        h.n[pos] = h.n[parent]
+        pos = parent
+    h.d[pos] = d
+    h.n[pos] = n
+    return 0
+
+
+cdef void _heap_pop(Heap *h) noexcept nogil:
+    cdef Py_ssize_t pos = 0, child
+    cdef FLOAT_DTYPE_t d
+    cdef INT_DTYPE_t n
+
+    h.size -= 1
+    if h.size == 0:
+        return
+    d = h.d[h.size]
+    n = h.n[h.size]
+    while True:
+        child = 2 * pos + 1
+        if child >= h.size:
+            break
+        if child + 1 < h.size and _before(
+                h, h.d[child + 1], h.n[child + 1], h.d[child], h.n[child]):
+            child += 1
+        if not _before(h, h.d[child], h.n[child], d, n):
+            break
+        h.d[pos] = h.d[child]
+        h.n[pos] = h.n[child]
+        pos = child
+    h.d[pos] = d
+    h.n[pos] = n
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline FLOAT_DTYPE_t _distance(
+        const FLOAT_DTYPE_t *a,
+        const FLOAT_DTYPE_t *b,
+        Py_ssize_t dim,
+        bint cosine) noexcept nogil:
+    cdef Py_ssize_t i
+    cdef FLOAT_DTYPE_t total = 0, diff
+    if cosine:
+        for i in range(dim):
+            total += a[i] * b[i]
+        return 1 - total
+    for i in range(dim):
+        diff = a[i] - b[i]
+        total += diff * diff
+    return total
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline Py_ssize_t _row(
+        const LINK_DTYPE_t[::1] rows,
+        bint has_rows,
+        INT_DTYPE_t node) noexcept nogil:
+    if not has_rows:
+        return node
+    return rows[node]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def search_layer(
+        const FLOAT_DTYPE_t[:, ::1] vectors,
+        const LINK_DTYPE_t[:, ::1] links,
+        const LINK_DTYPE_t[::1] rows,
+        const FLOAT_DTYPE_t[::1] query,
+        const INT_DTYPE_t[::1] entry_points,
+        Py_ssize_t ef,
+        bint cosine,
+        Py_ssize_t n_nodes):
+    """
+    Best-first search of a single layer of a graph, without holding the GIL
+
+    Args:
+        vectors: the vectors of every node in the graph
+        links: each row holds a node's neighbors, padded with -1
+        rows: the row of `links` belonging to each node, or `None` if node
+            `i` is described by row `i`
+        query: the query vector
+        entry_points: the nodes from which the search begins
+        ef: the number of nearest nodes to keep while searching
+        cosine: when true, distance is one minus the dot product, and
+            otherwise, squared euclidean distance
+        n_nodes: the number of nodes in the graph
+
+    Returns:
+        a tuple of `(distances, nodes)` for (at most) the `ef` nearest nodes
+        found, nearest first
+    """
+    cdef Py_ssize_t dim = vectors.shape[1]
+    cdef Py_ssize_t max_links = links.shape[1]
+    cdef Py_ssize_t i, j, row
+    cdef INT_DTYPE_t node, neighbor
+    cdef FLOAT_DTYPE_t d
+    cdef Heap candidates, results
+    cdef int failed = 0
+    cdef bint has_rows = rows is not None
+
+    if ef < 1:
+        raise ValueError('ef must be at least one')
+    if query.shape[0] != dim:
+        raise ValueError(
+            'query has {q} dimensions, but vectors have {dim}'.format(
+                q=query.shape[0], dim=dim))
+
+    visited_arr = np.zeros(n_nodes, dtype=np.uint8)
+    cdef np.uint8_t[::1] visited = visited_arr
+
+    failed |= _heap_init(&candidates, ef, False)
+    failed |= _heap_init(&results, ef + 1, True)
+    if failed:
+        _heap_free(&candidates)
+        _heap_free(&results)
+        raise MemoryError()
+
+    with nogil:
+        for i in range(entry_points.shape[0]):
+            node = entry_points[i]
+            if visited[node]:
+                continue
+            visited[node] = 1
+            d = _distance(&vectors[node, 0], &query[0], dim, cosine)
+            failed |= _heap_push(&candidates, d, node)
+            failed |= _heap_push(&results, d, node)
+            if results.size > ef:
+                _heap_pop(&results)
+
+        while candidates.size and not failed:
+            d = candidates.d[0]
+            node = candidates.n[0]
+            _heap_pop(&candidates)
+            if results.size >= ef and d > results.d[0]:
+                break
+
+            row = _row(rows, has_rows, node)
+            for j in range(max_links):
+                neighbor = links[row, j]
+                if neighbor < 0:
+                    break
+                if visited[neighbor]:
+                    continue
+                visited[neighbor] = 1
+                d = _distance(&vectors[neighbor, 0], &query[0], dim, cosine)
+                if results.size < ef or d < results.d[0]:
+                    failed |= _heap_push(&candidates, d, neighbor)
+                    failed |= _heap_push(&results, d, neighbor)
+                    if results.size > ef:
+                        _heap_pop(&results)
+
+    if failed:
+        _heap_free(&candidates)
+        _heap_free(&results)
+        raise MemoryError()
+
+    distances = np.ndarray(results.size, dtype=FLOAT_DTYPE)
+    nodes = np.ndarray(results.size, dtype=INT_DTYPE)
+    cdef FLOAT_DTYPE_t[::1] distances_view = distances
+    cdef INT_DTYPE_t[::1] nodes_view = nodes
+    with nogil:
+        # the farthest node is at the root of the results heap
+        for i in range(results.size - 1, -1, -1):
+            distances_view[i] = results.d[0]
+            nodes_view[i] = results.n[0]
+            _heap_pop(&results)
+
+    _heap_free(&candidates)
+    _heap_free(&results)
+    return distances, nodes
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef Py_ssize_t _select(
+        const FLOAT_DTYPE_t[:, ::1] vectors,
+        const INT_DTYPE_t *nodes,
+        const FLOAT_DTYPE_t *distances,
+        Py_ssize_t n,
+        Py_ssize_t M,
+        bint cosine,
+        INT_DTYPE_t *selected,
+        INT_DTYPE_t *discarded) noexcept nogil:
+    """
+    Choose up to `M` of `n` candidates, sorted by distance, preferring those
+    that aren't closer to an already-selected candidate than they are to the
+    base vector, and filling any remaining slots with the nearest of the
+    others.  Returns the number chosen, which are written to `selected`
+    """
+    cdef Py_ssize_t i, j, n_selected = 0, n_discarded = 0
+    cdef Py_ssize_t dim = vectors.shape[1]
+    cdef bint keep
+
+    if n <= M:
+        for i in range(n):
+            selected[i] = nodes[i]
+        return n
+
+    for i in range(n):
+        if n_selected >= M:
+            break
+        keep = True
+        for j in range(n_selected):
+            if _distance(
+                    &vectors[nodes[i], 0],
+                    &vectors[selected[j], 0],
+                    dim,
+                    cosine) < distances[i]:
+                keep = False
+                break
+        if keep:
+            selected[n_selected] = nodes[i]
+            n_selected += 1
+        else:
+            discarded[n_discarded] = nodes[i]
+            n_discarded += 1
+
+    i = 0
+    while n_selected < M and i < n_discarded:
+        selected[n_selected] = discarded[i]
+        n_selected += 1
+        i += 1
+
+    return n_selected
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def select_neighbors(
+        const FLOAT_DTYPE_t[:, ::1] vectors,
+        const INT_DTYPE_t[::1] nodes,
+        const FLOAT_DTYPE_t[::1] distances,
+        Py_ssize_t M,
+        bint cosine):
+    """
+    Choose up to `M` neighbors from candidate `nodes`, sorted by their
+    `distances` from a base vector, preferring those that aren't closer to an
+    already-selected neighbor than they are to the base vector, so that
+    links point in diverse directions
+    """
+    cdef Py_ssize_t n = nodes.shape[0]
+    selected = np.ndarray(max(n, 1), dtype=INT_DTYPE)
+    discarded = np.ndarray(max(n, 1), dtype=INT_DTYPE)
+    cdef INT_DTYPE_t[::1] selected_view = selected
+    cdef INT_DTYPE_t[::1] discarded_view = discarded
+    cdef Py_ssize_t n_selected
+    if n == 0:
+        return selected[:0]
+    with nogil:
+        n_selected = _select(
+            vectors,
+            &nodes[0],
+            &distances[0],
+            n,
+            M,
+            cosine,
+            &selected_view[0],
+            &discarded_view[0])
+    return selected[:n_selected]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def connect(
+        const FLOAT_DTYPE_t[:, ::1] vectors,
+        LINK_DTYPE_t[:, ::1] links,
+        const LINK_DTYPE_t[::1] rows,
+        INT_DTYPE_t node,
+        const INT_DTYPE_t[::1] nodes,
+        const FLOAT_DTYPE_t[::1] distances,
+        Py_ssize_t M,
+        bint cosine):
+    """
+    Link `node` to up to `M` neighbors chosen from candidate `nodes`, sorted
+    by their `distances` from it, and link each chosen neighbor back to
+    `node`.  Neighbors whose rows of `links` are already full keep the most
+    diverse of their existing links, plus `node`
+
+    Returns:
+        the number of neighbors `node` was linked to
+    """
+    cdef Py_ssize_t n = nodes.shape[0]
+    cdef Py_ssize_t max_links = links.shape[1]
+    cdef Py_ssize_t dim = vectors.shape[1]
+    cdef Py_ssize_t cap = max(n, max_links + 1)
+    cdef Py_ssize_t i, j, k, count, row, n_selected, n_pruned
+    cdef INT_DTYPE_t neighbor, tn
+    cdef FLOAT_DTYPE_t td
+    cdef bint has_rows = rows is not None
+
+    if M > max_links:
+        raise ValueError('M must be no greater than the width of links')
+
+    selected = np.ndarray(max(cap, 1), dtype=INT_DTYPE)
+    discarded = np.ndarray(max(cap, 1), dtype=INT_DTYPE)
+    candidates = np.ndarray(max_links + 1, dtype=INT_DTYPE)
+    candidate_distances = np.ndarray(max_links + 1, dtype=FLOAT_DTYPE)
+    cdef INT_DTYPE_t[::1] selected_view = selected
+    cdef INT_DTYPE_t[::1] discarded_view = discarded
+    cdef INT_DTYPE_t[::1] c_view = candidates
+    cdef FLOAT_DTYPE_t[::1] cd_view = candidate_distances
+    # neighbors are selected into the front of `selected`, and pruned links
+    # are selected into the remainder
+    pruned_array = np.ndarray(max_links + 1, dtype=INT_DTYPE)
+    cdef INT_DTYPE_t[::1] pruned = pruned_array
+
+    if n == 0:
+        return 0
+
+    with nogil:
+        n_selected = _select(
+            vectors,
+            &nodes[0],
+            &distances[0],
+            n,
+            M,
+            cosine,
+            &selected_view[0],
+            &discarded_view[0])
+
+        row = _row(rows, has_rows, node)
+        for j in range(max_links):
+            links[row, j] = selected_view[j] if j < n_selected else -1
+
+        for i in range(n_selected):
+            neighbor = selected_view[i]
+            row = _row(rows, has_rows, neighbor)
+
+            count = 0
+            while count < max_links and links[row, count] >= 0:
+                count += 1
+
+            if count < max_links:
+                links[row, count] = <LINK_DTYPE_t>node
+                continue
+
+            # the neighbor's links are full, so keep the most diverse of its
+            # existing links and the new one, ordered by distance, with ties
+            # broken by their original order
+            for k in range(max_links):
+                c_view[k] = links[row, k]
+            c_view[max_links] = node
+            for k in range(max_links + 1):
+                cd_view[k] = _distance(
+                    &vectors[neighbor, 0], &vectors[c_view[k], 0], dim, cosine)
+            for k in range(1, max_links + 1):
+                td = cd_view[k]
+                tn = c_view[k]
+                j = k - 1
+                while j >= 0 and cd_view[j] > td:
+                    cd_view[j + 1] = cd_view[j]
+                    c_view[j + 1] = c_view[j]
+                    j -= 1
+                cd_view[j + 1] = td
+                c_view[j + 1] = tn
+
+            n_pruned = _select(
+                vectors,
+                &c_view[0],
+                &cd_view[0],
+                max_links + 1,
+                max_links,
+                cosine,
+                &pruned[0],
+                &discarded_view[0])
+            for j in range(max_links):
+                links[row, j] = pruned[j] if j < n_pruned else -1
+
+    return n_selected
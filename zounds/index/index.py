@@ -3,9 +3,27 @@ import os
 import threading
 import numpy as np
 from .hammingdb import HammingDb
+from .payload import BinaryPayload, LRUCache, is_binary_payload
+from .indexer import IndexingWorker, event_timestamp
 from zounds.persistence import TimeSliceEncoder, TimeSliceDecoder
 from zounds.timeseries import ConstantRateTimeSeries
-from zounds.timeseries import TimeSlice
+from zounds.timeseries import TimeSlice, TimeSliceView, Microseconds
+
+
+def timestamped_frames(feature):
+    """
+    Return a tuple of `(frames, starts, durations)` for a constant or variable
+    rate feature, with starts and durations as integer picosecond arrays, so
+    that no :class:`TimeSlice` needs to be created for each frame
+    """
+    try:
+        arr = ConstantRateTimeSeries(feature)
+    except ValueError:
+        starts, durations = feature.timestamps()
+        return feature.slicedata, starts, durations
+
+    starts, durations = arr.timestamps()
+    return np.asarray(arr), starts, durations
 
 
 class SearchResults(object):
@@ -19,7 +37,137 @@ class SearchResults(object):
             yield result
 
 
-class HammingIndex(object):
+class BaseIndex(object):
+    """
+    Common behavior for indexes that stay up-to-date with a feature by
+    subscribing to the event log of the `document` class it belongs to.
+
+    Subclasses implement `_prepare`, which loads and encodes a single
+    document, `_write`, which stores a batch of prepared documents along with
+    the event-log timestamp they bring the index up to, and
+    `_last_indexed_timestamp`
+    """
+
+    def __init__(
+            self,
+            document,
+            feature,
+            n_indexing_workers=1,
+            max_pending_events=64,
+            index_batch_size=64):
+
+        super(BaseIndex, self).__init__()
+        self.document = document
+        self.feature = feature
+        self.n_indexing_workers = n_indexing_workers
+        self.max_pending_events = max_pending_events
+        self.index_batch_size = index_batch_size
+
+        try:
+            self.event_log = document.event_log
+        except AttributeError:
+            self.event_log = None
+
+        self.thread = None
+        self.indexer = None
+
+    def stop(self):
+        self.event_log.unsubscribe()
+
+    def listen(self):
+        self.thread = threading.Thread(target=self._listen)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _synchronously_process_events(self):
+        self._listen(raise_when_empty=True)
+
+    def add_all(self):
+        for doc in self.document:
+            self.add(doc._id)
+
+    def _prepare(self, _id):
+        raise NotImplementedError()
+
+    def _write(self, prepared, timestamp=b''):
+        raise NotImplementedError()
+
+    def _last_indexed_timestamp(self):
+        raise NotImplementedError()
+
+    def _events(self, last_timestamp, raise_when_empty):
+        """
+        Yield `(timestamp, _id)` for each event-log message after
+        `last_timestamp`, with `_id` set to `None` for messages about other
+        features
+        """
+        subscription = self.event_log.subscribe(
+            last_id=last_timestamp, raise_when_empty=raise_when_empty)
+
+        for timestamp, data in subscription:
+
+            # parse the data from the event stream
+            data = json.loads(data)
+            _id, name, version = data['_id'], data['name'], data['version']
+
+            # ensure that it's about the feature we're subscribed to
+            if name != self.feature.key or version != self.feature.version:
+                yield timestamp, None
+                continue
+
+            yield timestamp, _id
+
+    def _listen(self, raise_when_empty=False):
+
+        last_timestamp = self._last_indexed_timestamp()
+
+        if not self.event_log:
+            raise ValueError(
+                '{self.document} must have an event log configured'
+                    .format(**locals()))
+
+        self.indexer = IndexingWorker(
+            self._events(last_timestamp, raise_when_empty),
+            self._prepare,
+            self._write,
+            n_workers=self.n_indexing_workers,
+            max_pending=self.max_pending_events,
+            batch_size=self.index_batch_size,
+            indexed_timestamp=last_timestamp or None,
+            head=lambda: self._event_log_bounds()[1])
+        self.indexer.run()
+
+    def _event_log_bounds(self):
+        """
+        The ids of the first and most recent messages in the event log, read
+        directly from its storage, rather than from a subscription
+        """
+        try:
+            with self.event_log.env.begin() as txn:
+                with txn.cursor() as cursor:
+                    first = cursor.key() if cursor.first() else None
+                    head = cursor.key() if cursor.last() else None
+        except AttributeError:
+            return None, None
+        return first, head
+
+    def indexing_lag(self):
+        """
+        The time elapsed between the most recent event in the event log, and
+        the most recent event that has been indexed
+        """
+        if self.indexer is not None:
+            return self.indexer.lag
+
+        first, head = self._event_log_bounds()
+        head = event_timestamp(head)
+        if head is None:
+            return Microseconds(0)
+        indexed = event_timestamp(self._last_indexed_timestamp() or first)
+        return Microseconds(max(0, head - indexed))
+
+
+class HammingIndex(BaseIndex):
     def __init__(
             self,
             document,
@@ -29,15 +177,28 @@ class HammingIndex(object):
             db_size_bytes=1000000000,
             listen=False,
             writeonly=False,
+            multi_index=False,
+            n_shards=None,
+            binary_payloads=True,
+            result_cache_size=10000,
+            n_indexing_workers=1,
+            max_pending_events=64,
+            index_batch_size=64,
             **extra_data):
 
-        super(HammingIndex, self).__init__()
-        self.document = document
-        self.feature = feature
+        super(HammingIndex, self).__init__(
+            document,
+            feature,
+            n_indexing_workers=n_indexing_workers,
+            max_pending_events=max_pending_events,
+            index_batch_size=index_batch_size)
         self.db_size_bytes = db_size_bytes
         self.path = path
         self.extra_data = extra_data
         self.writeonly = writeonly
+        self.multi_index = multi_index
+        self.n_shards = n_shards
+        self.binary_payloads = binary_payloads
 
         version = version or self.feature.version
 
@@ -45,20 +206,22 @@ class HammingIndex(object):
             self.path, 'index.{self.feature.key}.{version}'
                 .format(**locals()))
 
-        try:
-            self.event_log = document.event_log
-        except AttributeError:
-            self.event_log = None
-
         try:
             self.hamming_db = HammingDb(
-                self.hamming_db_path, code_size=None, writeonly=self.writeonly)
+                self.hamming_db_path,
+                code_size=None,
+                writeonly=self.writeonly,
+                multi_index=self.multi_index,
+                n_shards=self.n_shards)
         except ValueError:
             self.hamming_db = None
 
         self.encoder = TimeSliceEncoder()
         self.decoder = TimeSliceDecoder()
-        self.thread = None
+        self.payload = BinaryPayload()
+        self._result_cache = LRUCache(result_cache_size)
+        self._document_ids = {}
+        self._init_lock = threading.Lock()
 
         if listen:
             self.listen()
@@ -88,86 +251,186 @@ class HammingIndex(object):
             return 0
         return len(self.hamming_db)
 
-    def stop(self):
-        self.event_log.unsubscribe()
-
-    def listen(self):
-        self.thread = threading.Thread(target=self._listen)
-        self.thread.daemon = True
-        self.thread.start()
-
     def _init_hamming_db(self, code=None):
         if self.hamming_db is not None:
             return
-        code_size = len(code) if code else None
-        self.hamming_db = HammingDb(
-            self.hamming_db_path, code_size=code_size, writeonly=self.writeonly)
-
-    def _synchronously_process_events(self):
-        self._listen(raise_when_empty=True)
-
-    def add_all(self):
-        for doc in self.document:
-            self.add(doc._id)
+        with self._init_lock:
+            if self.hamming_db is not None:
+                return
+            code_size = len(code) if code else None
+            self.hamming_db = HammingDb(
+                self.hamming_db_path,
+                code_size=code_size,
+                writeonly=self.writeonly,
+                multi_index=self.multi_index,
+                n_shards=self.n_shards)
 
-    def _collect_extra_data(self, _id, ts):
+    def _collect_extra_data(self, doc, ts):
         if not self.extra_data:
             return None
 
-        doc = self.document(_id)
         return dict(
             ((key, func(doc, ts)) for key, func in self.extra_data.items()))
 
-    def add(self, _id, timestamp=b''):
+    def _payload(self, _id, document_number, ts, extra_data):
+        if self.binary_payloads:
+            return self.payload.encode(document_number, ts, extra_data)
+
+        encoded_ts = dict(
+            _id=_id,
+            **self.encoder.dict(ts))
+        if extra_data:
+            encoded_ts['extra_data'] = extra_data
+        return json.dumps(encoded_ts)
+
+    def _prepare(self, _id):
+        """
+        Load the feature for document `_id`, and encode it, returning a tuple
+        of `(_id, codes, payloads)`.  `codes` is `None` if the feature is
+        empty
+        """
         # load the feature from the feature database
         feature = self.feature(_id=_id, persistence=self.document)
-
+        frames, starts, durations = timestamped_frames(feature)
+        if not len(frames):
+            return _id, None, []
+
+        codes = self.encode_queries(frames)
+        self._init_hamming_db(codes[0].tobytes())
+
+        document_number = None
+        if self.binary_payloads:
+            document_number = self.hamming_db.document_number(_id)
+
+        if self.binary_payloads and not self.extra_data:
+            payloads = self.payload.encode_many(
+                document_number, starts, durations)
+            return _id, codes, payloads
+
+        doc = self.document(_id) if self.extra_data else None
+        payloads = [
+            self._payload(
+                _id, document_number, ts, self._collect_extra_data(doc, ts))
+            for ts in TimeSliceView(starts, durations)]
+        return _id, codes, payloads
+
+    def _write(self, prepared, timestamp=b''):
+        """
+        Write the codes and payloads for any number of documents, replacing
+        any previously indexed for the same documents, and record the
+        event-log timestamp they bring the index up to, in a single
+        transaction
+        """
         try:
-            arr = ConstantRateTimeSeries(feature)
-        except ValueError:
-            arr = feature
-
-        # extract codes and timeslices from the feature
-        for ts, data in arr.iter_slices():
-            code = self.encode_query(data)
-            encoded_ts = dict(
-                _id=_id,
-                **self.encoder.dict(ts))
-            extra_data = self._collect_extra_data(_id, ts)
-            if extra_data:
-                encoded_ts['extra_data'] = extra_data
-            self._init_hamming_db(code)
-            self.hamming_db.append(code, json.dumps(encoded_ts))
-            self.hamming_db.set_metadata(b'timestamp', timestamp)
+            timestamp = timestamp.encode()
+        except AttributeError:
+            pass
 
-    def _listen(self, raise_when_empty=False):
+        # only the most recent version of each document should be kept
+        latest = dict((_id, (codes, ps)) for _id, codes, ps in prepared)
+        non_empty = [
+            (_id, codes, ps) for _id, (codes, ps) in latest.items()
+            if codes is not None]
 
         if self.hamming_db is not None:
-            last_timestamp = self.hamming_db.get_metadata('timestamp') or ''
-        else:
-            last_timestamp = ''
+            for _id, (codes, _) in latest.items():
+                if codes is None:
+                    self.hamming_db.delete_document(_id)
 
-        if not self.event_log:
-            raise ValueError(
-                '{self.document} must have an event log configured'
-                    .format(**locals()))
+        if not non_empty:
+            if self.hamming_db is not None:
+                self.hamming_db.extend([], [], {b'timestamp': timestamp})
+            return
 
-        subscription = self.event_log.subscribe(
-            last_id=last_timestamp, raise_when_empty=raise_when_empty)
+        codes = np.concatenate([codes for _, codes, _ in non_empty])
+        payloads = [p for _, _, ps in non_empty for p in ps]
+        documents = [
+            _id for _id, codes, _ in non_empty for _ in range(len(codes))]
+        self._init_hamming_db(codes[0].tobytes())
+        self.hamming_db.extend(
+            codes,
+            payloads,
+            {b'timestamp': timestamp},
+            documents=documents,
+            replace=True)
 
-        for timestamp, data in subscription:
+    def add(self, _id, timestamp=b''):
+        """
+        Index every frame of document `_id`, replacing any frames previously
+        indexed for it
+        """
+        self._write([self._prepare(_id)], timestamp)
+
+    def reindex(self, _id):
+        """
+        Re-compute the codes for document `_id`, e.g. after it has been
+        re-processed, replacing its stale frames.  Replaced frames continue to
+        take up space until :meth:`compact` is called
+        """
+        self._write([self._prepare(_id)], self._last_indexed_timestamp())
+
+    def delete(self, _id):
+        """
+        Remove every frame of document `_id` from search results
+        """
+        if self.hamming_db is None:
+            return 0
+        return self.hamming_db.delete_document(_id)
+
+    def compact(self, background=False):
+        """
+        Permanently remove deleted and replaced frames, so that searches only
+        scan live data.
+
+        Args:
+            background (bool): if `True`, compact in a separate thread, so
+                that searches may continue meanwhile.  They'll pick up the
+                compacted data once it's complete
+
+        Returns:
+            the thread performing the compaction, if `background` is `True`,
+            and otherwise the number of frames removed
+        """
+        if self.hamming_db is None:
+            return None if background else 0
 
-            # parse the data from the event stream
-            data = json.loads(data)
-            _id, name, version = data['_id'], data['name'], data['version']
+        if not background:
+            return self.hamming_db.compact()
 
-            # ensure that it's about the feature we're subscribed to
-            if name != self.feature.key or version != self.feature.version:
-                continue
+        thread = threading.Thread(
+            target=self.hamming_db.compact, kwargs=dict(reload=False))
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def _last_indexed_timestamp(self):
+        if self.hamming_db is None:
+            return b''
+        return self.hamming_db.get_metadata(b'timestamp') or b''
+
+    def _document_id(self, document_number):
+        try:
+            return self._document_ids[document_number]
+        except KeyError:
+            _id = self.hamming_db.document_id(document_number).decode()
+            self._document_ids[document_number] = _id
+            return _id
+
+    def _parse_binary_result(self, result):
+        document_number, start, duration, extra_data = \
+            self.payload.decode(result)
+        _id = self._document_id(document_number)
+        ts = TimeSlice(start=start, duration=duration)
+
+        if not self.extra_data:
+            return _id, ts
 
-            self.add(_id, timestamp)
+        return _id, ts, extra_data
 
     def _parse_result(self, result):
+        if is_binary_payload(result):
+            return self._parse_binary_result(result)
+
         d = json.loads(result)
         ts = TimeSlice(**self.decoder.kwargs(d))
 
@@ -176,6 +439,27 @@ class HammingIndex(object):
 
         return d['_id'], ts, d['extra_data']
 
+    def _results(self, ids):
+        """
+        Parse the results for each LMDB id, only reading and decoding payloads
+        that aren't already cached
+        """
+        results = [self._result_cache.get(_id) for _id in ids]
+        misses = [_id for _id, result in zip(ids, results) if result is None]
+        if not misses:
+            return results
+
+        payloads = self.hamming_db.payloads(misses)
+        parsed = dict(
+            (_id, self._parse_result(payload))
+            for _id, payload in zip(misses, payloads))
+        for _id, result in parsed.items():
+            self._result_cache[_id] = result
+
+        return [
+            parsed[_id] if result is None else result
+            for _id, result in zip(ids, results)]
+
     def decode_query(self, binary_query):
         packed = np.fromstring(binary_query, dtype=np.uint8)
         return np.unpackbits(packed)
@@ -192,17 +476,63 @@ class HammingIndex(object):
                 'feature must be a raw bit string, an already packed uint64'
                 'array, or an "unpacked" uint8 or bool array')
 
+    def encode_queries(self, features):
+        """
+        Encode many features at once, as in `encode_query`, producing a
+        two-dimensional uint8 array with one packed code per row
+        """
+        features = np.asarray(features)
+        if features.dtype == np.uint64:
+            codes = np.ascontiguousarray(features).view(np.uint8)
+        elif features.dtype == np.uint8 or features.dtype == np.bool_:
+            codes = np.packbits(features, axis=-1)
+        else:
+            raise ValueError(
+                'features must be already packed uint64 arrays, or '
+                '"unpacked" uint8 or bool arrays')
+        return codes.reshape((len(features), -1))
+
     def random_search(self, n_results, multithreaded=False, sort=False):
         self._init_hamming_db()
-        code, raw_results = self.hamming_db.random_search(
-            n_results, multithreaded, sort=sort)
-        parsed_results = (self._parse_result(r) for r in raw_results)
-        return SearchResults(code, parsed_results)
-
-    def search(self, feature, n_results, multithreaded=False, sort=False):
+        code = self.hamming_db.random_code()
+        return self.search(code, n_results, multithreaded, sort=sort)
+
+    def search_many(self, features, n_results, sort=False):
+        """
+        Search for many features at once, returning a list containing a
+        `SearchResults` instance for each
+        """
+        self._init_hamming_db()
+        codes = [self.encode_query(feature) for feature in features]
+        ids = self.hamming_db.search_many_ids(codes, n_results, sort=sort)
+        if not ids:
+            return []
+        results = iter(self._results(np.concatenate(ids)))
+        return [
+            SearchResults(code, [next(results) for _ in row])
+            for code, row in zip(codes, ids)]
+
+    def search(
+            self,
+            feature,
+            n_results,
+            multithreaded=False,
+            sort=False,
+            mask=None,
+            ids=None):
+        self._init_hamming_db()
+        code = self.encode_query(feature)
+        ids = self.hamming_db.search_ids(
+            code, n_results, multithreaded, sort=sort, mask=mask, ids=ids)
+        return SearchResults(code, self._results(ids))
+
+    def radius_search(self, feature, radius, mask=None, ids=None):
+        """
+        Find every segment within `radius` bits of `feature`, nearest first.
+        See :meth:`HammingDb.radius_search_ids` for the meaning of `mask` and
+        `ids`
+        """
         self._init_hamming_db()
         code = self.encode_query(feature)
-        raw_results = self.hamming_db.search(
-            code, n_results, multithreaded, sort=sort)
-        parsed_results = (self._parse_result(r) for r in raw_results)
-        return SearchResults(code, parsed_results)
+        ids = self.hamming_db.radius_search_ids(code, radius, mask, ids)
+        return SearchResults(code, self._results(ids))
@@ -0,0 +1,226 @@
+import threading
+from queue import Queue
+from zounds.timeseries import Microseconds
+
+# marks the end of the event stream, as it passes through the pipeline
+_DONE = object()
+
+
+class _Failed(object):
+    def __init__(self, exception):
+        super(_Failed, self).__init__()
+        self.exception = exception
+
+
+def event_timestamp(_id):
+    """
+    Recover the time, in microseconds since the epoch, at which an event-log
+    entry was appended.  Event-log ids are a hex-encoded timestamp, followed
+    by sixteen hex characters of random data
+    """
+    if not _id:
+        return None
+    try:
+        _id = _id.decode()
+    except AttributeError:
+        pass
+    return int(_id[:-16], 16)
+
+
+class IndexingWorker(object):
+    """
+    Consumes a stream of events, loading the data for each with a pool of
+    worker threads, and writing the results in coalesced batches.
+
+    At most `max_pending` events may be loading, or waiting to be written,
+    at any time; once that limit is reached, reading from the event stream
+    blocks until the writer catches up.  Results are always written in event
+    order, so that the timestamp passed to `write` can be used as a
+    checkpoint: every event up to and including it has been indexed.
+
+    Args:
+        events (iterable): an iterable of `(timestamp, _id)` tuples.  `_id`
+            may be `None` for events that should only advance the checkpoint
+        load (callable): called with a single `_id` from a worker thread,
+            returning an item to be written, or `None` if there is nothing to
+            write
+        write (callable): called with a list of items and the timestamp of the
+            most recent event they cover, from a single writer thread
+        n_workers (int): the number of threads calling `load`
+        max_pending (int): the maximum number of events in flight
+        batch_size (int): the maximum number of items passed to each call to
+            `write`
+        indexed_timestamp: the timestamp of the last event indexed before
+            this worker started, if any
+        head (callable): called with no arguments, returning the timestamp of
+            the most recent event in the underlying event log.  When omitted,
+            :attr:`lag` is measured from the most recent event read, which
+            stalls while reading is blocked by `max_pending`
+
+    Raises:
+        the first exception raised by `load` or `write`, from :meth:`run`.
+        Nothing after the event that failed is written, so that it will be
+        retried when indexing resumes from the last checkpoint
+    """
+
+    def __init__(
+            self,
+            events,
+            load,
+            write,
+            n_workers=1,
+            max_pending=64,
+            batch_size=64,
+            indexed_timestamp=None,
+            head=None):
+
+        super(IndexingWorker, self).__init__()
+
+        if n_workers < 1:
+            raise ValueError('n_workers must be at least one')
+
+        if max_pending < 1:
+            raise ValueError('max_pending must be at least one')
+
+        self.events = events
+        self.load = load
+        self.write = write
+        self.n_workers = n_workers
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.head = head
+
+        self.head_timestamp = indexed_timestamp
+        self.indexed_timestamp = indexed_timestamp
+        self._first_timestamp = None
+        self.n_indexed = 0
+        self.exception = None
+
+        self._pending = threading.Semaphore(max_pending)
+        self._to_load = Queue()
+        self._loaded = Queue()
+
+    @property
+    def lag(self):
+        """
+        The time between the most recent event in the event log, and the most
+        recent event indexed
+        """
+        head = event_timestamp(self.head_timestamp)
+        if self.head is not None:
+            head = event_timestamp(self.head()) or head
+        if head is None:
+            return Microseconds(0)
+        indexed = event_timestamp(
+            self.indexed_timestamp or self._first_timestamp)
+        return Microseconds(max(0, head - indexed))
+
+    def _load(self):
+        while True:
+            task = self._to_load.get()
+            if task is _DONE:
+                self._loaded.put(_DONE)
+                return
+
+            sequence, timestamp, _id = task
+            try:
+                item = None if _id is None else self.load(_id)
+            except Exception as e:
+                item = _Failed(e)
+            self._loaded.put((sequence, timestamp, item))
+
+    def _ready(self, completed, sequence):
+        """
+        Remove and return the contiguous run of completed events beginning at
+        `sequence`
+        """
+        ready = []
+        while sequence in completed:
+            ready.append(completed.pop(sequence))
+            sequence += 1
+        return ready, sequence
+
+    def _flush(self, ready):
+        try:
+            self._write_ready(ready)
+        finally:
+            # free up space for more events, only once these are written
+            for _ in ready:
+                self._pending.release()
+
+    def _write_ready(self, ready):
+        if self.exception is not None:
+            # a previous event failed, so nothing more may be written
+            return
+
+        for i, (_, item) in enumerate(ready):
+            if isinstance(item, _Failed):
+                self.exception = item.exception
+                ready = ready[:i]
+                break
+
+        for i in range(0, len(ready), self.batch_size):
+            chunk = ready[i: i + self.batch_size]
+            items = [item for _, item in chunk if item is not None]
+            timestamp = chunk[-1][0]
+            try:
+                self.write(items, timestamp)
+            except Exception as e:
+                self.exception = e
+                return
+            self.indexed_timestamp = timestamp
+            self.n_indexed += len(items)
+
+    def _write(self):
+        completed = {}
+        next_sequence = 0
+        n_done = 0
+
+        while n_done < self.n_workers:
+            result = self._loaded.get()
+
+            # coalesce everything that has already finished loading
+            while True:
+                if result is _DONE:
+                    n_done += 1
+                else:
+                    sequence, timestamp, item = result
+                    completed[sequence] = (timestamp, item)
+
+                if self._loaded.empty():
+                    break
+                result = self._loaded.get()
+
+            ready, next_sequence = self._ready(completed, next_sequence)
+            self._flush(ready)
+
+    def run(self):
+        """
+        Index every event, blocking until the event stream is exhausted and
+        every result has been written
+        """
+        loaders = [
+            threading.Thread(target=self._load) for _ in range(self.n_workers)]
+        writer = threading.Thread(target=self._write)
+        for thread in loaders + [writer]:
+            thread.daemon = True
+            thread.start()
+
+        try:
+            for sequence, (timestamp, _id) in enumerate(self.events):
+                self._pending.acquire()
+                if self.exception is not None:
+                    break
+                self.head_timestamp = timestamp
+                if self._first_timestamp is None:
+                    self._first_timestamp = timestamp
+                self._to_load.put((sequence, timestamp, _id))
+        finally:
+            for _ in loaders:
+                self._to_load.put(_DONE)
+
+        for thread in loaders + [writer]:
+            thread.join()
+
+        if self.exception is not None:
+            raise self.exception
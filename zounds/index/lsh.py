@@ -0,0 +1,120 @@
+from itertools import combinations
+import numpy as np
+from .brute_force import BaseBruteForceSearch, top_k
+from .index import SearchResults
+from .multiindex import gather_ranges
+from zounds.nputil import packed_hamming_distance
+
+
+class MultiProbeLSHSearch(BaseBruteForceSearch):
+    """
+    Approximate nearest-neighbor search over packed binary codes, such as
+    those produced by :class:`~zounds.learn.SimHash` with `packbits=True`,
+    using multi-probe locality-sensitive hashing.
+
+    Each of `n_tables` hash tables keys every code by a different random
+    subset of `bits_per_table` of its bits.  Codes close in hamming space are
+    likely to agree on every bit in at least one subset.  Rather than
+    building many more tables to increase recall, each table is also probed
+    at every key within `probe_radius` bits of the query's key.  Candidates
+    from all tables are then ranked by their exact hamming distance to the
+    query.
+
+    Args:
+        gen (generator): a generator of `(_id, feature)` tuples, where each
+            feature is a packed `np.uint64` array, as for
+            :class:`HammingDistanceBruteForceSearch`
+        n_tables (int): the number of hash tables
+        bits_per_table (int): the number of bits sampled to form each key.
+            More bits mean smaller buckets, and fewer candidates
+        probe_radius (int): the maximum number of key bits flipped when
+            probing neighboring buckets.  Zero probes only the query's own
+            bucket in each table
+        seed (int): a seed for choosing the bits sampled by each table
+
+    See Also:
+        :class:`HammingDistanceBruteForceSearch`
+        :class:`MultiIndexHash`
+    """
+
+    def __init__(
+            self,
+            gen,
+            n_tables=8,
+            bits_per_table=16,
+            probe_radius=1,
+            seed=None):
+
+        super(MultiProbeLSHSearch, self).__init__(gen)
+
+        self._codes = np.ascontiguousarray(self.index, dtype=np.uint64) \
+            .reshape((len(self.index), -1))
+        n_bits = self._codes.shape[1] * 64
+
+        if not 0 < bits_per_table <= min(n_bits, 63):
+            raise ValueError(
+                'bits_per_table must be between 1 and {max_bits}'.format(
+                    max_bits=min(n_bits, 63)))
+
+        if probe_radius < 0 or probe_radius > bits_per_table:
+            raise ValueError(
+                'probe_radius must be between 0 and bits_per_table')
+
+        self.n_tables = n_tables
+        self.bits_per_table = bits_per_table
+        self.probe_radius = probe_radius
+
+        rng = np.random.RandomState(seed)
+        self._positions = np.stack([
+            rng.choice(n_bits, bits_per_table, replace=False)
+            for _ in range(n_tables)])
+        self._weights = np.left_shift(
+            np.uint64(1), np.arange(bits_per_table, dtype=np.uint64))
+
+        # every key within probe_radius bits, nearest first
+        self._masks = np.array([
+            sum(1 << b for b in bits)
+            for radius in range(probe_radius + 1)
+            for bits in combinations(range(bits_per_table), radius)],
+            dtype=np.uint64)
+
+        keys = self._keys(self._codes)
+        order = np.argsort(keys, axis=0, kind='stable')
+        index_dtype = np.uint32 if len(keys) < 2 ** 32 else np.int64
+        self._order = np.ascontiguousarray(order.T, dtype=index_dtype)
+        self._sorted_keys = np.ascontiguousarray(
+            np.take_along_axis(keys, order, axis=0).T)
+
+    def _keys(self, codes, chunksize=16384):
+        """
+        Compute the key for each code in every table, producing an array of
+        shape `(len(codes), n_tables)`
+        """
+        keys = np.zeros((len(codes), self.n_tables), dtype=np.uint64)
+        for i in range(0, len(codes), chunksize):
+            chunk = np.ascontiguousarray(codes[i: i + chunksize])
+            bits = np.unpackbits(chunk.view(np.uint8), axis=-1)
+            sampled = bits[:, self._positions].astype(np.uint64)
+            keys[i: i + chunksize] = (sampled * self._weights).sum(axis=-1)
+        return keys
+
+    def candidates(self, query):
+        """
+        Return the indices of every code sharing a probed bucket with `query`
+        """
+        query_keys = self._keys(query[None, :])[0]
+        rows = []
+        for i, key in enumerate(query_keys):
+            probes = np.sort(key ^ self._masks)
+            sorted_keys = self._sorted_keys[i]
+            starts = np.searchsorted(sorted_keys, probes, side='left')
+            stops = np.searchsorted(sorted_keys, probes, side='right')
+            rows.append(gather_ranges(self._order[i], starts, stops))
+        return np.unique(np.concatenate(rows).astype(np.int64))
+
+    def search(self, query, n_results=10):
+        packed = np.ascontiguousarray(query, dtype=np.uint64).reshape(-1)
+        candidates = self.candidates(packed)
+        distances = packed_hamming_distance(packed, self._codes[candidates])
+        indices = candidates[top_k(distances, n_results)]
+        return SearchResults(query, self._results(indices))
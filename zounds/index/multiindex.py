@@ -0,0 +1,191 @@
+from itertools import combinations
+import numpy as np
+from zounds.nputil import packed_hamming_distance
+
+
+def gather_ranges(arr, starts, stops):
+    """
+    Concatenate the slices `arr[start:stop]` for each `(start, stop)` pair in
+    a single vectorized operation
+    """
+    counts = stops - starts
+    total = counts.sum()
+    if not total:
+        return np.zeros(0, dtype=arr.dtype)
+    offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return arr[np.arange(total) + offsets]
+
+
+class MultiIndexHash(object):
+    """
+    A multi-index hash (Norouzi, Punjani and Fleet, "Fast Search in Hamming
+    Space with Multi-Index Hashing") over packed binary codes.
+
+    Each code is split into `m` disjoint 16-bit substrings, and a sorted bucket
+    table is kept for each substring position.  If two codes differ by fewer
+    than `m * (s + 1)` bits, at least one pair of their substrings must differ
+    by `s` bits or fewer, so exact k-nearest-neighbor search only needs to
+    examine rows whose substrings fall into buckets near the query's.
+
+    The tables don't hold on to the codes themselves; the caller passes the
+    current code matrix to `search`.  Rows appended since the tables were last
+    built are scanned linearly until they make up more than `rebuild_ratio` of
+    the indexed rows, at which point the tables are rebuilt.
+
+    Args:
+        code_size (int): the size of each code, in bytes
+        max_probe_radius (int): the largest per-substring radius for which
+            buckets will be probed.  Queries whose neighbors are further away
+            than this fall back to a linear scan
+        rebuild_ratio (float): the fraction of un-indexed rows that will trigger
+            a rebuild of the bucket tables
+        max_candidate_ratio (float): once more than this fraction of all rows
+            have become candidates, a linear scan is cheaper, and is used
+            instead
+    """
+
+    substring_bits = 16
+
+    def __init__(
+            self,
+            code_size,
+            max_probe_radius=3,
+            rebuild_ratio=0.1,
+            max_candidate_ratio=0.25):
+
+        super(MultiIndexHash, self).__init__()
+        n_bits = code_size * 8
+        if n_bits % self.substring_bits:
+            raise ValueError(
+                'code_size must be a multiple of {bytes} bytes'.format(
+                    bytes=self.substring_bits // 8))
+
+        self.code_size = code_size
+        self.n_substrings = n_bits // self.substring_bits
+        self.max_probe_radius = max_probe_radius
+        self.rebuild_ratio = rebuild_ratio
+        self.max_candidate_ratio = max_candidate_ratio
+        self._masks = [
+            self._flip_masks(s) for s in range(max_probe_radius + 1)]
+        self.n_indexed = 0
+        self._sorted_keys = None
+        self._order = None
+
+    def _flip_masks(self, n_bits):
+        masks = [
+            sum(1 << b for b in bits)
+            for bits in combinations(range(self.substring_bits), n_bits)]
+        return np.array(masks, dtype=np.uint16)
+
+    def _substrings(self, codes):
+        codes = np.ascontiguousarray(codes, dtype=np.uint64)
+        return codes.view(np.uint16).reshape((len(codes), self.n_substrings))
+
+    def invalidate(self):
+        """
+        Discard the bucket tables, e.g. after rows have been removed from, or
+        re-ordered within the code matrix
+        """
+        self.n_indexed = 0
+        self._sorted_keys = None
+        self._order = None
+
+    def build(self, codes):
+        """
+        (Re)build a bucket table for each substring position from the code
+        matrix
+        """
+        keys = self._substrings(codes)
+        order = np.argsort(keys, axis=0, kind='stable')
+        sorted_keys = np.take_along_axis(keys, order, axis=0)
+        index_dtype = np.uint32 if len(codes) < 2 ** 32 else np.int64
+        self._order = np.ascontiguousarray(order.T, dtype=index_dtype)
+        self._sorted_keys = np.ascontiguousarray(sorted_keys.T)
+        self.n_indexed = len(codes)
+
+    def _needs_rebuild(self, n_codes):
+        if self._order is None:
+            return n_codes > 0
+        n_unindexed = n_codes - self.n_indexed
+        return n_unindexed > self.rebuild_ratio * max(1, self.n_indexed)
+
+    def _probe(self, query_keys, radius):
+        masks = self._masks[radius]
+        rows = []
+        for i, key in enumerate(query_keys):
+            probes = np.sort(key ^ masks)
+            sorted_keys = self._sorted_keys[i]
+            starts = np.searchsorted(sorted_keys, probes, side='left')
+            stops = np.searchsorted(sorted_keys, probes, side='right')
+            rows.append(gather_ranges(self._order[i], starts, stops))
+        return np.concatenate(rows).astype(np.int64)
+
+    def _linear_scan(self, query, codes, n_results, max_radius):
+        distances = packed_hamming_distance(query, codes)
+        indices = np.arange(len(codes))
+        return self._top_k(indices, distances, n_results, max_radius)
+
+    def _top_k(self, indices, distances, n_results, max_radius):
+        if max_radius is not None:
+            within = distances <= max_radius
+            indices, distances = indices[within], distances[within]
+        if n_results < len(indices):
+            part = np.argpartition(distances, n_results - 1)[:n_results]
+            indices, distances = indices[part], distances[part]
+        order = np.argsort(distances, kind='stable')
+        return indices[order], distances[order]
+
+    def search(self, query, codes, n_results, max_radius=None):
+        """
+        Find the (at most) `n_results` codes nearest to `query`, optionally
+        restricted to those within `max_radius` bits of the query
+
+        Args:
+            query (np.ndarray): a single packed code, as a uint64 array
+            codes (np.ndarray): the packed code matrix the tables index
+            n_results (int): the maximum number of results to return
+            max_radius (int): if provided, only codes at this hamming distance
+                or closer will be returned
+
+        Returns:
+            a tuple of `(indices, distances)`, sorted by ascending distance
+        """
+        n_codes = len(codes)
+        n_results = min(n_results, n_codes)
+        if n_results <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        if self._needs_rebuild(n_codes):
+            self.build(codes)
+
+        query = np.ascontiguousarray(query, dtype=np.uint64)
+        query_keys = self._substrings(query[None, :])[0]
+
+        # rows appended since the tables were last built are always candidates
+        candidates = np.arange(self.n_indexed, n_codes, dtype=np.int64)
+        distances = packed_hamming_distance(query, codes[candidates])
+        max_candidates = self.max_candidate_ratio * n_codes
+
+        for radius in range(self.max_probe_radius + 1):
+            rows = np.unique(self._probe(query_keys, radius))
+            rows = np.setdiff1d(rows, candidates, assume_unique=True)
+            candidates = np.concatenate([candidates, rows])
+            distances = np.concatenate(
+                [distances, packed_hamming_distance(query, codes[rows])])
+
+            if len(candidates) > max_candidates:
+                break
+
+            # every code at or within this distance of the query is
+            # guaranteed to be among the candidates
+            guaranteed = self.n_substrings * (radius + 1) - 1
+
+            if max_radius is not None and max_radius <= guaranteed:
+                return self._top_k(
+                    candidates, distances, n_results, max_radius)
+
+            if np.count_nonzero(distances <= guaranteed) >= n_results:
+                return self._top_k(
+                    candidates, distances, n_results, guaranteed)
+
+        return self._linear_scan(query, codes, n_results, max_radius)
@@ -0,0 +1,115 @@
+import struct
+from collections import OrderedDict
+import numpy as np
+import ujson as json
+from zounds.timeseries import Picoseconds
+
+# JSON payloads always begin with "{", so a leading version byte is enough to
+# tell the two formats apart
+BINARY_PAYLOAD_VERSION = b'\x01'
+
+# version, document number, start and duration in picoseconds
+_HEADER = struct.Struct('<cQqq')
+
+# the same layout as _HEADER, for encoding many payloads at once
+_HEADER_DTYPE = np.dtype([
+    ('version', 'S1'),
+    ('document_number', '<u8'),
+    ('start', '<i8'),
+    ('duration', '<i8')])
+
+
+def to_picoseconds(td):
+    """
+    Convert a timedelta to an integer number of picoseconds, without a
+    round-trip through floating point
+    """
+    return int(np.timedelta64(td, 'ps').astype(np.int64))
+
+
+def is_binary_payload(payload):
+    return payload[:1] == BINARY_PAYLOAD_VERSION
+
+
+class BinaryPayload(object):
+    """
+    A compact, fixed-width encoding for index results, made up of a document
+    number (see :meth:`HammingDb.document_number`), plus start and duration in
+    integer picoseconds.  Any extra data is appended as JSON.
+    """
+
+    def __init__(self):
+        super(BinaryPayload, self).__init__()
+
+    def encode(self, document_number, ts, extra_data=None):
+        header = _HEADER.pack(
+            BINARY_PAYLOAD_VERSION,
+            document_number,
+            to_picoseconds(ts.start),
+            to_picoseconds(ts.duration))
+        if not extra_data:
+            return header
+        return header + json.dumps(extra_data).encode()
+
+    def encode_many(self, document_number, starts, durations):
+        """
+        Encode payloads without extra data for many time slices from the same
+        document at once, given their starts and durations as integer
+        picosecond arrays
+        """
+        headers = np.empty(len(starts), dtype=_HEADER_DTYPE)
+        headers['version'] = BINARY_PAYLOAD_VERSION
+        headers['document_number'] = document_number
+        headers['start'] = starts
+        headers['duration'] = durations
+        raw = headers.tobytes()
+        size = _HEADER.size
+        return [raw[i:i + size] for i in range(0, len(raw), size)]
+
+    def decode(self, payload):
+        """
+        Returns a tuple of `(document_number, start, duration, extra_data)`,
+        where `extra_data` is `None` if none was stored
+        """
+        _, document_number, start, duration = \
+            _HEADER.unpack_from(payload)
+        extra = payload[_HEADER.size:]
+        extra_data = json.loads(extra) if extra else None
+        return \
+            document_number, Picoseconds(start), Picoseconds(duration), \
+            extra_data
+
+
+class LRUCache(object):
+    """
+    A minimal least-recently-used cache
+    """
+
+    def __init__(self, maxsize):
+        super(LRUCache, self).__init__()
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        try:
+            self._data.move_to_end(key)
+            return self._data[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
@@ -0,0 +1,200 @@
+import numpy as np
+from scipy.cluster.vq import kmeans2, vq
+from scipy.spatial.distance import cdist
+from random import choice
+from .brute_force import BaseBruteForceSearch
+from .index import SearchResults
+from zounds.nputil import safe_unit_norm
+
+
+class ProductQuantizationSearch(BaseBruteForceSearch):
+    """
+    Approximate nearest-neighbor search over real-valued features, using an
+    inverted file with product-quantized residuals (IVF-PQ)
+
+    A coarse k-means quantizer assigns each vector to one of `n_lists`
+    inverted lists.  The residual between each vector and its list's centroid
+    is split into `n_subquantizers` sub-vectors, each of which is replaced by
+    the index of its nearest centroid in a 256-entry codebook, so each vector
+    is stored as `n_subquantizers` uint8 codes.  Queries probe the `n_probe`
+    nearest lists, and compute approximate distances by summing lookups into a
+    per-list table of distances between the query residual and every codebook
+    entry.  Finally, the best `n_results * rerank_factor` candidates may be
+    re-ranked using the exact vectors.
+
+    Args:
+        gen (generator): a generator of `(_id, feature)` tuples, as for
+            :class:`BruteForceSearch`
+        n_subquantizers (int): the number of sub-vectors each vector is split
+            into.  Must evenly divide the feature dimension
+        n_lists (int): the number of coarse centroids, or inverted lists
+        n_probe (int): the number of inverted lists visited for each query
+        n_training_samples (int): the number of vectors sampled to train the
+            coarse quantizer and codebooks
+        distance_metric (str): either `euclidean` or `cosine`
+        rerank (bool): if `True`, keep the exact vectors in memory, and use
+            them to re-rank the best approximate candidates.  Otherwise, only
+            the compact codes are kept
+        rerank_factor (int): the number of candidates re-ranked, as a multiple
+            of `n_results`
+        n_iterations (int): the number of k-means iterations
+        seed (int): a seed for sampling and k-means initialization
+
+    See Also:
+        :class:`BruteForceSearch`
+    """
+
+    def __init__(
+            self,
+            gen,
+            n_subquantizers=8,
+            n_lists=16,
+            n_probe=4,
+            n_training_samples=10000,
+            distance_metric='euclidean',
+            rerank=True,
+            rerank_factor=4,
+            n_iterations=20,
+            seed=None):
+
+        super(ProductQuantizationSearch, self).__init__(gen)
+
+        if distance_metric not in ('euclidean', 'cosine'):
+            raise ValueError(
+                'distance_metric must be either euclidean or cosine')
+
+        self.distance_metric = distance_metric
+        self.n_probe = n_probe
+        self.rerank = rerank
+        self.rerank_factor = rerank_factor
+
+        data = self._prepare(self.index)
+        n_examples, dim = data.shape
+
+        if dim % n_subquantizers:
+            raise ValueError(
+                'n_subquantizers ({n_subquantizers}) must evenly divide the '
+                'feature dimension ({dim})'.format(**locals()))
+
+        self.n_subquantizers = n_subquantizers
+        self._subdim = dim // n_subquantizers
+
+        rng = np.random.RandomState(seed)
+        sample = data[rng.permutation(n_examples)[:n_training_samples]]
+
+        # train the coarse quantizer, and assign each vector to a list
+        self.n_lists = min(n_lists, len(sample))
+        self.coarse_centroids = self._kmeans(
+            sample, self.n_lists, n_iterations, rng)
+        assignments, _ = vq(data, self.coarse_centroids)
+
+        # train a codebook for each residual sub-vector
+        sample_assignments, _ = vq(sample, self.coarse_centroids)
+        sample_residuals = self._split(
+            sample - self.coarse_centroids[sample_assignments])
+        n_centroids = min(256, len(sample))
+        self.codebooks = np.stack([
+            self._kmeans(sub, n_centroids, n_iterations, rng)
+            for sub in sample_residuals.transpose((1, 0, 2))])
+
+        # encode every vector, and store the codes grouped by inverted list,
+        # so that each list's codes are contiguous in memory
+        codes = self._encode(data - self.coarse_centroids[assignments])
+        self._order = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=self.n_lists)
+        self._list_offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.codes = codes[self._order]
+
+        if not self.rerank:
+            # only the compact codes are needed from here on
+            self.index = None
+
+    def _prepare(self, x):
+        x = np.asarray(x, dtype=np.float32).reshape((len(x), -1))
+        if self.distance_metric == 'cosine':
+            x = safe_unit_norm(x)
+        return x
+
+    def _kmeans(self, data, k, n_iterations, rng):
+        centroids, _ = kmeans2(
+            data.astype(np.float64),
+            k,
+            iter=n_iterations,
+            minit='++',
+            seed=rng)
+        return centroids.astype(np.float32)
+
+    def _split(self, x):
+        return x.reshape((len(x), self.n_subquantizers, self._subdim))
+
+    def _encode(self, residuals):
+        residuals = self._split(residuals)
+        codes = np.zeros((len(residuals), self.n_subquantizers), np.uint8)
+        for i, codebook in enumerate(self.codebooks):
+            codes[:, i], _ = vq(residuals[:, i], codebook)
+        return codes
+
+    def _decode(self, index):
+        position = np.nonzero(self._order == index)[0][0]
+        lst = np.searchsorted(self._list_offsets, position, side='right') - 1
+        code = self.codes[position]
+        residual = self.codebooks[np.arange(self.n_subquantizers), code]
+        return self.coarse_centroids[lst] + residual.reshape(-1)
+
+    def _distance_table(self, residual):
+        residual = residual.reshape((self.n_subquantizers, 1, self._subdim))
+        return ((self.codebooks - residual) ** 2).sum(axis=-1)
+
+    def _candidates(self, query):
+        coarse_distances = \
+            ((self.coarse_centroids - query) ** 2).sum(axis=-1)
+        lists = np.argsort(coarse_distances)[:self.n_probe]
+        subquantizers = np.arange(self.n_subquantizers)
+
+        indices = []
+        distances = []
+        for lst in lists:
+            start, stop = self._list_offsets[lst], self._list_offsets[lst + 1]
+            if start == stop:
+                continue
+            table = self._distance_table(query - self.coarse_centroids[lst])
+            codes = self.codes[start: stop]
+            distances.append(table[subquantizers, codes].sum(axis=-1))
+            indices.append(self._order[start: stop])
+
+        if not indices:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        return np.concatenate(indices), np.concatenate(distances)
+
+    def _top_k(self, indices, distances, k):
+        if k < len(distances):
+            partitioned = np.argpartition(distances, k - 1)[:k]
+            indices, distances = indices[partitioned], distances[partitioned]
+        order = np.argsort(distances, kind='stable')
+        return indices[order], distances[order]
+
+    def search(self, query, n_results=10):
+        prepared = self._prepare(query[None, ...])[0]
+        indices, distances = self._candidates(prepared)
+
+        if self.rerank:
+            indices, _ = self._top_k(
+                indices, distances, n_results * self.rerank_factor)
+            exact = np.asarray(self.index)[indices] \
+                .reshape((len(indices), -1))
+            distances = cdist(
+                query.reshape((1, -1)), exact, metric=self.distance_metric)[0]
+
+        indices, _ = self._top_k(indices, distances, n_results)
+        return SearchResults(query, self._results(indices))
+
+    def random_search(self, n_results=10):
+        if self.rerank:
+            return super(ProductQuantizationSearch, self).random_search(
+                n_results)
+
+        # the exact vectors have been discarded, so search using the
+        # reconstruction of a random vector
+        query = self._decode(choice(range(len(self))))
+        return self.search(query, n_results)
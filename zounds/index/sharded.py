@@ -0,0 +1,90 @@
+from multiprocessing import Pool
+import numpy as np
+from zounds.nputil import packed_hamming_top_k
+from .codefile import CodeFile
+
+# state owned by each worker process, populated by _init_worker
+_worker_state = {}
+
+
+def _init_worker(path, dtype):
+    _worker_state['code_file'] = CodeFile(path, dtype)
+
+
+def _top_k(indices, scores, n_results):
+    if n_results < len(scores):
+        partitioned = np.argpartition(scores, n_results - 1)[:n_results]
+        return indices[partitioned], scores[partitioned]
+    return indices, scores
+
+
+def _search_shard(args):
+    query, start, stop, n_rows, n_results = args
+    code_file = _worker_state['code_file']
+    code_file.sync(n_rows)
+    codes = code_file.logical_data['code'][start: stop]
+    if codes.ndim == 1:
+        codes = codes[..., None]
+    indices, scores = packed_hamming_top_k(query, codes, n_results)
+    return indices + start, scores
+
+
+class ShardedSearch(object):
+    """
+    Brute-force hamming search, split across worker processes.
+
+    Each worker memory-maps the same `CodeFile`, so no codes are copied
+    between processes.  For each query, the valid rows are divided into
+    `n_shards` contiguous slices; each worker scans its slice outside of the
+    parent's GIL and returns only its local top-k candidates, which are then
+    merged.
+
+    Args:
+        path (str): the path to the `CodeFile` holding `(id, code)` records
+        dtype (np.dtype): the record dtype of the `CodeFile`
+        n_shards (int): the number of worker processes, and of slices each
+            search is split into
+    """
+
+    def __init__(self, path, dtype, n_shards):
+        super(ShardedSearch, self).__init__()
+        if n_shards < 1:
+            raise ValueError('n_shards must be greater than or equal to one')
+        self.n_shards = n_shards
+        self._pool = Pool(
+            processes=n_shards,
+            initializer=_init_worker,
+            initargs=(path, np.dtype(dtype)))
+
+    def close(self):
+        self._pool.terminate()
+        self._pool.join()
+
+    def _shards(self, n_rows):
+        bounds = np.linspace(0, n_rows, self.n_shards + 1).astype(np.int64)
+        return [
+            (start, stop) for start, stop in zip(bounds[:-1], bounds[1:])
+            if stop > start]
+
+    def search(self, query, n_rows, n_results, sort=False):
+        """
+        Find the `n_results` rows, among the first `n_rows` rows of the
+        `CodeFile`, closest to `query`, returning their indices
+        """
+        query = np.array(query, dtype=np.uint64)
+        tasks = [
+            (query, start, stop, n_rows, n_results)
+            for start, stop in self._shards(n_rows)]
+
+        if not tasks:
+            return np.zeros(0, dtype=np.int64)
+
+        results = self._pool.map(_search_shard, tasks)
+        indices = np.concatenate([r[0] for r in results])
+        scores = np.concatenate([r[1] for r in results])
+        indices, scores = _top_k(indices, scores, n_results)
+
+        if sort:
+            indices = indices[np.argsort(scores, kind='stable')]
+
+        return indices
@@ -0,0 +1,41 @@
+import unittest2
+import numpy as np
+from .benchmark import \
+    synthetic_binary_corpus, synthetic_real_corpus, recall_at_k
+from zounds.timeseries import TimeSlice, Seconds
+
+
+class BenchmarkTests(unittest2.TestCase):
+    def test_binary_corpus_is_packed(self):
+        corpus = list(synthetic_binary_corpus(
+            n_documents=3, frames_per_document=7, n_bits=128, seed=0))
+        self.assertEqual(3, len(corpus))
+        _id, feature = corpus[0]
+        self.assertEqual((7, 2), feature.shape)
+        self.assertEqual(np.uint64, feature.dtype)
+
+    def test_binary_corpus_raises_for_partial_words(self):
+        self.assertRaises(
+            ValueError, lambda: list(synthetic_binary_corpus(n_bits=100)))
+
+    def test_real_corpus_shape(self):
+        corpus = list(synthetic_real_corpus(
+            n_documents=2, frames_per_document=5, n_dims=8, seed=0))
+        self.assertEqual((5, 8), corpus[1][1].shape)
+
+    def _results(self, *starts):
+        return [('a', TimeSlice(Seconds(1), start=Seconds(s))) for s in starts]
+
+    def test_recall_at_k_is_one_for_identical_results(self):
+        results = self._results(1, 2, 3)
+        self.assertEqual(1.0, recall_at_k(results, results, 3))
+
+    def test_recall_at_k_counts_overlap(self):
+        self.assertEqual(
+            0.5,
+            recall_at_k(self._results(1, 2), self._results(2, 3), 2))
+
+    def test_recall_at_k_ignores_results_beyond_k(self):
+        self.assertEqual(
+            0.0,
+            recall_at_k(self._results(1, 2, 3), self._results(3, 2, 1), 1))
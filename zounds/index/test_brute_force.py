@@ -0,0 +1,79 @@
+import unittest2
+import numpy as np
+from .brute_force import \
+    BruteForceSearch, HammingDistanceBruteForceSearch, top_k
+from zounds.core import ArrayWithUnits, IdentityDimension
+from zounds.timeseries import TimeDimension, Seconds, Milliseconds
+
+
+class TopKTests(unittest2.TestCase):
+    def test_returns_smallest_in_ascending_order(self):
+        distances = np.array([5, 1, 4, 0, 3, 2])
+        np.testing.assert_array_equal([3, 1, 5], top_k(distances, 3))
+
+    def test_returns_everything_when_k_exceeds_length(self):
+        distances = np.array([2, 0, 1])
+        np.testing.assert_array_equal([1, 2, 0], top_k(distances, 10))
+
+    def test_returns_nothing_for_zero(self):
+        self.assertEqual(0, len(top_k(np.array([1, 2, 3]), 0)))
+
+    def test_breaks_ties_by_index(self):
+        distances = np.array([1, 0, 1, 0, 1])
+        np.testing.assert_array_equal([1, 3, 0], top_k(distances, 3))
+
+
+class BruteForceSearchTests(unittest2.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.docs = [
+            ('a', ArrayWithUnits(
+                rng.normal(0, 1, (10, 4)),
+                [TimeDimension(Seconds(1)), IdentityDimension()])),
+            ('b', ArrayWithUnits(
+                rng.normal(0, 1, (20, 4)),
+                [TimeDimension(Milliseconds(500)), IdentityDimension()])),
+        ]
+
+    def test_length_is_total_number_of_frames(self):
+        index = BruteForceSearch(iter(self.docs))
+        self.assertEqual(30, len(index))
+
+    def test_returns_requested_number_of_results(self):
+        index = BruteForceSearch(iter(self.docs))
+        results = list(index.search(self.docs[0][1][3], n_results=7))
+        self.assertEqual(7, len(results))
+
+    def test_maps_frames_back_to_documents_and_time_slices(self):
+        index = BruteForceSearch(iter(self.docs))
+        _id, ts = next(iter(index.search(self.docs[1][1][7], n_results=1)))
+        self.assertEqual('b', _id)
+        self.assertEqual(Milliseconds(3500), ts.start)
+        self.assertEqual(Milliseconds(500), ts.duration)
+
+    def test_results_are_ordered_by_distance(self):
+        index = BruteForceSearch(iter(self.docs))
+        query = self.docs[0][1][2]
+        results = list(index.search(query, n_results=30))
+        distances = [
+            np.linalg.norm(self._frame(_id, ts) - query)
+            for _id, ts in results]
+        self.assertEqual(sorted(distances), distances)
+
+    def _frame(self, _id, ts):
+        doc = dict(self.docs)[_id]
+        return doc[ts][0]
+
+
+class HammingDistanceBruteForceSearchTests(unittest2.TestCase):
+    def test_finds_exact_match_first(self):
+        rng = np.random.RandomState(0)
+        docs = [
+            (i, ArrayWithUnits(
+                rng.randint(0, 2 ** 63, (50, 2), dtype=np.uint64),
+                [TimeDimension(Seconds(1)), IdentityDimension()]))
+            for i in range(3)]
+        index = HammingDistanceBruteForceSearch(iter(docs))
+        _id, ts = next(iter(index.search(docs[2][1][11], n_results=5)))
+        self.assertEqual(2, _id)
+        self.assertEqual(Seconds(11), ts.start)
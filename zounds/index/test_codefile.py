@@ -0,0 +1,72 @@
+import unittest2
+import numpy as np
+from uuid import uuid4
+import os
+from .codefile import CodeFile
+
+
+class CodeFileTests(unittest2.TestCase):
+    def setUp(self):
+        self._path = '/tmp/{path}'.format(path=uuid4().hex)
+        self.dtype = np.dtype([('id', 'S4'), ('code', np.uint64, 2)])
+
+    def tearDown(self):
+        try:
+            os.remove(self._path)
+        except OSError:
+            pass
+
+    def _records(self, n, start=0):
+        records = np.zeros(n, dtype=self.dtype)
+        records['id'] = [str(i).encode() for i in range(start, start + n)]
+        records['code'] = np.arange(start, start + n)[:, None]
+        return records
+
+    def test_creates_file(self):
+        CodeFile(self._path, self.dtype)
+        self.assertTrue(os.path.exists(self._path))
+
+    def test_starts_empty(self):
+        cf = CodeFile(self._path, self.dtype)
+        self.assertEqual(0, cf.logical_size)
+        self.assertEqual(0, len(cf.logical_data))
+
+    def test_written_rows_are_not_visible_until_synced(self):
+        cf = CodeFile(self._path, self.dtype)
+        cf.write(0, self._records(3))
+        self.assertEqual(0, len(cf.logical_data))
+        cf.sync(3)
+        self.assertEqual(3, len(cf.logical_data))
+
+    def test_can_read_written_records(self):
+        cf = CodeFile(self._path, self.dtype)
+        cf.write(0, self._records(3))
+        cf.write(3, self._records(2, start=3))
+        cf.sync(5)
+        np.testing.assert_array_equal(
+            [b'0', b'1', b'2', b'3', b'4'], cf.logical_data['id'])
+        np.testing.assert_array_equal(
+            np.arange(5), cf.logical_data['code'][:, 1])
+
+    def test_file_grows_geometrically(self):
+        cf = CodeFile(self._path, self.dtype, min_rows=4)
+        cf.write(0, self._records(3))
+        self.assertEqual(
+            4 * self.dtype.itemsize, os.path.getsize(self._path))
+        cf.write(3, self._records(2, start=3))
+        self.assertEqual(
+            8 * self.dtype.itemsize, os.path.getsize(self._path))
+
+    def test_records_written_by_another_instance_are_visible(self):
+        writer = CodeFile(self._path, self.dtype)
+        reader = CodeFile(self._path, self.dtype)
+        writer.write(0, self._records(10))
+        reader.sync(10)
+        np.testing.assert_array_equal(
+            self._records(10), reader.logical_data)
+
+    def test_logical_data_is_read_only(self):
+        cf = CodeFile(self._path, self.dtype)
+        cf.write(0, self._records(3))
+        cf.sync(3)
+        self.assertFalse(cf.logical_data.flags.writeable)
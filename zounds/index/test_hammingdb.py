@@ -4,6 +4,14 @@ from uuid import uuid4
 import shutil
 import numpy as np
 import os
+from multiprocessing import Process
+
+
+def _delete_and_compact(path, document):
+    db = HammingDb(path, code_size=8)
+    db.delete_document(document)
+    db.compact()
+    db.close()
 
 
 class HammingDbTests(unittest2.TestCase):
@@ -208,3 +216,464 @@ class HammingDbTests(unittest2.TestCase):
         results = list(db.search(self.extract_code_from_text(t1), 3))
         data = results[0]
         self.assertEqual(t1, data)
+
+    def test_multi_index_search_returns_nearest_results_in_order(self):
+        db = HammingDb(self._path, code_size=16, multi_index=True)
+        t1 = b'Mary had a little lamb'
+        t2 = b'Mary had a little dog'
+        t3 = b'Permanent Midnight'
+        t4 = b'Mary sad a little cog'
+        extract_code = lambda x: self.extract_code_from_text(x, n_chunks=2)
+        db.append(extract_code(t1), t1)
+        db.append(extract_code(t2), t2)
+        db.append(extract_code(t3), t3)
+        db.append(extract_code(t4), t4)
+        results = list(db.search(extract_code(t1), 3))
+        self.assertEqual([t1, t2, t4], results)
+
+    def test_multi_index_is_rebuilt_from_existing_data_on_open(self):
+        db = HammingDb(self._path, code_size=16)
+        codes = [os.urandom(16) for _ in range(100)]
+        for i, code in enumerate(codes):
+            db.append(code, str(i))
+        db.close()
+        db = HammingDb(self._path, code_size=16, multi_index=True)
+        results = list(db.search(codes[17], 1))
+        self.assertEqual([b'17'], results)
+
+    def test_codes_are_written_to_memory_mapped_file(self):
+        db = HammingDb(self._path, code_size=8)
+        db.append('a' * 8, 'some data')
+        db.append('b' * 8, 'some data')
+        self.assertTrue(os.path.exists(os.path.join(self._path, 'codes.mmap')))
+        db2 = HammingDb(self._path, code_size=8)
+        self.assertEqual(2, db2._codes.logical_size)
+        self.assertFalse(db2._codes.logical_data.flags.writeable)
+
+    def test_memory_mapped_file_is_rebuilt_when_stale(self):
+        db = HammingDb(self._path, code_size=8, memory_mapped=False)
+        t1 = b'Mary had a little lamb'
+        t2 = b'Mary had a little dog'
+        db.append(self.extract_code_from_text(t1), t1)
+        db.append(self.extract_code_from_text(t2), t2)
+        db.close()
+        db = HammingDb(self._path, code_size=8)
+        self.assertEqual(2, db._codes.logical_size)
+        results = list(db.search(self.extract_code_from_text(t1), 1))
+        self.assertEqual([t1], results)
+
+    def test_can_search_without_memory_mapped_file(self):
+        db = HammingDb(self._path, code_size=8, memory_mapped=False)
+        t1 = b'Mary had a little lamb'
+        t2 = b'Permanent Midnight'
+        db.append(self.extract_code_from_text(t1), t1)
+        db.append(self.extract_code_from_text(t2), t2)
+        results = list(db.search(self.extract_code_from_text(t2), 1))
+        self.assertEqual([t2], results)
+        self.assertFalse(
+            os.path.exists(os.path.join(self._path, 'codes.mmap')))
+
+    def test_write_only_mode_maintains_memory_mapped_file(self):
+        db = HammingDb(self._path, code_size=8, writeonly=True)
+        db.append('a' * 8, 'some data')
+        db.close()
+        db = HammingDb(self._path, code_size=8)
+        self.assertEqual(1, db._codes.logical_size)
+
+    def test_search_many_returns_results_for_each_query(self):
+        db = HammingDb(self._path, code_size=16)
+        codes = [os.urandom(16) for _ in range(100)]
+        for i, code in enumerate(codes):
+            db.append(code, str(i))
+        results = db.search_many(codes[:5], 3, sort=True)
+        self.assertEqual(5, len(results))
+        for i, r in enumerate(results):
+            self.assertEqual(3, len(r))
+            self.assertEqual(str(i).encode(), r[0])
+
+    def test_search_many_agrees_with_search(self):
+        db = HammingDb(self._path, code_size=16)
+        codes = [os.urandom(16) for _ in range(1000)]
+        for i, code in enumerate(codes):
+            db.append(code, str(i))
+        queries = [os.urandom(16) for _ in range(10)]
+        results = db.search_many(
+            queries, 7, sort=True, query_tile_size=3, code_tile_size=64)
+
+        def distances(query, results):
+            q = np.frombuffer(query, dtype=np.uint8)
+            return [
+                np.unpackbits(
+                    q ^ np.frombuffer(codes[int(r)], dtype=np.uint8)).sum()
+                for r in results]
+
+        for query, batch_results in zip(queries, results):
+            single_results = list(db.search(query, 7, sort=True))
+            self.assertEqual(
+                distances(query, single_results),
+                distances(query, batch_results))
+
+    def test_search_many_with_multi_index(self):
+        db = HammingDb(self._path, code_size=16, multi_index=True)
+        codes = [os.urandom(16) for _ in range(100)]
+        for i, code in enumerate(codes):
+            db.append(code, str(i))
+        results = db.search_many(codes[10:12], 1)
+        self.assertEqual([[b'10'], [b'11']], results)
+
+    def test_search_many_raises_in_write_only_mode(self):
+        db = HammingDb(self._path, code_size=16, writeonly=True)
+        db.append(os.urandom(16), 'some data')
+        self.assertRaises(
+            RuntimeError, lambda: db.search_many([os.urandom(16)], 1))
+
+    def test_can_search_with_shards(self):
+        db = HammingDb(self._path, code_size=16, n_shards=2)
+        codes = [os.urandom(16) for _ in range(100)]
+        for i, code in enumerate(codes):
+            db.append(code, str(i))
+        results = list(db.search(codes[42], 1))
+        db.close()
+        self.assertEqual([b'42'], results)
+
+    def test_shards_require_memory_mapped_file(self):
+        self.assertRaises(
+            ValueError,
+            lambda: HammingDb(
+                self._path, code_size=16, memory_mapped=False, n_shards=2))
+
+    def test_document_numbers_are_stable(self):
+        db = HammingDb(self._path, code_size=8)
+        self.assertEqual(0, db.document_number('a'))
+        self.assertEqual(1, db.document_number('b'))
+        self.assertEqual(0, db.document_number('a'))
+        db.close()
+        db = HammingDb(self._path, code_size=8)
+        self.assertEqual(1, db.document_number('b'))
+        self.assertEqual(b'b', db.document_id(1))
+
+    def test_unknown_document_number_returns_none(self):
+        db = HammingDb(self._path, code_size=8)
+        self.assertIsNone(db.document_id(10))
+
+    def test_search_ids_and_payloads_agree_with_search(self):
+        db = HammingDb(self._path, code_size=16)
+        codes = [os.urandom(16) for _ in range(100)]
+        for i, code in enumerate(codes):
+            db.append(code, str(i))
+        ids = db.search_ids(codes[3], 5, sort=True)
+        self.assertEqual(
+            list(db.search(codes[3], 5, sort=True)), db.payloads(ids))
+
+    def test_can_extend_with_many_codes(self):
+        db = HammingDb(self._path, code_size=8)
+        codes = [os.urandom(8) for _ in range(10)]
+        db.extend(codes, [str(i) for i in range(10)])
+        self.assertEqual(10, len(db))
+        self.assertEqual([b'3'], list(db.search(codes[3], 1)))
+
+    def test_can_extend_with_code_matrix(self):
+        db = HammingDb(self._path, code_size=16)
+        codes = np.random.randint(0, 256, (10, 16)).astype(np.uint8)
+        db.extend(codes, [str(i) for i in range(10)])
+        self.assertEqual(10, len(db))
+        self.assertEqual([b'7'], list(db.search(codes[7].tobytes(), 1)))
+
+    def test_extend_without_memory_mapped_file(self):
+        db = HammingDb(self._path, code_size=8, memory_mapped=False)
+        codes = [os.urandom(8) for _ in range(10)]
+        db.extend(codes, [str(i) for i in range(10)])
+        self.assertEqual(10, db._codes.logical_size)
+        self.assertEqual([b'5'], list(db.search(codes[5], 1)))
+
+    def test_extend_raises_for_mismatched_lengths(self):
+        db = HammingDb(self._path, code_size=8)
+        self.assertRaises(
+            ValueError, lambda: db.extend([os.urandom(8)], ['a', 'b']))
+
+    def test_extend_raises_for_wrong_code_size(self):
+        db = HammingDb(self._path, code_size=8)
+        self.assertRaises(
+            ValueError, lambda: db.extend([os.urandom(7)], ['a']))
+
+    def _radius_fixture(self, **kwargs):
+        db = HammingDb(self._path, code_size=8, **kwargs)
+        base = np.zeros(1, dtype=np.uint64)
+        codes = []
+        for n_bits in range(10):
+            code = base.copy()
+            code[0] = (1 << n_bits) - 1
+            codes.append(code.tobytes())
+        db.extend(codes, [str(i) for i in range(10)])
+        return db, codes
+
+    def test_radius_search_returns_all_codes_within_radius(self):
+        db, codes = self._radius_fixture()
+        results = list(db.radius_search(codes[0], 3))
+        self.assertEqual([b'0', b'1', b'2', b'3'], results)
+
+    def test_radius_search_with_zero_radius_returns_exact_matches(self):
+        db, codes = self._radius_fixture()
+        self.assertEqual([b'5'], list(db.radius_search(codes[5], 0)))
+
+    def test_radius_search_raises_for_negative_radius(self):
+        db, codes = self._radius_fixture()
+        self.assertRaises(
+            ValueError, lambda: list(db.radius_search(codes[0], -1)))
+
+    def test_radius_search_with_multi_index(self):
+        db, codes = self._radius_fixture(multi_index=True)
+        results = list(db.radius_search(codes[0], 4))
+        self.assertEqual([b'0', b'1', b'2', b'3', b'4'], results)
+
+    def test_radius_search_with_mask(self):
+        db, codes = self._radius_fixture()
+        mask = np.zeros(len(db), dtype=np.bool_)
+        mask[[1, 3, 8]] = True
+        results = list(db.radius_search(codes[0], 3, mask=mask))
+        self.assertEqual([b'1', b'3'], results)
+
+    def test_radius_search_with_mask_and_multi_index(self):
+        db, codes = self._radius_fixture(multi_index=True)
+        mask = np.zeros(len(db), dtype=np.bool_)
+        mask[[1, 3, 8]] = True
+        results = list(db.radius_search(codes[0], 3, mask=mask))
+        self.assertEqual([b'1', b'3'], results)
+
+    def test_search_with_mask_only_returns_selected_rows(self):
+        db, codes = self._radius_fixture()
+        mask = np.zeros(len(db), dtype=np.bool_)
+        mask[[6, 9]] = True
+        results = list(db.search(codes[0], 5, mask=mask))
+        self.assertEqual([b'6', b'9'], results)
+
+    def test_search_with_callable_mask(self):
+        db, codes = self._radius_fixture()
+        ids = db.search_ids(codes[4], 3)
+        excluded = ids[0]
+        results = db.search_ids(
+            codes[4], 3, mask=lambda id_column: id_column != excluded)
+        self.assertNotIn(excluded, results)
+        self.assertEqual(3, len(results))
+
+    def test_search_with_id_set(self):
+        db, codes = self._radius_fixture()
+        ids = db.search_ids(codes[9], 2)
+        results = db.search_ids(codes[0], 5, ids=set(ids))
+        self.assertEqual(sorted(ids), sorted(results))
+
+    def test_search_raises_for_mask_of_wrong_length(self):
+        db, codes = self._radius_fixture()
+        self.assertRaises(
+            ValueError,
+            lambda: db.search_ids(codes[0], 5, mask=np.ones(3, dtype=bool)))
+
+    def test_extend_sets_metadata_in_same_transaction(self):
+        db = HammingDb(self._path, code_size=8)
+        db.extend([os.urandom(8)], ['a'], {b'timestamp': b'1234'})
+        self.assertEqual(b'1234', db.get_metadata(b'timestamp'))
+
+    def test_extend_sets_metadata_with_no_codes(self):
+        db = HammingDb(self._path, code_size=8)
+        db.extend([], [], {b'timestamp': b'1234'})
+        self.assertEqual(0, len(db))
+        self.assertEqual(b'1234', db.get_metadata(b'timestamp'))
+
+    def test_entries_are_assigned_sequence_numbers_in_insertion_order(self):
+        db = HammingDb(self._path, code_size=8)
+        db.extend(
+            [os.urandom(8) for _ in range(5)], [str(i) for i in range(5)])
+        db.append(os.urandom(8), '5')
+        with db.env.begin() as txn:
+            ids = [_id for _id, _ in db._iter_sequence(txn)]
+        self.assertEqual(
+            [str(i).encode() for i in range(6)], db.payloads(ids))
+
+    def test_in_memory_store_only_loads_new_rows(self):
+        db = HammingDb(self._path, code_size=8, memory_mapped=False)
+        db.extend(
+            [os.urandom(8) for _ in range(5)], [str(i) for i in range(5)])
+        db2 = HammingDb(self._path, code_size=8, memory_mapped=False)
+        db2.extend(
+            [os.urandom(8) for _ in range(3)], [str(i) for i in range(5, 8)])
+        first = db._codes.logical_data[:5].copy()
+        db._check_for_external_modifications()
+        self.assertEqual(8, db._codes.logical_size)
+        np.testing.assert_array_equal(first, db._codes.logical_data[:5])
+        with db.env.begin() as txn:
+            ids = [_id for _id, _ in db._iter_sequence(txn)]
+        np.testing.assert_array_equal(ids, db._codes.logical_data['id'])
+
+    def test_sequence_numbers_are_assigned_to_legacy_databases(self):
+        db = HammingDb(self._path, code_size=8, memory_mapped=False)
+        codes = [os.urandom(8) for _ in range(5)]
+        db.extend(codes, [str(i) for i in range(5)])
+        with db.env.begin(write=True) as txn:
+            txn.drop(db.sequence, delete=False)
+        db.close()
+
+        db = HammingDb(self._path, code_size=8, memory_mapped=False)
+        with db.env.begin() as txn:
+            self.assertEqual(5, txn.stat(db.sequence)['entries'])
+        self.assertEqual(5, db._codes.logical_size)
+        self.assertEqual([b'3'], list(db.search(codes[3], 1)))
+
+    def test_memory_mapped_file_catches_up_incrementally(self):
+        db = HammingDb(self._path, code_size=8)
+        db.extend(
+            [os.urandom(8) for _ in range(5)], [str(i) for i in range(5)])
+        first = np.array(db._codes.logical_data[:5])
+
+        # a writer that doesn't maintain the memory-mapped file
+        other = HammingDb(self._path, code_size=8, memory_mapped=False)
+        codes = [os.urandom(8) for _ in range(3)]
+        other.extend(codes, [str(i) for i in range(5, 8)])
+
+        self.assertEqual([b'6'], list(db.search(codes[1], 1)))
+        self.assertEqual(8, db._codes.logical_size)
+        np.testing.assert_array_equal(
+            first, np.array(db._codes.logical_data[:5]))
+
+    def _documents_fixture(self, **kwargs):
+        db = HammingDb(self._path, code_size=8, **kwargs)
+        codes = [os.urandom(8) for _ in range(20)]
+        documents = ['a'] * 10 + ['b'] * 10
+        db.extend(codes, [str(i) for i in range(20)], documents=documents)
+        return db, codes
+
+    def test_deleted_entries_are_not_returned_from_search(self):
+        db, codes = self._documents_fixture()
+        ids = db.search_ids(codes[3], 1)
+        self.assertEqual(1, db.delete(ids))
+        self.assertNotIn(b'3', list(db.search(codes[3], 5)))
+        self.assertEqual(5, len(list(db.search(codes[3], 5))))
+
+    def test_deleting_twice_counts_once(self):
+        db, codes = self._documents_fixture()
+        ids = db.search_ids(codes[3], 1)
+        db.delete(ids)
+        self.assertEqual(0, db.delete(ids))
+        self.assertEqual(1, db.n_deleted)
+
+    def test_can_delete_by_document(self):
+        db, codes = self._documents_fixture()
+        self.assertEqual(10, db.delete_document('a'))
+        results = list(db.search(codes[3], 20))
+        self.assertEqual(
+            sorted(str(i).encode() for i in range(10, 20)), sorted(results))
+
+    def test_deleting_unknown_document_deletes_nothing(self):
+        db, codes = self._documents_fixture()
+        self.assertEqual(0, db.delete_document('c'))
+
+    def test_deleted_entries_are_excluded_from_filtered_searches(self):
+        db, codes = self._documents_fixture()
+        db.delete_document('a')
+        mask = np.ones(len(db), dtype=np.bool_)
+        results = list(db.search(codes[3], 20, mask=mask))
+        self.assertEqual(10, len(results))
+
+    def test_deleted_entries_are_excluded_from_radius_searches(self):
+        db, codes = self._documents_fixture()
+        db.delete_document('b')
+        self.assertEqual([], list(db.radius_search(codes[15], 0)))
+        self.assertEqual([b'5'], list(db.radius_search(codes[5], 0)))
+
+    def test_deleted_entries_are_excluded_from_search_many(self):
+        db, codes = self._documents_fixture()
+        db.delete_document('a')
+        results = db.search_many([codes[1], codes[12]], 5)
+        self.assertEqual(5, len(results[0]))
+        for row in results:
+            self.assertTrue(all(int(r) >= 10 for r in row))
+
+    def test_deleted_entries_are_excluded_with_multi_index(self):
+        db, codes = self._documents_fixture(multi_index=True)
+        db.delete_document('a')
+        results = list(db.search(codes[3], 5))
+        self.assertEqual(5, len(results))
+        self.assertTrue(all(int(r) >= 10 for r in results))
+
+    def test_replace_deletes_existing_document_entries(self):
+        db, codes = self._documents_fixture()
+        new_codes = [os.urandom(8) for _ in range(3)]
+        db.extend(
+            new_codes, ['x', 'y', 'z'], documents=['a'] * 3, replace=True)
+        self.assertEqual(10, db.n_deleted)
+        self.assertEqual([b'y'], list(db.search(new_codes[1], 1)))
+        self.assertEqual(13, len(list(db.search(codes[0], 30))))
+
+    def test_replace_requires_documents(self):
+        db = HammingDb(self._path, code_size=8)
+        self.assertRaises(
+            ValueError,
+            lambda: db.extend([os.urandom(8)], ['a'], replace=True))
+
+    def test_compaction_removes_deleted_entries(self):
+        db, codes = self._documents_fixture()
+        db.delete_document('a')
+        self.assertEqual(10, db.compact())
+        self.assertEqual(10, len(db))
+        self.assertEqual(0, db.n_deleted)
+        self.assertEqual(10, db._codes.logical_size)
+        self.assertEqual([b'15'], list(db.search(codes[15], 1)))
+
+    def test_compaction_with_nothing_deleted_does_nothing(self):
+        db, codes = self._documents_fixture()
+        self.assertEqual(0, db.compact())
+        self.assertEqual(20, len(db))
+
+    def test_compaction_writes_a_new_code_file(self):
+        db, codes = self._documents_fixture()
+        old_path = db._code_file.path
+        db.delete_document('a')
+        db.compact()
+        self.assertNotEqual(old_path, db._code_file.path)
+        self.assertFalse(os.path.exists(old_path))
+
+    def test_compaction_without_memory_mapped_file(self):
+        db, codes = self._documents_fixture(memory_mapped=False)
+        db.delete_document('b')
+        db.compact()
+        self.assertEqual(10, db._codes.logical_size)
+        self.assertEqual([b'4'], list(db.search(codes[4], 1)))
+
+    def _compact_in_another_process(self, document):
+        # LMDB environments must not be opened twice in the same process
+        process = Process(
+            target=_delete_and_compact, args=(self._path, document))
+        process.start()
+        process.join()
+        self.assertEqual(0, process.exitcode)
+
+    def test_other_instances_reload_after_compaction(self):
+        db, codes = self._documents_fixture()
+        self._compact_in_another_process('a')
+        self.assertEqual([b'12'], list(db.search(codes[12], 1)))
+        self.assertEqual(10, db._codes.logical_size)
+
+    def test_other_instances_can_append_after_compaction(self):
+        db, codes = self._documents_fixture()
+        self._compact_in_another_process('a')
+        code = os.urandom(8)
+        db.append(code, 'new')
+        self.assertEqual(11, len(db))
+        self.assertEqual(11, db._codes.logical_size)
+        self.assertEqual([b'new'], list(db.search(code, 1)))
+
+    def test_compaction_can_defer_reloading(self):
+        db, codes = self._documents_fixture()
+        db.delete_document('a')
+        db.compact(reload=False)
+        self.assertEqual(20, db._codes.logical_size)
+        self.assertEqual([b'12'], list(db.search(codes[12], 1)))
+        self.assertEqual(10, db._codes.logical_size)
+
+    def test_compaction_preserves_insertion_order(self):
+        db, codes = self._documents_fixture()
+        db.delete_document('a')
+        db.compact()
+        with db.env.begin() as txn:
+            ids = [_id for _id, _ in db._iter_sequence(txn)]
+        self.assertEqual(
+            [str(i).encode() for i in range(10, 20)], db.payloads(ids))
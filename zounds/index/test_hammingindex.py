@@ -5,13 +5,15 @@ from featureflow import \
     InMemoryDatabase, InMemoryChannel, EventLog
 from zounds.core import ArrayWithUnits, IdentityDimension
 from zounds.basic import stft, Slice, Binarize
-from zounds.timeseries import SR11025, Seconds
+from zounds.timeseries import SR11025, Seconds, TimeSlice
+from zounds.persistence import TimeSliceEncoder
 from zounds.synthesize import SineSynthesizer
 from zounds.persistence import ArrayWithUnitsFeature
 from zounds.soundfile import AudioMetaData
 import shutil
 from uuid import uuid4
 import numpy as np
+import ujson as json
 
 
 class HammingIndexTests(unittest2.TestCase):
@@ -115,6 +117,23 @@ class HammingIndexTests(unittest2.TestCase):
         results = index.search(encoded, 5)
         self.assertEqual(5, len(list(results)))
 
+    def test_can_search_for_many_features_at_once(self):
+        Model = self._model(
+            slice_size=128,
+            settings=self._settings_with_event_log())
+
+        index = self._index(Model, Model.sliced)
+        signal = SineSynthesizer(SR11025()) \
+            .synthesize(Seconds(5), [220, 440, 880])
+        _id = Model.process(meta=signal.encode())
+        index._synchronously_process_events()
+
+        model = Model(_id)
+        results = index.search_many(model.sliced[:3], 5)
+        self.assertEqual(3, len(results))
+        for result in results:
+            self.assertEqual(5, len(list(result)))
+
     def test_can_add_additional_data_to_index(self):
         Model = self._model(
             slice_size=128,
@@ -172,6 +191,55 @@ class HammingIndexTests(unittest2.TestCase):
         index._synchronously_process_events()
         self.assertTrue('index.sliced' in index.hamming_db.path)
 
+    def test_encode_queries_agrees_with_encode_query(self):
+        Model = self._model(
+            slice_size=64,
+            settings=self._settings_with_no_event_log())
+        index = self._index(Model, Model.sliced)
+        features = np.random.binomial(1, 0.5, (10, 64)).astype(np.bool_)
+        codes = index.encode_queries(features)
+        self.assertEqual((10, 8), codes.shape)
+        for feature, code in zip(features, codes):
+            self.assertEqual(index.encode_query(feature), code.tobytes())
+
+    def test_encode_queries_accepts_packed_features(self):
+        Model = self._model(
+            slice_size=64,
+            settings=self._settings_with_no_event_log())
+        index = self._index(Model, Model.sliced)
+        features = np.random.randint(0, 2 ** 63, (10, 2), dtype=np.uint64)
+        codes = index.encode_queries(features)
+        self.assertEqual((10, 16), codes.shape)
+        self.assertEqual(features[3].tobytes(), codes[3].tobytes())
+
+    def test_can_read_legacy_json_results(self):
+        Model = self._model(
+            slice_size=64,
+            settings=self._settings_with_no_event_log())
+        index = self._index(Model, Model.sliced)
+        code = b'a' * 8
+        index._init_hamming_db(code)
+        ts = TimeSlice(start=Seconds(1), duration=Seconds(2))
+        payload = json.dumps(dict(_id='doc', **TimeSliceEncoder().dict(ts)))
+        index.hamming_db.append(code, payload)
+        results = list(index.search(code, 1))
+        self.assertEqual([('doc', ts)], results)
+
+    def test_binary_results_are_cached_by_id(self):
+        Model = self._model(
+            slice_size=64,
+            settings=self._settings_with_no_event_log())
+        index = self._index(Model, Model.sliced)
+        code = b'a' * 8
+        index._init_hamming_db(code)
+        ts = TimeSlice(start=Seconds(1), duration=Seconds(2))
+        number = index.hamming_db.document_number('doc')
+        index.hamming_db.append(code, index.payload.encode(number, ts))
+        results = list(index.search(code, 1))
+        self.assertEqual([('doc', ts)], results)
+        self.assertEqual(1, len(index._result_cache))
+        self.assertEqual(results, list(index.search(code, 1)))
+
     def test_can_add_already_packed_feature(self):
         Model = self._model(
             slice_size=128,
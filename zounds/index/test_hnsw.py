@@ -0,0 +1,351 @@
+import unittest2
+import os
+import shutil
+from uuid import uuid4
+import numpy as np
+from .hnsw import HNSW, HNSWSearch, HNSWIndex
+from .brute_force import BruteForceSearch
+from .benchmark import synthetic_real_corpus, benchmark
+from zounds.core import ArrayWithUnits, IdentityDimension
+from zounds.timeseries import TimeDimension, Seconds, Milliseconds
+
+
+class HNSWTests(unittest2.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.vectors = rng.normal(0, 1, (500, 16)).astype(np.float32)
+
+    def _graph(self, **kwargs):
+        defaults = dict(M=8, ef_construction=64, seed=0)
+        defaults.update(kwargs)
+        graph = HNSW(16, **defaults)
+        graph.add(self.vectors)
+        return graph
+
+    def test_raises_for_unknown_distance_metric(self):
+        self.assertRaises(
+            ValueError, lambda: HNSW(16, distance_metric='manhattan'))
+
+    def test_raises_for_too_small_M(self):
+        self.assertRaises(ValueError, lambda: HNSW(16, M=1))
+
+    def test_search_of_empty_graph_returns_nothing(self):
+        indices, distances = HNSW(16).search(self.vectors[0], 10)
+        self.assertEqual(0, len(indices))
+        self.assertEqual(0, len(distances))
+
+    def test_len(self):
+        self.assertEqual(500, len(self._graph()))
+
+    def test_finds_exact_match_first(self):
+        graph = self._graph()
+        indices, distances = graph.search(self.vectors[123], 5)
+        self.assertEqual(123, indices[0])
+        self.assertAlmostEqual(0, distances[0], places=4)
+
+    def test_results_are_ordered_by_distance(self):
+        graph = self._graph()
+        _, distances = graph.search(self.vectors[7], 20)
+        self.assertEqual(20, len(distances))
+        np.testing.assert_array_equal(np.sort(distances), distances)
+
+    def test_neighbor_lists_are_bounded(self):
+        graph = self._graph()
+        links = graph._base.logical_data
+        self.assertTrue(((links >= 0).sum(axis=1) <= 16).all())
+        self.assertGreater(graph.max_level, 0)
+        for level in range(1, graph.max_level + 1):
+            for node in range(len(graph)):
+                self.assertLessEqual(len(graph._neighbors(node, level)), 8)
+
+    def test_recall_is_high_compared_to_exact_search(self):
+        graph = self._graph()
+        hits = 0
+        for query in self.vectors[:50]:
+            distances = ((self.vectors - query) ** 2).sum(axis=1)
+            expected = set(np.argsort(distances)[:10])
+            indices, _ = graph.search(query, 10, ef=64)
+            hits += len(expected & set(indices))
+        self.assertGreater(hits / 500, 0.9)
+
+    def test_cosine_distance_ignores_magnitude(self):
+        graph = self._graph(distance_metric='cosine')
+        indices, distances = graph.search(self.vectors[42] * 10, 1)
+        self.assertEqual(42, indices[0])
+        self.assertAlmostEqual(0, distances[0], places=4)
+
+    def test_incremental_inserts_are_searchable(self):
+        graph = self._graph()
+        added = graph.add(self.vectors[:3] + 100)
+        np.testing.assert_array_equal([500, 501, 502], added)
+        indices, _ = graph.search(self.vectors[1] + 100, 1)
+        self.assertEqual(501, indices[0])
+
+    def test_can_save_and_load(self):
+        graph = self._graph()
+        path = '/tmp/{path}.npz'.format(path=uuid4().hex)
+        try:
+            with open(path, 'wb') as f:
+                graph.save(f)
+            with np.load(path) as arrays:
+                loaded = HNSW.load(arrays)
+        finally:
+            os.remove(path)
+
+        self.assertEqual(len(graph), len(loaded))
+        self.assertEqual(graph.entry_point, loaded.entry_point)
+        for query in self.vectors[:10]:
+            expected, _ = graph.search(query, 10)
+            actual, _ = loaded.search(query, 10)
+            np.testing.assert_array_equal(expected, actual)
+
+
+class HNSWSearchTests(unittest2.TestCase):
+    def setUp(self):
+        self.corpus = list(synthetic_real_corpus(
+            n_documents=10,
+            frames_per_document=50,
+            n_dims=16,
+            n_clusters=20,
+            noise=0.1,
+            seed=0))
+
+    def test_finds_exact_match_first(self):
+        index = HNSWSearch(iter(self.corpus), M=8, seed=0)
+        _id, ts = next(iter(index.search(self.corpus[3][1][17], 5)))
+        self.assertEqual('doc3', _id)
+        self.assertEqual(Seconds(17), ts.start)
+
+    def test_recall_is_high_compared_to_brute_force(self):
+        index = HNSWSearch(iter(self.corpus), M=8, ef=64, seed=0)
+        baseline = BruteForceSearch(iter(self.corpus))
+        queries = [features[10] for _, features in self.corpus]
+        result, _ = benchmark(index, baseline, queries, k=10)
+        self.assertGreater(result.recall, 0.9)
+
+
+class Feature(object):
+    """
+    Stands in for a feature, reading frames from a dictionary rather than
+    from a database
+    """
+
+    def __init__(self, data):
+        super(Feature, self).__init__()
+        self.data = data
+        self.key = 'embedding'
+        self.version = '1'
+
+    def __call__(self, _id=None, persistence=None):
+        return self.data[_id]
+
+
+class HNSWIndexTests(unittest2.TestCase):
+    def setUp(self):
+        self.path = '/tmp/{path}'.format(path=uuid4().hex)
+        self.data = {}
+        self.feature = Feature(self.data)
+        self.rng = np.random.RandomState(0)
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def _document(self, _id, n_frames=20):
+        td = TimeDimension(Milliseconds(500), Seconds(1))
+        arr = self.rng.normal(0, 1, (n_frames, 8)).astype(np.float32)
+        self.data[_id] = ArrayWithUnits(arr, [td, IdentityDimension()])
+        return self.data[_id]
+
+    def _index(self, **kwargs):
+        return HNSWIndex(None, self.feature, path=self.path, seed=0, **kwargs)
+
+    def test_empty_index_has_no_results(self):
+        index = self._index()
+        self.assertEqual(0, len(index))
+        self.assertEqual([], list(index.search(np.zeros(8), 10)))
+
+    def test_listen_raises_if_document_has_no_event_log(self):
+        index = self._index()
+        self.assertRaises(
+            ValueError, lambda: index._synchronously_process_events())
+
+    def test_can_add_and_search(self):
+        features = self._document('a')
+        self._document('b')
+        index = self._index()
+        index.add('a')
+        index.add('b')
+        self.assertEqual(40, len(index))
+        _id, ts = next(iter(index.search(features[5], 3)))
+        self.assertEqual('a', _id)
+        self.assertEqual(Milliseconds(2500), ts.start)
+        self.assertEqual(Seconds(1), ts.duration)
+
+    def test_can_roundtrip_query(self):
+        features = self._document('a')
+        index = self._index()
+        index.add('a')
+        results = index.search(features[3], 5)
+        query = index.decode_query(results.query)
+        np.testing.assert_array_equal(features[3], query)
+        self.assertEqual(
+            list(results), list(index.search(results.query, 5)))
+
+    def test_random_search(self):
+        self._document('a')
+        index = self._index()
+        index.add('a')
+        self.assertEqual(5, len(list(index.random_search(5))))
+
+    def test_readding_document_replaces_frames(self):
+        self._document('a')
+        index = self._index()
+        index.add('a')
+        features = self._document('a', n_frames=10)
+        index.add('a')
+        self.assertEqual(10, len(index))
+        results = list(index.search(features[2], 20))
+        self.assertEqual(10, len(results))
+        self.assertEqual(Milliseconds(1000), results[0][1].start)
+
+    def test_deleted_documents_are_not_returned(self):
+        self._document('a')
+        features = self._document('b')
+        index = self._index()
+        index.add('a')
+        index.add('b')
+        self.assertEqual(20, index.delete('b'))
+        results = list(index.search(features[0], 30))
+        self.assertEqual(20, len(results))
+        self.assertTrue(all(_id == 'a' for _id, _ in results))
+
+    def test_persists_index_and_timestamp(self):
+        features = self._document('a')
+        index = self._index()
+        index.add('a', timestamp=b'0123')
+        expected = list(index.search(features[7], 5))
+
+        index = self._index()
+        self.assertEqual(20, len(index))
+        self.assertEqual(b'0123', index._last_indexed_timestamp())
+        self.assertEqual(expected, list(index.search(features[7], 5)))
+
+    def test_can_insert_after_reloading(self):
+        self._document('a')
+        features = self._document('b')
+        self._index().add('a')
+        index = self._index()
+        index.add('b')
+        self.assertEqual(40, len(index))
+        _id, ts = next(iter(index.search(features[11], 1)))
+        self.assertEqual('b', _id)
+        self.assertEqual(Milliseconds(5500), ts.start)
+
+    def test_raises_for_invalid_max_dead_fraction(self):
+        self.assertRaises(
+            ValueError, lambda: self._index(max_dead_fraction=1))
+
+    def test_does_not_rewrite_graph_for_every_write(self):
+        for i in range(8):
+            self._document('doc{i}'.format(**locals()))
+        index = self._index()
+        saves = []
+        save = index._save
+
+        def counting_save():
+            saves.append(len(index))
+            save()
+
+        index._save = counting_save
+        for i in range(8):
+            index.add('doc{i}'.format(**locals()))
+        # the number of frames saved doubles each time
+        self.assertEqual([20, 40, 80, 160], saves)
+
+    def test_flush_saves_pending_writes(self):
+        self._document('a')
+        self._document('b')
+        features = self._document('c')
+        index = self._index()
+        index.add('a')
+        index.add('b')
+        index.add('c', timestamp=b'0123')
+        self.assertEqual(40, len(self._index()))
+        index.flush()
+        reloaded = self._index()
+        self.assertEqual(60, len(reloaded))
+        self.assertEqual(b'0123', reloaded._last_indexed_timestamp())
+        _id, _ = next(iter(reloaded.search(features[3], 1)))
+        self.assertEqual('c', _id)
+
+    def test_close_saves_pending_writes(self):
+        for _id in 'abc':
+            self._document(_id)
+        with self._index() as index:
+            for _id in 'abc':
+                index.add(_id)
+        self.assertEqual(60, len(self._index()))
+
+    def test_compact_removes_deleted_frames_from_graph(self):
+        self._document('a')
+        features = self._document('b')
+        self._document('c')
+        index = self._index()
+        for _id in 'abc':
+            index.add(_id)
+        index.delete('a')
+        self.assertEqual(20, index.compact())
+        self.assertEqual(40, len(index.graph))
+        self.assertEqual(40, len(index))
+        self.assertEqual(0, index.compact())
+        _id, ts = next(iter(index.search(features[4], 1)))
+        self.assertEqual('b', _id)
+        self.assertEqual(Milliseconds(2000), ts.start)
+        reloaded = self._index()
+        self.assertEqual(40, len(reloaded.graph))
+        self.assertEqual(
+            list(index.search(features[4], 5)),
+            list(reloaded.search(features[4], 5)))
+
+    def test_compacts_once_too_much_of_the_graph_is_dead(self):
+        self._document('a')
+        features = self._document('b')
+        index = self._index(max_dead_fraction=0.4)
+        index.add('a')
+        index.add('b')
+        self.assertEqual(40, len(index.graph))
+        index.add('a')
+        self.assertEqual(60, len(index.graph))
+        index.delete('a')
+        self.assertEqual(20, len(index.graph))
+        results = list(index.search(features[0], 30))
+        self.assertEqual(20, len(results))
+        self.assertTrue(all(_id == 'b' for _id, _ in results))
+
+    def test_compacting_everything_empties_the_index(self):
+        self._document('a')
+        index = self._index()
+        index.add('a', timestamp=b'0123')
+        index.delete('a')
+        self.assertIsNone(index.graph)
+        self.assertEqual([], list(index.search(np.zeros(8), 10)))
+        self.assertEqual(b'0123', index._last_indexed_timestamp())
+
+    def test_search_candidates_are_bounded_by_dead_fraction(self):
+        for _id in 'abcd':
+            self._document(_id)
+        index = self._index()
+        for _id in 'abcd':
+            index.add(_id)
+        index.delete('a')
+        requested = []
+        search = index.graph.search
+
+        def recording_search(query, k, ef):
+            requested.append((k, ef))
+            return search(query, k, ef)
+
+        index.graph.search = recording_search
+        index.search(np.zeros(8), 30, ef=10)
+        # a quarter of the graph is dead, so four thirds as many candidates
+        self.assertEqual([(40, 40)], requested)
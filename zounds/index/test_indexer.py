@@ -0,0 +1,165 @@
+import unittest2
+import threading
+import time
+from .indexer import IndexingWorker, event_timestamp
+from zounds.timeseries import Microseconds
+
+
+def _timestamp(microseconds):
+    return hex(microseconds).encode() + b'0' * 16
+
+
+class EventTimestampTests(unittest2.TestCase):
+    def test_parses_bytes(self):
+        self.assertEqual(1234567, event_timestamp(_timestamp(1234567)))
+
+    def test_parses_str(self):
+        self.assertEqual(
+            1234567, event_timestamp(_timestamp(1234567).decode()))
+
+    def test_returns_none_for_empty_timestamp(self):
+        self.assertIsNone(event_timestamp(b''))
+
+
+class IndexingWorkerTests(unittest2.TestCase):
+    def _events(self, n, start=1000):
+        return [(_timestamp(start + i), 'doc{i}'.format(**locals()))
+                for i in range(n)]
+
+    def _worker(self, events, load=None, **kwargs):
+        self.written = []
+        self.timestamps = []
+
+        def write(items, timestamp):
+            self.written.extend(items)
+            self.timestamps.append(timestamp)
+
+        return IndexingWorker(
+            events, load or (lambda _id: _id), write, **kwargs)
+
+    def test_raises_for_invalid_worker_count(self):
+        self.assertRaises(ValueError, lambda: self._worker([], n_workers=0))
+
+    def test_raises_for_invalid_max_pending(self):
+        self.assertRaises(ValueError, lambda: self._worker([], max_pending=0))
+
+    def test_writes_every_item_in_event_order(self):
+        events = self._events(50)
+
+        def load(_id):
+            # finish out of order
+            time.sleep(0.001 * (hash(_id) % 3))
+            return _id
+
+        worker = self._worker(events, load=load, n_workers=4)
+        worker.run()
+        self.assertEqual([_id for _, _id in events], self.written)
+        self.assertEqual(50, worker.n_indexed)
+
+    def test_checkpoints_are_monotonic(self):
+        events = self._events(50)
+        worker = self._worker(events, n_workers=4)
+        worker.run()
+        self.assertEqual(sorted(self.timestamps), self.timestamps)
+        self.assertEqual(events[-1][0], self.timestamps[-1])
+        self.assertEqual(events[-1][0], worker.indexed_timestamp)
+
+    def test_respects_batch_size(self):
+        worker = self._worker(self._events(20), batch_size=3)
+        worker.run()
+        self.assertEqual(20, len(self.written))
+
+    def test_events_without_ids_advance_checkpoint_only(self):
+        events = self._events(3) + [(_timestamp(2000), None)]
+        worker = self._worker(events)
+        worker.run()
+        self.assertEqual(3, len(self.written))
+        self.assertEqual(_timestamp(2000), worker.indexed_timestamp)
+
+    def test_items_that_load_as_none_are_not_written(self):
+        worker = self._worker(self._events(10), load=lambda _id: None)
+        worker.run()
+        self.assertEqual([], self.written)
+        self.assertEqual(0, worker.n_indexed)
+
+    def test_nothing_after_a_failure_is_written(self):
+        events = self._events(10)
+
+        def load(_id):
+            if _id == 'doc5':
+                raise RuntimeError()
+            return _id
+
+        worker = self._worker(events, load=load, n_workers=3)
+        self.assertRaises(RuntimeError, worker.run)
+        self.assertEqual(['doc0', 'doc1', 'doc2', 'doc3', 'doc4'], self.written)
+        self.assertEqual(events[4][0], worker.indexed_timestamp)
+
+    def test_write_failures_are_raised(self):
+        def write(items, timestamp):
+            raise RuntimeError()
+
+        worker = IndexingWorker(self._events(5), lambda _id: _id, write)
+        self.assertRaises(RuntimeError, worker.run)
+        self.assertIsNone(worker.indexed_timestamp)
+
+    def test_limits_number_of_pending_events(self):
+        release = threading.Event()
+        in_flight = []
+
+        def load(_id):
+            in_flight.append(_id)
+            release.wait()
+            return _id
+
+        worker = self._worker(
+            self._events(20), load=load, n_workers=2, max_pending=4)
+        thread = threading.Thread(target=worker.run)
+        thread.daemon = True
+        thread.start()
+        time.sleep(0.1)
+        self.assertLessEqual(len(in_flight), 4)
+        self.assertEqual(worker.head_timestamp, _timestamp(1003))
+        release.set()
+        thread.join()
+        self.assertEqual(20, len(self.written))
+
+    def test_lag_is_zero_before_any_events(self):
+        worker = self._worker([])
+        self.assertEqual(Microseconds(0), worker.lag)
+
+    def test_lag_is_zero_when_caught_up(self):
+        worker = self._worker(self._events(10))
+        worker.run()
+        self.assertEqual(Microseconds(0), worker.lag)
+
+    def test_lag_reflects_unindexed_events(self):
+        worker = self._worker(
+            self._events(10), indexed_timestamp=_timestamp(1000))
+        worker.head_timestamp = _timestamp(1250)
+        self.assertEqual(Microseconds(250), worker.lag)
+
+    def test_lag_is_measured_from_event_log_head_under_backpressure(self):
+        release = threading.Event()
+
+        def load(_id):
+            release.wait()
+            return _id
+
+        events = self._events(20)
+        worker = self._worker(
+            events,
+            load=load,
+            max_pending=2,
+            head=lambda: events[-1][0])
+        thread = threading.Thread(target=worker.run)
+        thread.daemon = True
+        thread.start()
+        time.sleep(0.1)
+        # reading has stalled near the start of the stream, but the lag
+        # reflects every event in the log
+        self.assertEqual(worker.head_timestamp, _timestamp(1001))
+        self.assertEqual(Microseconds(19), worker.lag)
+        release.set()
+        thread.join()
+        self.assertEqual(Microseconds(0), worker.lag)
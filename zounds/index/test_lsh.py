@@ -0,0 +1,66 @@
+import unittest2
+import numpy as np
+from .lsh import MultiProbeLSHSearch
+from .brute_force import HammingDistanceBruteForceSearch
+from .benchmark import synthetic_binary_corpus, benchmark
+from zounds.timeseries import Seconds
+
+
+class MultiProbeLSHSearchTests(unittest2.TestCase):
+    def setUp(self):
+        self.corpus = list(synthetic_binary_corpus(
+            n_documents=10,
+            frames_per_document=100,
+            n_bits=128,
+            n_clusters=20,
+            noise=0.05,
+            seed=0))
+
+    def _search(self, **kwargs):
+        defaults = dict(n_tables=8, bits_per_table=16, seed=0)
+        defaults.update(kwargs)
+        return MultiProbeLSHSearch(iter(self.corpus), **defaults)
+
+    def test_raises_when_bits_per_table_is_too_large(self):
+        self.assertRaises(
+            ValueError, lambda: self._search(bits_per_table=64))
+
+    def test_raises_for_zero_bits_per_table(self):
+        self.assertRaises(ValueError, lambda: self._search(bits_per_table=0))
+
+    def test_raises_for_negative_probe_radius(self):
+        self.assertRaises(ValueError, lambda: self._search(probe_radius=-1))
+
+    def test_finds_exact_match_first(self):
+        index = self._search()
+        _id, ts = next(iter(index.search(self.corpus[4][1][21], 5)))
+        self.assertEqual('doc4', _id)
+        self.assertEqual(Seconds(21), ts.start)
+
+    def test_probing_finds_more_candidates(self):
+        query = np.array(self.corpus[0][1][0])
+        narrow = self._search(probe_radius=0).candidates(query)
+        wide = self._search(probe_radius=2).candidates(query)
+        self.assertTrue(set(narrow) <= set(wide))
+        self.assertGreater(len(wide), len(narrow))
+
+    def test_results_are_ordered_by_distance(self):
+        index = self._search(probe_radius=2)
+        query = self.corpus[2][1][5]
+        results = list(index.search(query, 20))
+        docs = dict(self.corpus)
+        distances = [
+            np.unpackbits(
+                (np.array(docs[_id][ts][0]) ^ np.array(query))
+                .view(np.uint8)).sum()
+            for _id, ts in results]
+        self.assertEqual(sorted(distances), distances)
+
+    def test_recall_is_high_compared_to_brute_force(self):
+        index = self._search(probe_radius=1)
+        baseline = HammingDistanceBruteForceSearch(iter(self.corpus))
+        queries = [baseline.index[i] for i in range(0, 1000, 50)]
+        result, baseline_result = benchmark(index, baseline, queries, k=10)
+        self.assertGreater(result.recall, 0.9)
+        self.assertEqual(1.0, baseline_result.recall)
+        self.assertEqual(20, result.n_queries)
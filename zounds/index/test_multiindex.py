@@ -0,0 +1,105 @@
+import unittest2
+import numpy as np
+from .multiindex import MultiIndexHash, gather_ranges
+from zounds.nputil import packed_hamming_distance
+
+
+class GatherRangesTests(unittest2.TestCase):
+    def test_concatenates_ranges(self):
+        arr = np.arange(10)
+        result = gather_ranges(arr, np.array([1, 5]), np.array([3, 8]))
+        np.testing.assert_array_equal([1, 2, 5, 6, 7], result)
+
+    def test_empty_ranges_produce_empty_result(self):
+        arr = np.arange(10)
+        result = gather_ranges(arr, np.array([4, 4]), np.array([4, 4]))
+        self.assertEqual(0, len(result))
+
+
+class MultiIndexHashTests(unittest2.TestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(0)
+
+    def _codes(self, n, n_chunks=2):
+        return self.rng.randint(
+            0, 2 ** 63, size=(n, n_chunks), dtype=np.uint64)
+
+    def _flip_bits(self, code, n_bits):
+        bits = np.unpackbits(code.view(np.uint8))
+        positions = self.rng.permutation(len(bits))[:n_bits]
+        bits[positions] = 1 - bits[positions]
+        return np.packbits(bits).view(np.uint64)
+
+    def _brute_force(self, query, codes, n_results):
+        distances = packed_hamming_distance(query, codes)
+        return np.sort(distances)[:n_results]
+
+    def test_raises_when_code_size_is_not_multiple_of_substring_size(self):
+        self.assertRaises(ValueError, lambda: MultiIndexHash(code_size=3))
+
+    def test_splits_code_into_16_bit_substrings(self):
+        mih = MultiIndexHash(code_size=16)
+        self.assertEqual(8, mih.n_substrings)
+
+    def test_finds_exact_match(self):
+        codes = self._codes(1000)
+        mih = MultiIndexHash(code_size=16)
+        indices, distances = mih.search(codes[42], codes, 1)
+        self.assertEqual(42, indices[0])
+        self.assertEqual(0, distances[0])
+
+    def test_distances_match_brute_force(self):
+        codes = self._codes(2000)
+        codes[10:20] = [self._flip_bits(codes[5], i) for i in range(10)]
+        mih = MultiIndexHash(code_size=16)
+        indices, distances = mih.search(codes[5], codes, 10)
+        expected = self._brute_force(codes[5], codes, 10)
+        np.testing.assert_array_equal(expected, distances)
+        np.testing.assert_array_equal(
+            distances, packed_hamming_distance(codes[5], codes[indices]))
+
+    def test_results_are_sorted(self):
+        codes = self._codes(500)
+        mih = MultiIndexHash(code_size=16)
+        _, distances = mih.search(codes[0], codes, 50)
+        np.testing.assert_array_equal(np.sort(distances), distances)
+
+    def test_falls_back_to_linear_scan_for_distant_neighbors(self):
+        codes = self._codes(100)
+        mih = MultiIndexHash(code_size=16, max_probe_radius=0)
+        query = self._codes(1)[0]
+        _, distances = mih.search(query, codes, 5)
+        np.testing.assert_array_equal(
+            self._brute_force(query, codes, 5), distances)
+
+    def test_returns_at_most_the_number_of_codes(self):
+        codes = self._codes(3)
+        mih = MultiIndexHash(code_size=16)
+        indices, _ = mih.search(codes[0], codes, 10)
+        self.assertEqual(3, len(indices))
+
+    def test_max_radius_limits_results(self):
+        codes = self._codes(1000)
+        codes[100] = self._flip_bits(codes[0], 2)
+        codes[200] = self._flip_bits(codes[0], 4)
+        mih = MultiIndexHash(code_size=16)
+        indices, distances = mih.search(codes[0], codes, 10, max_radius=3)
+        np.testing.assert_array_equal([0, 100], indices)
+        np.testing.assert_array_equal([0, 2], distances)
+
+    def test_rows_appended_after_build_are_searched(self):
+        codes = self._codes(1000)
+        mih = MultiIndexHash(code_size=16)
+        mih.build(codes)
+        codes = np.concatenate([codes, self._codes(5)])
+        indices, _ = mih.search(codes[1002], codes, 1)
+        self.assertEqual(1002, indices[0])
+        self.assertEqual(1000, mih.n_indexed)
+
+    def test_rebuilds_when_too_many_rows_are_unindexed(self):
+        codes = self._codes(100)
+        mih = MultiIndexHash(code_size=16, rebuild_ratio=0.1)
+        mih.build(codes)
+        codes = np.concatenate([codes, self._codes(50)])
+        mih.search(codes[0], codes, 1)
+        self.assertEqual(150, mih.n_indexed)
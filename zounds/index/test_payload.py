@@ -0,0 +1,78 @@
+import unittest2
+import numpy as np
+from .payload import \
+    BinaryPayload, LRUCache, is_binary_payload, to_picoseconds
+from zounds.timeseries import TimeSlice, Seconds, Milliseconds, Picoseconds
+
+
+class BinaryPayloadTests(unittest2.TestCase):
+    def setUp(self):
+        self.payload = BinaryPayload()
+
+    def test_is_recognized_as_binary(self):
+        ts = TimeSlice(start=Seconds(1), duration=Seconds(2))
+        self.assertTrue(is_binary_payload(self.payload.encode(3, ts)))
+
+    def test_json_is_not_recognized_as_binary(self):
+        self.assertFalse(is_binary_payload(b'{"_id": "abc"}'))
+
+    def test_payload_without_extra_data_is_fixed_width(self):
+        ts1 = TimeSlice(start=Seconds(1), duration=Seconds(2))
+        ts2 = TimeSlice(start=Seconds(1000), duration=Milliseconds(2))
+        self.assertEqual(
+            len(self.payload.encode(3, ts1)),
+            len(self.payload.encode(10000, ts2)))
+
+    def test_roundtrip(self):
+        ts = TimeSlice(start=Milliseconds(1500), duration=Milliseconds(23))
+        document_number, start, duration, extra_data = \
+            self.payload.decode(self.payload.encode(7, ts))
+        self.assertEqual(7, document_number)
+        self.assertEqual(ts.start, start)
+        self.assertEqual(ts.duration, duration)
+        self.assertIsNone(extra_data)
+
+    def test_roundtrip_with_extra_data(self):
+        ts = TimeSlice(start=Seconds(1), duration=Seconds(2))
+        payload = self.payload.encode(1, ts, dict(web_url='https://example.com'))
+        _, _, _, extra_data = self.payload.decode(payload)
+        self.assertEqual('https://example.com', extra_data['web_url'])
+
+    def test_encode_many_matches_encode(self):
+        slices = [
+            TimeSlice(start=Milliseconds(i * 500), duration=Seconds(1))
+            for i in range(10)]
+        starts = np.array([to_picoseconds(ts.start) for ts in slices])
+        durations = np.array([to_picoseconds(ts.duration) for ts in slices])
+        payloads = self.payload.encode_many(12, starts, durations)
+        self.assertEqual(
+            [self.payload.encode(12, ts) for ts in slices], payloads)
+
+    def test_encode_many_with_no_slices(self):
+        self.assertEqual(
+            [], self.payload.encode_many(1, np.zeros(0), np.zeros(0)))
+
+    def test_to_picoseconds_is_exact(self):
+        self.assertEqual(3600 * 10 ** 12, to_picoseconds(Seconds(3600)))
+        self.assertEqual(1, to_picoseconds(Picoseconds(1)))
+
+
+class LRUCacheTests(unittest2.TestCase):
+    def test_returns_default_for_missing_key(self):
+        cache = LRUCache(2)
+        self.assertIsNone(cache.get('a'))
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache['a'] = 1
+        cache['b'] = 2
+        cache.get('a')
+        cache['c'] = 3
+        self.assertTrue('a' in cache)
+        self.assertFalse('b' in cache)
+        self.assertEqual(2, len(cache))
+
+    def test_zero_size_cache_stores_nothing(self):
+        cache = LRUCache(0)
+        cache['a'] = 1
+        self.assertEqual(0, len(cache))
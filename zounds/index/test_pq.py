@@ -0,0 +1,83 @@
+import unittest2
+import numpy as np
+from .pq import ProductQuantizationSearch
+from .brute_force import BruteForceSearch
+from zounds.core import ArrayWithUnits, IdentityDimension
+from zounds.timeseries import TimeDimension, Seconds
+
+
+class ProductQuantizationSearchTests(unittest2.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        # clustered data, so that nearest neighbors are meaningful
+        centers = rng.normal(0, 10, (20, 16))
+        self.docs = []
+        for i in range(10):
+            labels = rng.randint(0, len(centers), 100)
+            raw = centers[labels] + rng.normal(0, 1, (100, 16))
+            arr = ArrayWithUnits(
+                raw, [TimeDimension(Seconds(1)), IdentityDimension()])
+            self.docs.append(('doc{i}'.format(**locals()), arr))
+
+    def _gen(self):
+        return iter(self.docs)
+
+    def _search(self, **kwargs):
+        defaults = dict(n_subquantizers=4, n_lists=8, n_probe=8, seed=0)
+        defaults.update(kwargs)
+        return ProductQuantizationSearch(self._gen(), **defaults)
+
+    def test_raises_for_unsupported_distance_metric(self):
+        self.assertRaises(
+            ValueError, lambda: self._search(distance_metric='hamming'))
+
+    def test_raises_when_subquantizers_do_not_divide_dimension(self):
+        self.assertRaises(ValueError, lambda: self._search(n_subquantizers=5))
+
+    def test_stores_compact_codes(self):
+        index = self._search()
+        self.assertEqual((1000, 4), index.codes.shape)
+        self.assertEqual(np.uint8, index.codes.dtype)
+
+    def test_returns_requested_number_of_results(self):
+        index = self._search()
+        results = list(index.search(self.docs[0][1][0], n_results=5))
+        self.assertEqual(5, len(results))
+
+    def test_finds_exact_match_first(self):
+        index = self._search()
+        _id, ts = list(index.search(self.docs[3][1][17], n_results=5))[0]
+        self.assertEqual('doc3', _id)
+        self.assertEqual(Seconds(17), ts.start)
+
+    def test_reranked_results_agree_with_brute_force(self):
+        index = self._search()
+        brute_force = BruteForceSearch(self._gen())
+        query = self.docs[5][1][42]
+        expected = list(brute_force.search(query, n_results=5))
+        actual = list(index.search(query, n_results=5))
+        self.assertEqual(
+            [(_id, ts.start) for _id, ts in expected],
+            [(_id, ts.start) for _id, ts in actual])
+
+    def test_can_search_without_exact_vectors(self):
+        index = self._search(rerank=False)
+        self.assertIsNone(index.index)
+        results = list(index.search(self.docs[3][1][17], n_results=5))
+        self.assertEqual(5, len(results))
+
+    def test_can_search_with_cosine_distance(self):
+        index = self._search(distance_metric='cosine')
+        _id, ts = list(index.search(self.docs[2][1][3], n_results=5))[0]
+        self.assertEqual('doc2', _id)
+        self.assertEqual(Seconds(3), ts.start)
+
+    def test_random_search(self):
+        index = self._search()
+        results = list(index.random_search(n_results=3))
+        self.assertEqual(3, len(results))
+
+    def test_random_search_without_exact_vectors(self):
+        index = self._search(rerank=False)
+        results = list(index.random_search(n_results=3))
+        self.assertEqual(3, len(results))
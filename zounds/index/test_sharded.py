@@ -0,0 +1,54 @@
+import unittest2
+import numpy as np
+from uuid import uuid4
+import os
+from .codefile import CodeFile
+from .sharded import ShardedSearch
+from zounds.nputil import packed_hamming_distance
+
+
+class ShardedSearchTests(unittest2.TestCase):
+    def setUp(self):
+        self._path = '/tmp/{path}'.format(path=uuid4().hex)
+        self.dtype = np.dtype([('id', 'S4'), ('code', np.uint64, 2)])
+        self.records = np.zeros(1000, dtype=self.dtype)
+        self.records['code'] = np.random.randint(
+            0, 2 ** 63, (1000, 2), dtype=np.uint64)
+        CodeFile(self._path, self.dtype).write(0, self.records)
+        self.search = None
+
+    def tearDown(self):
+        if self.search is not None:
+            self.search.close()
+        try:
+            os.remove(self._path)
+        except OSError:
+            pass
+
+    def test_raises_when_no_shards(self):
+        self.assertRaises(
+            ValueError, lambda: ShardedSearch(self._path, self.dtype, 0))
+
+    def test_finds_exact_match(self):
+        self.search = ShardedSearch(self._path, self.dtype, 3)
+        indices = self.search.search(self.records['code'][731], 1000, 1)
+        self.assertEqual([731], list(indices))
+
+    def test_agrees_with_brute_force(self):
+        self.search = ShardedSearch(self._path, self.dtype, 4)
+        query = self.records['code'][0]
+        indices = self.search.search(query, 1000, 10, sort=True)
+        distances = packed_hamming_distance(query, self.records['code'])
+        np.testing.assert_array_equal(
+            np.sort(distances)[:10], distances[indices])
+
+    def test_only_searches_valid_rows(self):
+        self.search = ShardedSearch(self._path, self.dtype, 4)
+        indices = self.search.search(self.records['code'][900], 500, 500)
+        self.assertEqual(500, len(indices))
+        self.assertTrue(np.all(indices < 500))
+
+    def test_more_shards_than_rows(self):
+        self.search = ShardedSearch(self._path, self.dtype, 4)
+        indices = self.search.search(self.records['code'][1], 2, 5)
+        self.assertEqual([0, 1], sorted(indices))
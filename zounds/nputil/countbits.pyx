@@ -2,8 +2,8 @@ from __future__ import division
 cimport numpy as np
 import numpy as np
 
-INT_DTYPE = np.int
-ctypedef np.int_t INT_DTYPE_t
+INT_DTYPE = np.int64
+ctypedef np.int64_t INT_DTYPE_t
 
 FLOAT_DTYPE = np.float32
 ctypedef np.float32_t FLOAT_DTYPE_t
@@ -11,6 +11,9 @@ ctypedef np.float32_t FLOAT_DTYPE_t
 UINT64_DTYPE = np.uint64
 ctypedef np.uint64_t UINT64_DTYPE_t
 
+UINT16_DTYPE = np.uint16
+ctypedef np.uint16_t UINT16_DTYPE_t
+
 ctypedef unsigned long ULong
 
 cimport cython
@@ -21,37 +24,200 @@ cdef extern int __builtin_popcountl(unsigned long) nogil
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
-def count_bits(np.ndarray[UINT64_DTYPE_t,ndim = 1] n):
-    cdef np.ndarray[INT_DTYPE_t,ndim = 1] out = \
-        np.ndarray(n.size,dtype = INT_DTYPE)
-    cdef int i = 0
-    cdef int l = n.size
-    cdef UINT64_DTYPE_t a = 0x5555555555555555
-    cdef UINT64_DTYPE_t b = 0x3333333333333333
-    cdef UINT64_DTYPE_t c = 0xF0F0F0F0F0F0F0F
-    cdef UINT64_DTYPE_t d = 0x101010101010101
-    cdef UINT64_DTYPE_t z = 0
-    for i in range(l):
-        z = n[i]
-        z = z - ((z >> 1) & a)
-        z = (z & b) + ((z >> 2) & b)
-        out[i] = ((z + (z >> 4)) & c) * d >> 56
+def count_bits(const UINT64_DTYPE_t[:] n):
+    cdef Py_ssize_t l = n.shape[0]
+    out = np.ndarray(l, dtype=INT_DTYPE)
+    cdef INT_DTYPE_t[:] out_view = out
+    cdef Py_ssize_t i = 0
+    with nogil:
+        for i in range(l):
+            out_view[i] = __builtin_popcountl(n[i])
+    return out
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def count_packed_bits(const UINT64_DTYPE_t[:, :] n):
+    cdef Py_ssize_t ns = n.shape[0]
+    cdef Py_ssize_t ns2 = n.shape[1]
+    out = np.ndarray(ns, dtype=INT_DTYPE)
+    cdef INT_DTYPE_t[:] out_view = out
+    cdef Py_ssize_t i = 0
+    cdef Py_ssize_t j = 0
+    cdef INT_DTYPE_t z = 0
+    with nogil:
+        for i in range(ns):
+            z = 0
+            for j in range(ns2):
+                z += __builtin_popcountl(n[i, j])
+            out_view[i] = z
+    return out
+
+
+cdef inline UINT16_DTYPE_t _xor_popcount(
+        const UINT64_DTYPE_t[:] a,
+        const UINT64_DTYPE_t[:, :] b,
+        Py_ssize_t row,
+        Py_ssize_t n_words) noexcept nogil:
+    cdef Py_ssize_t j
+    cdef unsigned int z = 0
+    for j in range(n_words):
+        z += __builtin_popcountl(a[j] ^ b[row, j])
+    return <UINT16_DTYPE_t>z
+
+
+def _check_words(Py_ssize_t query_words, Py_ssize_t code_words):
+    if query_words != code_words:
+        raise ValueError(
+            'query has {query_words} words, but codes have {code_words}'
+                .format(**locals()))
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def xor_count_packed_bits(
+        const UINT64_DTYPE_t[:] query, const UINT64_DTYPE_t[:, :] codes):
+    """
+    Compute the hamming distance between a single packed query and each row of
+    codes, without allocating an intermediate xor-ed array, and without
+    holding the GIL
+    """
+    cdef Py_ssize_t n = codes.shape[0]
+    cdef Py_ssize_t n_words = codes.shape[1]
+    _check_words(query.shape[0], n_words)
+    out = np.ndarray(n, dtype=INT_DTYPE)
+    cdef INT_DTYPE_t[:] out_view = out
+    cdef Py_ssize_t i
+    with nogil:
+        for i in range(n):
+            out_view[i] = _xor_popcount(query, codes, i, n_words)
+    return out
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def xor_count_packed_bits_block(
+        const UINT64_DTYPE_t[:, :] queries, const UINT64_DTYPE_t[:, :] codes):
+    """
+    Compute the hamming distance between every pair of packed queries and
+    codes, producing an array of shape (len(queries), len(codes))
+    """
+    cdef Py_ssize_t n_queries = queries.shape[0]
+    cdef Py_ssize_t n = codes.shape[0]
+    cdef Py_ssize_t n_words = codes.shape[1]
+    _check_words(queries.shape[1], n_words)
+    out = np.ndarray((n_queries, n), dtype=UINT16_DTYPE)
+    cdef UINT16_DTYPE_t[:, :] out_view = out
+    cdef Py_ssize_t q, i
+    with nogil:
+        for q in range(n_queries):
+            for i in range(n):
+                out_view[q, i] = _xor_popcount(queries[q], codes, i, n_words)
     return out
 
 
+cdef inline bint _worse(
+        UINT16_DTYPE_t da,
+        INT_DTYPE_t ia,
+        UINT16_DTYPE_t db,
+        INT_DTYPE_t ib) noexcept nogil:
+    return da > db or (da == db and ia > ib)
+
+
+cdef inline void _swap(
+        UINT16_DTYPE_t *d,
+        INT_DTYPE_t *idx,
+        Py_ssize_t a,
+        Py_ssize_t b) noexcept nogil:
+    cdef UINT16_DTYPE_t td = d[a]
+    cdef INT_DTYPE_t ti = idx[a]
+    d[a] = d[b]
+    idx[a] = idx[b]
+    d[b] = td
+    idx[b] = ti
+
+
+cdef void _sift_down(
+        UINT16_DTYPE_t *d,
+        INT_DTYPE_t *idx,
+        Py_ssize_t size,
+        Py_ssize_t pos) noexcept nogil:
+    cdef Py_ssize_t left, right, largest
+    while True:
+        left = 2 * pos + 1
+        right = left + 1
+        largest = pos
+        if left < size and _worse(d[left], idx[left], d[largest], idx[largest]):
+            largest = left
+        if right < size and \
+                _worse(d[right], idx[right], d[largest], idx[largest]):
+            largest = right
+        if largest == pos:
+            return
+        _swap(d, idx, pos, largest)
+        pos = largest
+
+
+cdef void _sift_up(
+        UINT16_DTYPE_t *d, INT_DTYPE_t *idx, Py_ssize_t pos) noexcept nogil:
+    cdef Py_ssize_t parent
+    while pos > 0:
+        parent = (pos - 1) // 2
+        if not _worse(d[pos], idx[pos], d[parent], idx[parent]):
+            return
+        _swap(d, idx, pos, parent)
+        pos = parent
+
+
 @cython.boundscheck(False)
 @cython.wraparound(False)
-def count_packed_bits(np.ndarray[UINT64_DTYPE_t,ndim = 2] n):
-    cdef int ns = n.shape[0]
-    cdef int ns2 = n.shape[1]
-    cdef np.ndarray[INT_DTYPE_t,ndim = 1] out = \
-        np.ndarray(ns,dtype = INT_DTYPE)
-    cdef int i = 0
-    cdef int j = 0
-    cdef UINT64_DTYPE_t z = 0
-    for i in range(ns):
-        z = 0
-        for j in range(ns2):
-            z += __builtin_popcountl(n[i, j]);
-        out[i] = z
-    return out
\ No newline at end of file
+def xor_count_packed_bits_top_k(
+        const UINT64_DTYPE_t[:] query,
+        const UINT64_DTYPE_t[:, :] codes,
+        Py_ssize_t k):
+    """
+    Find the k rows of codes nearest to query, keeping a bounded max-heap of
+    the best candidates so that the full distance vector is never
+    materialized.
+
+    Returns a tuple of (indices, distances), sorted by ascending distance, and
+    then by ascending index
+    """
+    cdef Py_ssize_t n = codes.shape[0]
+    cdef Py_ssize_t n_words = codes.shape[1]
+    _check_words(query.shape[0], n_words)
+    if k < 0:
+        raise ValueError('k must be non-negative')
+    k = min(k, n)
+
+    indices = np.ndarray(k, dtype=INT_DTYPE)
+    distances = np.ndarray(k, dtype=UINT16_DTYPE)
+    if k == 0:
+        return indices, distances
+
+    cdef INT_DTYPE_t[:] indices_view = indices
+    cdef UINT16_DTYPE_t[:] distances_view = distances
+    cdef INT_DTYPE_t *idx = &indices_view[0]
+    cdef UINT16_DTYPE_t *d = &distances_view[0]
+    cdef Py_ssize_t i, size = 0, end
+    cdef UINT16_DTYPE_t z
+
+    with nogil:
+        for i in range(n):
+            z = _xor_popcount(query, codes, i, n_words)
+            if size < k:
+                d[size] = z
+                idx[size] = i
+                _sift_up(d, idx, size)
+                size += 1
+            elif z < d[0]:
+                d[0] = z
+                idx[0] = i
+                _sift_down(d, idx, size, 0)
+
+        # heapsort, which leaves the best candidates at the front
+        for end in range(k - 1, 0, -1):
+            _swap(d, idx, 0, end)
+            _sift_down(d, idx, end, 0)
+
+    return indices, distances
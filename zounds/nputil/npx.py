@@ -1,5 +1,6 @@
 
 
+import os
 import numpy as np
 from numpy.lib.stride_tricks import as_strided as ast
 from countbits import *
@@ -96,8 +97,15 @@ def _wpad(l, windowsize, stepsize):
     if l <= windowsize:
         return windowsize
 
-    nsteps = ((l // stepsize) * stepsize)
     overlap = (windowsize - stepsize)
+    if overlap < 0:
+        # windows are separated by gaps, so pad until the last window
+        # beginning before the end of the array is complete.  Samples in the
+        # final gap are never part of a window
+        last_start = ((l - 1) // stepsize) * stepsize
+        return max(l, last_start + windowsize)
+
+    nsteps = ((l // stepsize) * stepsize)
     if overlap:
         return nsteps + overlap
 
@@ -175,19 +183,163 @@ def windowed(a, windowsize, stepsize=None, dopad=False):
     if 0 == a.shape[0]:
         return leftover, np.zeros(a.shape, dtype=a.dtype)
 
+    return leftover, _strided_windows(a, windowsize, stepsize)
+
+
+def _strided_windows(a, windowsize, stepsize):
+    """
+    Return a view of the contiguous array `a` as overlapping windows, assuming
+    that `a` has already been cut or padded so that no samples are left over
+    """
     n = 1 + (a.shape[0] - windowsize) // (stepsize)
     s = a.strides[0]
     newshape = (n, windowsize) + a.shape[1:]
     newstrides = (stepsize * s, s) + a.strides[1:]
 
-    out = np.ndarray.__new__( \
+    return np.ndarray.__new__( \
         np.ndarray,
         strides=newstrides,
         shape=newshape,
         buffer=a,
         dtype=a.dtype)
 
-    return leftover, out
+
+class StreamingWindower(object):
+    """
+    Produces the same windows as :func:`windowed`, but for a stream of chunks,
+    as though each chunk had been concatenated with the leftover samples from
+    the chunks before it.
+
+    Rather than allocating a new, concatenated (and possibly padded) array for
+    each chunk, samples are copied into a single buffer that is reused for
+    the whole stream, and only grows when a chunk arrives that is larger than
+    any seen before.  Leftover samples are carried over to the beginning of
+    the buffer before the next chunk is written after them.
+
+    Windows are returned as views into the buffer, so they're only valid
+    until the next call to :meth:`append` or :meth:`windows`.  Callers that need to keep them
+    around for longer should copy them.
+
+    Parameters
+        windowsize - the size of each window of samples
+        stepsize   - the number of samples to shift the window each step. If not
+                     specified, this defaults to windowsize
+    """
+
+    def __init__(self, windowsize, stepsize=None):
+        super(StreamingWindower, self).__init__()
+
+        if windowsize < 1:
+            raise ValueError('windowsize must be greater than or equal to one')
+
+        if stepsize is None:
+            stepsize = windowsize
+
+        if stepsize < 1:
+            raise ValueError('stepsize must be greater than or equal to one')
+
+        self.windowsize = windowsize
+        self.stepsize = stepsize
+        self._buffer = None
+        # the unconsumed samples are self._buffer[self._start:self._stop]
+        self._start = 0
+        self._stop = 0
+        # when stepsize is larger than windowsize, the number of samples from
+        # upcoming chunks that fall between windows, and must be dropped
+        self._skip = 0
+
+    def __len__(self):
+        """
+        The number of samples waiting to be windowed
+        """
+        return self._stop - self._start
+
+    @property
+    def leftover(self):
+        """
+        A view of the samples that haven't yet been windowed
+        """
+        if self._buffer is None:
+            return np.zeros(0)
+        return self._buffer[self._start:self._stop]
+
+    def _reserve(self, n_samples, shape, dtype):
+        """
+        Move any leftover samples to the beginning of the buffer, and ensure
+        that there's room for `n_samples` more after them
+        """
+        n_leftover = len(self)
+
+        if self._buffer is None:
+            self._buffer = np.zeros(
+                (max(n_samples, 2 * self.windowsize),) + shape, dtype=dtype)
+        elif n_leftover + n_samples > len(self._buffer):
+            size = max(n_leftover + n_samples, 2 * len(self._buffer))
+            buf = np.zeros(
+                (size,) + self._buffer.shape[1:], dtype=self._buffer.dtype)
+            buf[:n_leftover] = self.leftover
+            self._buffer = buf
+        elif self._start:
+            self._buffer[:n_leftover] = self.leftover
+
+        self._start = 0
+        self._stop = n_leftover
+
+    def append(self, chunk):
+        """
+        Add a chunk of samples to the end of the stream
+        """
+        chunk = np.asarray(chunk)
+        if self._buffer is not None \
+                and chunk.shape[1:] != self._buffer.shape[1:]:
+            raise ValueError(
+                'chunk must have shape (n,) + {shape}'.format(
+                    shape=self._buffer.shape[1:]))
+
+        skipped = min(self._skip, len(chunk))
+        self._skip -= skipped
+        chunk = chunk[skipped:]
+
+        self._reserve(len(chunk), chunk.shape[1:], chunk.dtype)
+        self._buffer[self._stop:self._stop + len(chunk)] = chunk
+        self._stop += len(chunk)
+
+    def windows(self, dopad=False):
+        """
+        Return every complete window that can be formed from the samples
+        appended so far, consuming all samples that won't be needed by later
+        windows.
+
+        Parameters
+            dopad - If true, the remaining samples are padded with zeros so that
+                    all samples are used, as at the end of a stream
+        """
+        if self._buffer is None:
+            raise ValueError('no samples have been appended')
+
+        if dopad and self._skip:
+            # the next window would begin after the end of the stream
+            c, lc = 0, 0
+        elif dopad:
+            n_padded = max(
+                len(self), _wpad(len(self), self.windowsize, self.stepsize))
+            self._reserve(n_padded - len(self), (), None)
+            self._buffer[self._stop:n_padded] = 0
+            self._stop = n_padded
+            c, lc = n_padded, n_padded
+        else:
+            c, lc = _wcut(len(self), self.windowsize, self.stepsize)
+
+        a = self._buffer[self._start:self._start + c]
+        self._skip += max(0, lc - len(self))
+        self._start = min(self._start + lc, self._stop)
+
+        if 0 == c:
+            return np.zeros(
+                (0, self.windowsize) + self._buffer.shape[1:],
+                dtype=self._buffer.dtype)
+
+        return _strided_windows(a, self.windowsize, self.stepsize)
 
 
 def sliding_window(a, ws, ss=None, flatten=True):
@@ -205,7 +357,11 @@ def sliding_window(a, ws, ss=None, flatten=True):
                   extra dimension for each dimension of the input.
 
     Returns
-        an array containing each n-dimensional window from a
+        an array containing each n-dimensional window from a.  When flatten
+        is False, this is a view of a, but flattening overlapping windows
+        copies every one of them.  To reduce each window to a single value, or
+        to multiply windows by a filter bank, without copying them, see
+        sliding_window_reduce and sliding_window_dot
     """
 
     if None is ss:
@@ -255,12 +411,170 @@ def sliding_window(a, ws, ss=None, flatten=True):
     return strided.reshape(dim)
 
 
+def _window_params(a, ws, ss):
+    if None is ss:
+        ss = ws
+    ws = norm_shape(ws)
+    ss = norm_shape(ss)
+
+    if not (len(a.shape) == len(ws) == len(ss)):
+        raise ValueError(
+            'a.shape, ws and ss must all have the same length. They were %s'
+            % str([len(a.shape), len(ws), len(ss)]))
+
+    if np.any(np.array(ws) > np.array(a.shape)):
+        raise ValueError(
+            'ws cannot be larger than a in any dimension. a.shape was %s and '
+            'ws was %s' % (str(a.shape), str(ws)))
+
+    return ws, ss
+
+
+def _sliding_reduce_axis(x, ufunc, axis, windowsize, stepsize):
+    """
+    Reduce every window of windowsize elements along axis with ufunc, in
+    O(log(windowsize)) passes over x.  Each pass doubles the span of the
+    partial reductions, and the spans making up windowsize's binary
+    representation are combined into the result
+    """
+    n = (x.shape[axis] - windowsize) // stepsize + 1
+
+    def take(arr, offset):
+        index = [slice(None)] * arr.ndim
+        index[axis] = slice(offset, offset + stepsize * (n - 1) + 1, stepsize)
+        return arr[tuple(index)]
+
+    def shift(arr, offset):
+        index = [slice(None)] * arr.ndim
+        index[axis] = slice(offset, None)
+        return arr[tuple(index)]
+
+    result = None
+    # partial[i] is the reduction of x[i:i + span]
+    partial = x
+    span = 1
+    offset = 0
+    while span <= windowsize:
+        if windowsize & span:
+            term = take(partial, offset)
+            result = np.array(term) if result is None \
+                else ufunc(result, term, out=result)
+            offset += span
+        if span * 2 <= windowsize:
+            length = partial.shape[axis] - span
+            index = [slice(None)] * partial.ndim
+            index[axis] = slice(0, length)
+            partial = ufunc(partial[tuple(index)], shift(partial, span))
+        span *= 2
+
+    return result
+
+
+_SEPARABLE_REDUCTIONS = {
+    'sum': np.add,
+    'mean': np.add,
+    'max': np.maximum,
+    'min': np.minimum
+}
+
+
+def sliding_window_reduce(a, ws, ss=None, reduction='sum', chunksize=4096):
+    """
+    Reduce each window that sliding_window(a, ws, ss, flatten=False) would
+    produce to a single value, without materializing the windows
+
+    Parameters:
+        a  - an n-dimensional numpy array
+        ws - the size of the window in each dimension, as for sliding_window
+        ss - the step size in each dimension, as for sliding_window
+        reduction - one of sum, mean, max or min, which are computed
+                    directly from a, one axis at a time, or a function that
+                    takes an axis keyword argument, such as np.median, which
+                    is applied to chunksize windows at a time
+        chunksize - the number of windows along the first dimension that are
+                    materialized at once for reductions given as functions
+
+    Returns
+        an array with one value for each window, whose shape is the number of
+        windows in each dimension
+    """
+    a = np.asarray(a)
+    ws, ss = _window_params(a, ws, ss)
+
+    if callable(reduction):
+        windows = sliding_window(a, ws, ss, flatten=False)
+        window_axes = tuple(range(a.ndim, windows.ndim))
+        return np.concatenate([
+            reduction(windows[i: i + chunksize], axis=window_axes)
+            for i in range(0, len(windows), chunksize)])
+
+    try:
+        ufunc = _SEPARABLE_REDUCTIONS[reduction]
+    except KeyError:
+        raise ValueError(
+            'reduction must be one of {names}, or a function'.format(
+                names=', '.join(sorted(_SEPARABLE_REDUCTIONS))))
+
+    if reduction in ('sum', 'mean'):
+        # match the accumulator type numpy would use
+        dtype = getattr(np, reduction)(np.zeros(1, dtype=a.dtype)).dtype
+        a = a.astype(dtype, copy=False)
+
+    result = a
+    for axis, (windowsize, stepsize) in enumerate(zip(ws, ss)):
+        result = _sliding_reduce_axis(
+            result, ufunc, axis, windowsize, stepsize)
+
+    if reduction == 'mean':
+        result /= np.prod(ws)
+
+    return result
+
+
+def sliding_window_dot(a, filters, ss=1, chunksize=4096):
+    """
+    Compute the dot product of every window of the one-dimensional array a with
+    each of filters, without materializing every overlapping window at once.
+    This is equivalent to
+    np.dot(sliding_window(a, filters.shape[1], ss), filters.T)
+
+    Parameters:
+        a - a one-dimensional numpy array
+        filters - a two-dimensional array, with one filter per row
+        ss - the number of samples to slide the window each step
+        chunksize - the number of windows materialized at once
+
+    Returns
+        an array of shape (n_windows, n_filters)
+    """
+    a = np.asarray(a)
+    filters = np.asarray(filters)
+
+    if a.ndim != 1:
+        raise ValueError('a must be one-dimensional')
+
+    if filters.ndim != 2:
+        raise ValueError('filters must be two-dimensional')
+
+    windows = sliding_window(a, filters.shape[1], ss, flatten=False)
+    filters = filters.T
+    dtype = np.result_type(a.dtype, filters.dtype)
+    result = np.empty((len(windows), filters.shape[1]), dtype=dtype)
+    for i in range(0, len(windows), chunksize):
+        np.dot(windows[i: i + chunksize], filters, out=result[i: i + chunksize])
+    return result
+
+
 class Growable(object):
     """
     A thin wrapper around a numpy array that allows it to be treated like a
     dynamically-sized object.  For numeric types, this should be more memory
     efficient than using a list, since members are represented by contiguous
     blocks of memory instead of PyObjects.
+
+    The wrapped array is over-allocated, so that the cost of growing it is
+    amortized over many appends.  Use :meth:`memmap` to create an instance
+    backed by a file, rather than by memory.
     """
 
     def __init__(self, data, position=0, growth_rate=1):
@@ -283,6 +597,73 @@ class Growable(object):
         self._data = data
         self._position = position
         self._growth_rate = growth_rate
+        self._path = None
+
+    @classmethod
+    def memmap(
+            cls,
+            path,
+            dtype,
+            shape=(),
+            initial_size=1024,
+            position=None,
+            growth_rate=1):
+        """
+        Create an instance backed by a memory-mapped file, which is created if
+        it doesn't already exist, and grown as necessary
+
+        :param path: The path of the file
+
+        :param dtype: The dtype of the array's members
+
+        :param shape: The shape of each of the array's members
+
+        :param initial_size: The number of members to allocate room for, if \
+        the file doesn't already exist
+
+        :param position: The logical size of the array.  This defaults to the \
+        number of members already in the file, e.g., after \
+        :meth:`shrink_to_fit`, or zero for a new file
+
+        :param growth_rate: As in the constructor
+        """
+        dtype = np.dtype(dtype)
+        shape = tuple(shape)
+        item_size = dtype.itemsize * int(np.prod(shape, dtype=np.int64))
+
+        try:
+            n_items = os.path.getsize(path) // item_size
+        except OSError:
+            n_items = 0
+
+        if position is None:
+            position = n_items
+
+        growable = cls(
+            cls._map(path, dtype, shape, max(n_items, initial_size)),
+            position=position,
+            growth_rate=growth_rate)
+        growable._path = path
+        return growable
+
+    @staticmethod
+    def _map(path, dtype, shape, n_items):
+        """
+        Resize the file at `path` to hold exactly `n_items` members, and map it
+        into memory
+        """
+        n_bytes = n_items * dtype.itemsize * int(np.prod(shape, dtype=np.int64))
+        with open(path, 'ab') as f:
+            f.truncate(n_bytes)
+        if not n_items:
+            # an empty file can't be memory-mapped
+            return np.zeros((0,) + shape, dtype=dtype)
+        return np.memmap(
+            path, dtype=dtype, mode='r+', shape=(n_items,) + shape)
+
+    @property
+    def is_file_backed(self):
+        return self._path is not None
 
     @property
     def data(self):
@@ -319,14 +700,41 @@ class Growable(object):
         # require that n_items is at least one
         return 1 if not n_items else n_items
 
-    def _tmp(self, amt=None):
-        n_items = self._tmp_size() if None is amt else amt
-        return np.ndarray(
+    def _resize(self, n_items):
+        if self.is_file_backed:
+            self.flush()
+            self._data = self._map(
+                self._path, self._data.dtype, self._data.shape[1:], n_items)
+            return
+
+        # only the initialized part of the array needs to be copied
+        new_data = np.empty(
             (n_items,) + self._data.shape[1:], dtype=self._data.dtype)
+        n_copied = min(self._position, self.physical_size, n_items)
+        new_data[:n_copied] = self._data[:n_copied]
+        self._data = new_data
 
     def _grow(self, amt=None):
-        new_mem = self._tmp(amt=amt)
-        self._data = np.concatenate([self._data, new_mem])
+        amt = self._tmp_size() if amt is None else amt
+        self._resize(self.physical_size + amt)
+
+    def _reserve(self, n_items):
+        """
+        Ensure that there's room for `n_items` more items, growing by at least
+        the growth rate, so that the cost of growing is amortized
+        """
+        pos = self._position + n_items
+        if pos <= self.physical_size:
+            return
+
+        amt = self._tmp_size()
+        if self.physical_size + amt < pos:
+            # growing the memory by the prescribed amount still won't
+            # make enough room. Allocate exactly as much memory as is needed
+            # to accommodate items
+            amt = pos - self.physical_size
+
+        self._grow(amt=amt)
 
     def append(self, item):
         """
@@ -336,7 +744,9 @@ class Growable(object):
         try:
             self._data[self._position] = item
         except IndexError:
-            self._grow()
+            # the array is full.  Checking for this up front would slow down
+            # the common case, where there's room
+            self._reserve(1)
             self._data[self._position] = item
         self._position += 1
         return self
@@ -344,27 +754,37 @@ class Growable(object):
     def extend(self, items):
         """
         extend the numpy array with multiple items, growing the wrapped array
-        if necessary
+        if necessary.  Arrays, including record arrays, are copied into place
+        with a single assignment
         """
-        items = np.array(items)
-        pos = items.shape[0] + self.logical_size
-        if pos > self.physical_size:
-            # more physical memory is needed than has been allocated so far
-            amt = self._tmp_size()
-            if self.physical_size + amt < pos:
-                # growing the memory by the prescribed amount still won't 
-                # make enough room. Allocate exactly as much memory as is needed
-                # to accommodate items
-                amt = pos - self.physical_size
-
-            # actually grow the array
-            self._grow(amt=amt)
-
+        if not isinstance(items, np.ndarray):
+            items = np.array(items)
+        self._reserve(items.shape[0])
         stop = self._position + items.shape[0]
         self._data[self._position: stop] = items
-        self._position += items.shape[0]
+        self._position = stop
         return self
 
+    def shrink_to_fit(self):
+        """
+        Release any memory (or, if file-backed, disk space) allocated beyond
+        the logical size of the array.  Any views of the released part of the
+        array become invalid
+        """
+        n_items = self.logical_size
+        if self.is_file_backed:
+            self._resize(n_items)
+        elif n_items < self.physical_size:
+            self._data = self._data[:n_items].copy()
+        return self
+
+    def flush(self):
+        """
+        Write any changes to a file-backed array to disk
+        """
+        if isinstance(self._data, np.memmap):
+            self._data.flush()
+
 
 def hamming_distance(a, b):
     """
@@ -381,6 +801,35 @@ def packed_hamming_distance(a, b):
 
     Interpret b as an array of "packed" scalars. Its second dimension should be
     the same length as a.
+
+    When a is a single packed scalar, distances are computed without
+    allocating an intermediate xor-ed array.  Otherwise, a and b are
+    broadcast against each other.
     """
+    a = np.asarray(a, dtype=np.uint64)
+    b = np.asarray(b, dtype=np.uint64)
+    if a.ndim == 1 and b.ndim == 2:
+        return xor_count_packed_bits(a, b)
     xored = a ^ b
     return count_packed_bits(xored)
+
+
+def packed_hamming_top_k(a, b, k):
+    """
+    Interpret a and b as in packed_hamming_distance, and find the k elements
+    of b nearest to a, without materializing the full array of distances
+
+    Returns
+        a tuple of (indices, distances), sorted by ascending distance
+    """
+    a = np.asarray(a, dtype=np.uint64).reshape(-1)
+    return xor_count_packed_bits_top_k(a, b, k)
+
+
+def packed_hamming_distances(a, b):
+    """
+    Interpret a and b as arrays of "packed" scalars, as in
+    packed_hamming_distance, and compute the hamming distance between every
+    pair, producing an array of shape (len(a), len(b))
+    """
+    return xor_count_packed_bits_block(a, b)
@@ -1,6 +1,13 @@
 import unittest
+import os
+import shutil
+import tempfile
 import numpy as np
-from .npx import windowed, sliding_window, Growable
+from .npx import \
+    windowed, sliding_window, Growable, packed_hamming_distance, \
+    packed_hamming_distances, packed_hamming_top_k, count_bits, \
+    count_packed_bits, StreamingWindower, sliding_window_reduce, \
+    sliding_window_dot
 
 
 class GrowableTest(unittest.TestCase):
@@ -72,6 +79,81 @@ class GrowableTest(unittest.TestCase):
         self.assertEqual(11, g.logical_size)
         self.assertEqual((20, 3), g._data.shape)
 
+    def test_extend_with_recarray(self):
+        dtype = [('id', 'S4'), ('code', np.uint64, 2)]
+        g = Growable(np.recarray(2, dtype=dtype), 0, 1)
+        records = np.recarray(3, dtype=dtype)
+        records.id = [b'a', b'b', b'c']
+        records.code = np.arange(6).reshape((3, 2))
+        g.extend(records)
+        self.assertEqual(4, g.physical_size)
+        self.assertEqual(3, g.logical_size)
+        self.assertEqual([b'a', b'b', b'c'], g.logical_data['id'].tolist())
+        np.testing.assert_array_equal(
+            np.arange(6).reshape((3, 2)), g.logical_data['code'])
+
+    def test_growth_preserves_logical_data(self):
+        g = Growable(np.zeros(1), 0, 1)
+        for i in range(100):
+            g.append(i)
+        np.testing.assert_array_equal(np.arange(100), g.logical_data)
+        self.assertEqual(128, g.physical_size)
+
+    def test_shrink_to_fit(self):
+        g = Growable(np.zeros(10), 0, 1)
+        g.extend([1, 2, 3])
+        g.shrink_to_fit()
+        self.assertEqual(3, g.physical_size)
+        np.testing.assert_array_equal([1, 2, 3], g.logical_data)
+        g.append(4)
+        np.testing.assert_array_equal([1, 2, 3, 4], g.logical_data)
+
+
+class FileBackedGrowableTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'growable.dat')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_creates_file_with_initial_size(self):
+        g = Growable.memmap(self.path, np.float32, (3,), initial_size=10)
+        self.assertTrue(g.is_file_backed)
+        self.assertEqual(0, g.logical_size)
+        self.assertEqual(10, g.physical_size)
+        self.assertEqual(10 * 3 * 4, os.path.getsize(self.path))
+
+    def test_grows_file(self):
+        g = Growable.memmap(self.path, np.int64, initial_size=4)
+        g.extend(np.arange(10))
+        g.append(10)
+        self.assertEqual(11, g.logical_size)
+        self.assertEqual(g.physical_size * 8, os.path.getsize(self.path))
+        np.testing.assert_array_equal(np.arange(11), g.logical_data)
+
+    def test_can_reopen_after_shrink_to_fit(self):
+        g = Growable.memmap(self.path, np.int64, (2,), initial_size=100)
+        g.extend(np.arange(10).reshape((5, 2)))
+        g.shrink_to_fit()
+        g.flush()
+        self.assertEqual(5 * 2 * 8, os.path.getsize(self.path))
+
+        g = Growable.memmap(self.path, np.int64, (2,))
+        self.assertEqual(5, g.logical_size)
+        np.testing.assert_array_equal(
+            np.arange(10).reshape((5, 2)), g.logical_data)
+
+    def test_can_shrink_empty_array(self):
+        g = Growable.memmap(self.path, np.int64, initial_size=100)
+        g.shrink_to_fit()
+        self.assertEqual(0, os.path.getsize(self.path))
+        g.append(1)
+        np.testing.assert_array_equal([1], g.logical_data)
+
+        g = Growable.memmap(self.path, np.int64)
+        np.testing.assert_array_equal([1], g.logical_data[:1])
+
 
 class SlidingWindowTest(unittest.TestCase):
     def test_mismatched_dims_ws(self):
@@ -129,6 +211,76 @@ class SlidingWindowTest(unittest.TestCase):
         self.assertEqual((5, 5, 4, 4), b.shape)
 
 
+class SlidingWindowReduceTest(unittest.TestCase):
+    def _check(self, shape, ws, ss, reduction, expected):
+        a = np.random.RandomState(0).normal(0, 1, shape)
+        windows = sliding_window(a, ws, ss, flatten=False)
+        axes = tuple(range(a.ndim, windows.ndim))
+        np.testing.assert_allclose(
+            expected(windows, axis=axes),
+            sliding_window_reduce(a, ws, ss, reduction, chunksize=7))
+
+    def test_sum_oned(self):
+        self._check((100,), 11, 1, 'sum', np.sum)
+
+    def test_mean_oned_with_step(self):
+        self._check((100,), 7, 3, 'mean', np.mean)
+
+    def test_max_twod(self):
+        self._check((50, 20), (3, 5), (1, 2), 'max', np.max)
+
+    def test_min_threed(self):
+        self._check((30, 6, 4), (5, 3, 2), (2, 1, 2), 'min', np.min)
+
+    def test_window_the_size_of_the_array(self):
+        self._check((40, 9), (40, 9), (1, 1), 'sum', np.sum)
+
+    def test_large_window(self):
+        self._check((2000,), 513, 256, 'max', np.max)
+
+    def test_function_reduction(self):
+        self._check((100, 4), (11, 4), (1, 4), np.median, np.median)
+
+    def test_integer_sum_does_not_overflow(self):
+        a = np.full(100, 100, dtype=np.int8)
+        result = sliding_window_reduce(a, 10, 10, 'sum')
+        np.testing.assert_array_equal(np.full(10, 1000), result)
+
+    def test_unknown_reduction(self):
+        self.assertRaises(
+            ValueError,
+            lambda: sliding_window_reduce(np.zeros(10), 2, 1, 'prod'))
+
+    def test_mismatched_dims(self):
+        self.assertRaises(
+            ValueError,
+            lambda: sliding_window_reduce(np.zeros((10, 10)), 2, 1))
+
+    def test_window_larger_than_array(self):
+        self.assertRaises(
+            ValueError, lambda: sliding_window_reduce(np.zeros(10), 11, 1))
+
+
+class SlidingWindowDotTest(unittest.TestCase):
+    def test_matches_dot_with_flattened_windows(self):
+        rng = np.random.RandomState(0)
+        a = rng.normal(0, 1, 1000)
+        filters = rng.normal(0, 1, (8, 32))
+        for ss in (1, 5, 32):
+            expected = np.dot(sliding_window(a, 32, ss), filters.T)
+            np.testing.assert_allclose(
+                expected, sliding_window_dot(a, filters, ss, chunksize=100))
+
+    def test_raises_for_multidimensional_input(self):
+        self.assertRaises(
+            ValueError,
+            lambda: sliding_window_dot(np.zeros((10, 2)), np.zeros((2, 3))))
+
+    def test_raises_for_onedimensional_filters(self):
+        self.assertRaises(
+            ValueError, lambda: sliding_window_dot(np.zeros(10), np.zeros(3)))
+
+
 class WindowedTest(unittest.TestCase):
     def test_windowsize_ltone(self):
         a = np.arange(10)
@@ -211,6 +363,13 @@ class WindowedTest(unittest.TestCase):
         self.assertEqual(0, l.shape[0])
         self.assertEqual((1, 6), w.shape)
 
+    def test_stepsize_gt_windowsize_pad_keeps_final_window(self):
+        a = np.arange(10) + 1
+        l, w = windowed(a, 2, 3, dopad=True)
+        self.assertEqual(0, l.shape[0])
+        np.testing.assert_array_equal(
+            [[1, 2], [4, 5], [7, 8], [10, 0]], w)
+
     def test_twod_cut(self):
         a = np.arange(20).reshape((10, 2))
         l, w = windowed(a, 3, 2)
@@ -247,3 +406,199 @@ class WindowedTest(unittest.TestCase):
         l, w = windowed(samples, 8192, 4096)
         self.assertEqual(w.dtype, np.int64)
         self.assertEqual(8192, w.shape[1])
+
+
+class StreamingWindowerTest(unittest.TestCase):
+    def _stream(self, chunks, windowsize, stepsize, dopad_last=True):
+        windower = StreamingWindower(windowsize, stepsize)
+        results = []
+        for i, chunk in enumerate(chunks):
+            windower.append(chunk)
+            dopad = dopad_last and i == len(chunks) - 1
+            results.append(windower.windows(dopad=dopad).copy())
+        return np.concatenate(results)
+
+    def _concatenated(self, chunks, windowsize, stepsize):
+        cache = None
+        results = []
+        for i, chunk in enumerate(chunks):
+            cache = chunk if cache is None else np.concatenate([cache, chunk])
+            cache, w = windowed(
+                cache, windowsize, stepsize, dopad=i == len(chunks) - 1)
+            results.append(w.reshape((-1, windowsize) + chunk.shape[1:]))
+        return np.concatenate(results)
+
+    def test_windowsize_ltone(self):
+        self.assertRaises(ValueError, lambda: StreamingWindower(0, 1))
+
+    def test_stepsize_ltone(self):
+        self.assertRaises(ValueError, lambda: StreamingWindower(1, 0))
+
+    def test_raises_if_no_samples_have_been_appended(self):
+        self.assertRaises(ValueError, lambda: StreamingWindower(2).windows())
+
+    def test_raises_for_chunk_with_wrong_shape(self):
+        windower = StreamingWindower(3, 2)
+        windower.append(np.zeros((10, 2)))
+        self.assertRaises(
+            ValueError, lambda: windower.append(np.zeros((10, 3))))
+
+    def test_not_enough_samples(self):
+        windower = StreamingWindower(8, 4)
+        windower.append(np.arange(5))
+        self.assertEqual((0, 8), windower.windows().shape)
+        self.assertEqual(5, len(windower))
+
+    def test_keeps_leftover_samples(self):
+        windower = StreamingWindower(3, 2)
+        windower.append(np.arange(10))
+        w = windower.windows()
+        self.assertEqual((4, 3), w.shape)
+        np.testing.assert_array_equal([8, 9], windower.leftover)
+
+    def test_matches_windowed_over_concatenated_chunks(self):
+        rng = np.random.RandomState(0)
+        data = rng.normal(0, 1, (1000, 3))
+        for windowsize, stepsize in [(2, 1), (3, 2), (8, 4), (7, 7), (16, 3)]:
+            chunks = np.array_split(data, [10, 11, 250, 600, 601])
+            expected = self._concatenated(chunks, windowsize, stepsize)
+            actual = self._stream(chunks, windowsize, stepsize)
+            np.testing.assert_allclose(expected, actual)
+
+    def test_pads_final_windows(self):
+        w = self._stream([np.arange(10)], 3, 2)
+        self.assertEqual((5, 3), w.shape)
+        np.testing.assert_array_equal([8, 9, 0], w[-1])
+
+    def test_reuses_buffer_once_large_enough(self):
+        windower = StreamingWindower(4, 2)
+        windower.append(np.arange(100))
+        windower.windows()
+        windower.append(np.arange(100))
+        first = windower.windows()
+        windower.append(np.arange(100))
+        second = windower.windows()
+        self.assertTrue(np.shares_memory(first, second))
+
+    def test_drops_samples_between_windows_across_chunks(self):
+        data = np.arange(100)
+        windows = self._stream(
+            np.array_split(data, 7), 2, 5, dopad_last=False)
+        np.testing.assert_array_equal(np.arange(0, 99, 5), windows[:, 0])
+        np.testing.assert_array_equal(np.arange(1, 100, 5), windows[:, 1])
+
+    def test_padded_flush_with_no_leftover_yields_one_padded_window(self):
+        windower = StreamingWindower(4, 4)
+        windower.append(np.arange(8) + 1)
+        self.assertEqual((2, 4), windower.windows().shape)
+        w = windower.windows(dopad=True)
+        np.testing.assert_array_equal([[0, 0, 0, 0]], w)
+
+    def test_pads_final_windows_when_stepsize_exceeds_windowsize(self):
+        data = np.arange(12) + 1
+        windows = self._stream(np.split(data, [1, 6]), 2, 9)
+        _, expected = windowed(data, 2, 9, dopad=True)
+        np.testing.assert_array_equal(expected, windows)
+
+    def test_matches_padded_windowed_when_stepsize_exceeds_windowsize(self):
+        data = np.arange(100) + 1
+        for windowsize, stepsize in [(2, 3), (2, 9), (3, 7), (5, 6)]:
+            for n in [7, 12, 23, 64, 100]:
+                chunks = np.array_split(data[:n], [1, 3, n // 2])
+                _, expected = windowed(
+                    data[:n], windowsize, stepsize, dopad=True)
+                actual = self._stream(chunks, windowsize, stepsize)
+                np.testing.assert_array_equal(expected, actual)
+
+
+class PackedHammingDistancesTest(unittest.TestCase):
+    def test_produces_distance_for_every_pair(self):
+        a = np.random.randint(0, 2 ** 63, (3, 2), dtype=np.uint64)
+        b = np.random.randint(0, 2 ** 63, (5, 2), dtype=np.uint64)
+        distances = packed_hamming_distances(a, b)
+        self.assertEqual((3, 5), distances.shape)
+
+    def test_agrees_with_packed_hamming_distance(self):
+        a = np.random.randint(0, 2 ** 63, (3, 2), dtype=np.uint64)
+        b = np.random.randint(0, 2 ** 63, (5, 2), dtype=np.uint64)
+        distances = packed_hamming_distances(a, b)
+        for i, query in enumerate(a):
+            np.testing.assert_array_equal(
+                packed_hamming_distance(query, b), distances[i])
+
+
+class CountBitsTest(unittest.TestCase):
+    def test_count_bits(self):
+        a = np.array([0, 1, 3, 2 ** 64 - 1], dtype=np.uint64)
+        np.testing.assert_array_equal([0, 1, 2, 64], count_bits(a))
+
+    def test_count_packed_bits(self):
+        a = np.array([[0, 1], [3, 2 ** 64 - 1]], dtype=np.uint64)
+        np.testing.assert_array_equal([1, 66], count_packed_bits(a))
+
+
+class PackedHammingDistanceTest(unittest.TestCase):
+    def setUp(self):
+        self.codes = np.random.randint(0, 2 ** 63, (100, 2), dtype=np.uint64)
+
+    def _expected(self, query, codes):
+        xored = (query ^ codes).view(np.uint8)
+        return np.unpackbits(xored, axis=1).sum(axis=1)
+
+    def test_distances_are_signed(self):
+        distances = packed_hamming_distance(self.codes[0], self.codes)
+        self.assertEqual(np.int64, distances.dtype)
+        self.assertTrue(np.all((distances - distances.max()) <= 0))
+
+    def test_broadcasts_rows_of_a_against_rows_of_b(self):
+        distances = packed_hamming_distance(self.codes[:10], self.codes[10:20])
+        expected = [
+            self._expected(self.codes[i], self.codes[10 + i: 11 + i])[0]
+            for i in range(10)]
+        np.testing.assert_array_equal(expected, distances)
+
+    def test_broadcasts_a_single_row_of_a(self):
+        distances = packed_hamming_distance(self.codes[:1], self.codes)
+        np.testing.assert_array_equal(
+            self._expected(self.codes[0], self.codes), distances)
+
+    def test_distances_are_correct(self):
+        distances = packed_hamming_distance(self.codes[0], self.codes)
+        np.testing.assert_array_equal(
+            self._expected(self.codes[0], self.codes), distances)
+
+    def test_accepts_read_only_and_strided_codes(self):
+        records = np.zeros(100, dtype=[('id', 'S8'), ('code', np.uint64, 2)])
+        records['code'] = self.codes
+        records.flags.writeable = False
+        distances = packed_hamming_distance(self.codes[0], records['code'])
+        np.testing.assert_array_equal(
+            self._expected(self.codes[0], self.codes), distances)
+
+    def test_raises_for_mismatched_code_size(self):
+        self.assertRaises(
+            ValueError,
+            lambda: packed_hamming_distance(self.codes[0, :1], self.codes))
+
+    def test_top_k_is_sorted_and_correct(self):
+        query = self.codes[17]
+        indices, distances = packed_hamming_top_k(query, self.codes, 10)
+        expected = self._expected(query, self.codes)
+        np.testing.assert_array_equal(np.sort(expected)[:10], distances)
+        np.testing.assert_array_equal(expected[indices], distances)
+        self.assertEqual(17, indices[0])
+
+    def test_top_k_breaks_ties_by_index(self):
+        codes = np.zeros((10, 1), dtype=np.uint64)
+        indices, distances = packed_hamming_top_k(codes[0], codes, 4)
+        np.testing.assert_array_equal([0, 1, 2, 3], indices)
+
+    def test_top_k_larger_than_number_of_codes(self):
+        indices, _ = packed_hamming_top_k(self.codes[0], self.codes[:3], 10)
+        self.assertEqual(3, len(indices))
+
+    def test_top_k_with_k_of_zero(self):
+        indices, distances = packed_hamming_top_k(
+            self.codes[0], self.codes, 0)
+        self.assertEqual(0, len(indices))
+
@@ -5,7 +5,7 @@ from zounds.nputil import safe_unit_norm
 from zounds.timeseries import \
     TimeSlice, Picoseconds, TimeDimension, VariableRateTimeSeries, \
     VariableRateTimeSeriesEncoder, VariableRateTimeSeriesDecoder
-from zounds.core import ArrayWithUnits
+from zounds.core import ArrayWithUnits, ArrayWithUnitsBuffer
 
 
 class MeasureOfTransience(Node):
@@ -19,6 +19,7 @@ class MeasureOfTransience(Node):
 
     def __init__(self, needs=None):
         super(MeasureOfTransience, self).__init__(needs=needs)
+        self._cache = ArrayWithUnitsBuffer()
 
     def _first_chunk(self, data):
         data = np.abs(data)
@@ -29,21 +30,14 @@ class MeasureOfTransience(Node):
         return ArrayWithUnits(
             np.concatenate([padding[None, :], data]), data.dimensions)
 
-    # TODO: this pattern of hanging on to the last sample of the previous chunk,
-    # and appending to the next chunk probably happens somewhere else, and
-    # should be generalized
     def _enqueue(self, data, pusher):
-        if self._cache is None:
-            self._cache = data
-        else:
-            self._cache = self._cache.concatenate(data)
+        self._cache.append(data)
 
     def _dequeue(self):
-        data = self._cache
-
-        self._cache = ArrayWithUnits(
-            self._cache[None, -1], self._cache.dimensions)
-
+        # hang on to the last frame, so the ratio between it and the first
+        # frame of the next chunk can be computed
+        data = self._cache.contiguous()
+        self._cache.consume(len(data) - 1)
         return data
 
     def _process(self, data):
@@ -14,7 +14,7 @@ from scipy.signal import resample, firwin2
 from matplotlib import cm
 from scipy.signal import hann, morlet
 from itertools import repeat
-from zounds.nputil import sliding_window
+from zounds.nputil import sliding_window, sliding_window_dot
 
 
 def fft(x, axis=-1, padding_samples=0):
@@ -352,9 +352,8 @@ def auto_correlogram(x, filter_bank, correlation_window=Milliseconds(30)):
     filter_size = filter_bank.shape[1]
 
     corr_win_samples = int(correlation_window / x.samplerate.frequency)
-    windowed = sliding_window(x, filter_size, 1, flatten=False)
-    print(windowed.shape)
-    filtered = np.dot(windowed, filter_bank.T)
+    # overlapping windows are never all materialized at once
+    filtered = sliding_window_dot(x, filter_bank, 1)
     print(filtered.shape)
     corr = sliding_window(
         filtered,
@@ -1,7 +1,8 @@
 import numpy as np
 from featureflow import Node, NotEnoughData
-from zounds.core import ArrayWithUnits
+from zounds.core import ArrayWithUnits, IdentityDimension
 from zounds.timeseries import TimeSlice
+from zounds.nputil import StreamingWindower
 
 
 def oggvorbis(s):
@@ -171,7 +172,8 @@ class SlidingWindow(Node):
         self._scheme = wscheme
         self._func = wfunc
         self._padwith = padwith
-        self._cache = None
+        self._windower = None
+        self._dimensions = None
 
     def _first_chunk(self, data):
         if self._padwith:
@@ -182,27 +184,42 @@ class SlidingWindow(Node):
         else:
             return data
 
+    def _init_windower(self, data):
+        duration = TimeSlice(duration=self._scheme.duration)
+        frequency = TimeSlice(duration=self._scheme.frequency)
+        ws, ss = data._sliding_window_integer_slices(duration, frequency)
+        self._windower = StreamingWindower(ws[0], ss[0])
+
+        # the windowed dimensions don't depend on the size of each chunk, so
+        # they only need to be computed once
+        try:
+            self._dimensions = tuple(data._compute_new_dims(None, ws, ss))
+        except ValueError:
+            self._dimensions = [IdentityDimension()] * (data.ndim + 1)
+
     def _enqueue(self, data, pusher):
-        if self._cache is None:
-            self._cache = data
-        else:
-            self._cache = self._cache.concatenate(data)
+        if self._windower is None:
+            self._init_windower(data)
+        self._windower.append(data)
 
     def _dequeue(self):
-        duration = TimeSlice(duration=self._scheme.duration)
-        frequency = TimeSlice(duration=self._scheme.frequency)
-        leftover, arr = self._cache.sliding_window_with_leftovers(
-            duration,
-            frequency,
-            dopad=self._finalized)
+        if self._windower is None:
+            raise NotEnoughData()
+
+        windows = self._windower.windows(dopad=self._finalized)
 
-        if not arr.size:
+        if not windows.size:
             raise NotEnoughData()
 
-        self._cache = leftover
+        arr = ArrayWithUnits(windows, self._dimensions)
 
         # BUG: Order matters here (try arr * self._func instead)
         # why does that statement result in __rmul__ being called for each
         # scalar value in arr?
         out = (self._func * arr) if self._func else arr
+        # windows are views into a buffer that's reused for the next chunk,
+        # so they must be copied if they're passed along as-is, e.g., by
+        # IdentityWindowingFunc
+        if np.shares_memory(out, windows):
+            out = out.copy()
         return out
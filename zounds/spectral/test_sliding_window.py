@@ -63,6 +63,39 @@ class SlidingWindowTests(unittest2.TestCase):
         self.assertEqual(expected_window_size, ws[0])
         self.assertEqual(expected_step_size, ss[0])
 
+    def test_identity_windowing_func_outputs_survive_the_next_chunk(self):
+        samplerate = SR11025()
+        samples = AudioSamples(np.random.random_sample(8192), samplerate)
+        upstream = SlidingWindow(samplerate * (512, 512))
+        node = SlidingWindow(
+            samplerate * (512, 512),
+            wfunc=IdentityWindowingFunc(),
+            needs=upstream)
+        node._enqueue(samples[:4096], None)
+        first = node._dequeue()
+        expected = np.array(first)
+        node._enqueue(samples[4096:], None)
+        second = node._dequeue()
+        np.testing.assert_array_equal(expected, first)
+        self.assertFalse(np.shares_memory(first, second))
+
+    def test_final_flush_of_exact_multiple_keeps_padded_window(self):
+        samplerate = SR11025()
+        samples = AudioSamples(np.ones(8192), samplerate)
+        upstream = SlidingWindow(samplerate * (512, 512))
+        node = SlidingWindow(samplerate * (512, 512), needs=upstream)
+        frames = []
+        for chunk in (samples[:4096], samples[4096:]):
+            node._enqueue(chunk, None)
+            frames.append(node._dequeue())
+        # the upstream node finishes after its last chunk has been windowed
+        node._enqueued_dependencies.add(id(upstream))
+        node._finalized_dependencies.add(id(upstream))
+        frames.append(node._dequeue())
+        frames = np.concatenate(frames)
+        self.assertEqual((17, 512), frames.shape)
+        np.testing.assert_array_equal(0, frames[-1])
+
     def test_correct_window_and_step_size_at_96000(self):
         self._check(SR96000(), 4096, 2048)
 
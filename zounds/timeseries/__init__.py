@@ -13,7 +13,7 @@ from .samplerate import \
     SR11025, SR16000, SR22050, SR44100, SR48000, SR96000, HalfLapped, \
     audio_sample_rate,Stride, SampleRate, nearest_audio_sample_rate
 
-from .timeseries import TimeSlice, TimeDimension
+from .timeseries import TimeSlice, TimeSliceView, TimeDimension
 
 from .variablerate import \
     VariableRateTimeSeries, VariableRateTimeSeriesFeature, \
@@ -3,6 +3,7 @@ from soundfile import SoundFile
 from io import BytesIO
 from zounds.core import IdentityDimension, ArrayWithUnits
 from .timeseries import TimeDimension, TimeSlice
+from .constantrate import gather
 from .duration import Picoseconds, Seconds
 from .samplerate import SampleRate
 import numpy as np
@@ -135,6 +136,25 @@ class AudioSamples(ArrayWithUnits):
     def from_example(cls, arr, example):
         return cls(arr, example.samplerate)
 
+    def gather(self, time_slices, ragged=False, fill_value=0):
+        """
+        Extract many time slices at once, e.g. to build a batch of training
+        examples
+
+        Args:
+            time_slices (iterable): :class:`TimeSlice` instances, or a
+                :class:`~zounds.timeseries.VariableRateTimeSeries`
+            ragged (bool): when `False`, return a block padded to the length of
+                the longest slice, along with the length of each slice.
+                Otherwise, return `AudioSamples` with all slices concatenated,
+                along with the offset at which each slice begins
+            fill_value: the value used to pad shorter slices
+
+        See Also:
+            :func:`zounds.timeseries.constantrate.gather`
+        """
+        return gather(self, time_slices, ragged, fill_value)
+
     @property
     def channels(self):
         if len(self.shape) == 1:
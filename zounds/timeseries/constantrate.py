@@ -1,5 +1,100 @@
-from .timeseries import TimeDimension, TimeSlice
-from zounds.core import ArrayWithUnits
+import numpy as np
+from .timeseries import TimeDimension, TimeSliceView
+from .duration import _picoseconds
+from zounds.core import ArrayWithUnits, IdentityDimension
+
+
+def _slice_columns(time_slices, time_dimension):
+    """
+    Produce arrays of start times and durations, in integer picoseconds, from
+    a :class:`~zounds.timeseries.VariableRateTimeSeries`, or any iterable of
+    :class:`TimeSlice` instances.  Open-ended slices extend to the end of
+    `time_dimension`
+    """
+    try:
+        return time_slices.starts, time_slices.durations
+    except AttributeError:
+        pass
+
+    time_slices = list(time_slices)
+    starts = np.array(
+        [ts.start_picoseconds for ts in time_slices], dtype=np.int64)
+    end = int(_picoseconds(time_dimension.end))
+    durations = np.array(
+        [end - ts.start_picoseconds if ts.duration is None
+         else ts.duration_picoseconds for ts in time_slices],
+        dtype=np.int64)
+    return starts, durations
+
+
+def gather(arr, time_slices, ragged=False, fill_value=0):
+    """
+    Extract many time slices from `arr` at once, translating them all into
+    integer indices together and copying frames with as few numpy operations
+    as possible, rather than making one `arr[time_slice]` call per slice.
+
+    Args:
+        arr (ArrayWithUnits): an array whose first dimension is a
+            :class:`TimeDimension`
+        time_slices (iterable): :class:`TimeSlice` instances, or a
+            :class:`~zounds.timeseries.VariableRateTimeSeries`
+        ragged (bool): when `False`, slices are returned as a single block,
+            padded to the length of the longest slice.  Otherwise, slices are
+            returned concatenated, along with the offset at which each begins
+        fill_value: the value used to pad slices shorter than the longest one
+
+    Returns:
+        when `ragged` is `False`, a tuple of `(block, lengths)`, where `block`
+        is an :class:`ArrayWithUnits` with a new first dimension, one entry
+        per slice, and `lengths` is the number of frames in each slice.  When
+        `ragged` is `True`, a tuple of `(values, offsets)`, where slice `i` is
+        `values[offsets[i]:offsets[i + 1]]`
+    """
+    td = arr.dimensions[0]
+    starts, durations = _slice_columns(time_slices, td)
+    starts, stops = td.integer_based_slices(starts, durations)
+
+    n_frames = len(arr)
+    starts = np.minimum(starts, n_frames)
+    stops = np.clip(stops, starts, n_frames)
+    lengths = stops - starts
+    raw = np.asarray(arr)
+
+    if ragged:
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        if offsets[-1] > 64 * len(lengths):
+            # for long slices, copying each one is cheaper than building an
+            # index for every frame
+            values = np.concatenate(
+                [raw[start:stop]
+                 for start, stop in zip(starts.tolist(), stops.tolist())])
+        else:
+            indices = np.repeat(starts - offsets[:-1], lengths) \
+                + np.arange(offsets[-1])
+            values = raw[indices]
+        return arr.from_example(values, arr), offsets
+
+    max_length = int(lengths.max()) if len(lengths) else 0
+    block = np.empty(
+        (len(lengths), max_length) + raw.shape[1:], dtype=raw.dtype)
+
+    # slices that begin early enough are rows of a (copy-free) sliding window
+    # over arr, so all of them can be copied with a single fancy index
+    fits = starts <= n_frames - max_length
+    if max_length and fits.any():
+        windows = np.lib.stride_tricks.as_strided(
+            raw,
+            shape=(n_frames - max_length + 1, max_length) + raw.shape[1:],
+            strides=(raw.strides[0],) + raw.strides)
+        block[fits] = windows[starts[fits]]
+    for i in np.where(~fits)[0]:
+        block[i, :lengths[i]] = raw[starts[i]:stops[i]]
+
+    positions = np.arange(max_length)
+    block[positions >= lengths[:, None]] = fill_value
+    dimensions = [IdentityDimension()] + list(arr.dimensions)
+    return ArrayWithUnits(block, dimensions), lengths
 
 
 class ConstantRateTimeSeries(ArrayWithUnits):
@@ -18,7 +113,27 @@ class ConstantRateTimeSeries(ArrayWithUnits):
     def time_dimension(self):
         return self.dimensions[0]
 
-    def iter_slices(self):
+    def timestamps(self):
+        """
+        Compute the start time and duration of every frame at once, returning
+        a tuple of `(starts, durations)` integer picosecond arrays
+        """
         td = self.dimensions[0]
-        for i, data in enumerate(self):
-            yield TimeSlice(duration=td.duration, start=td.frequency * i), data
+        starts = np.arange(len(self), dtype=np.int64) * td.frequency_picoseconds
+        durations = np.full(len(self), td.duration_picoseconds, dtype=np.int64)
+        return starts, durations
+
+    def time_slices(self):
+        """
+        Return a :class:`TimeSliceView` of every frame's time slice
+        """
+        return TimeSliceView(*self.timestamps())
+
+    def iter_slices(self):
+        return zip(self.time_slices(), self)
+
+    def gather(self, time_slices, ragged=False, fill_value=0):
+        """
+        Extract many time slices at once.  See :func:`gather` for details
+        """
+        return gather(self, time_slices, ragged, fill_value)
@@ -118,3 +118,10 @@ class Picoseconds(np.timedelta64):
     """
     def __new__(cls, picoseconds):
         return np.timedelta64(int(picoseconds), 'ps')
+
+
+def _picoseconds(durations):
+    """
+    Convert a duration, or a sequence of durations, to integer picoseconds
+    """
+    return np.asarray(durations, dtype='timedelta64[ps]').astype(np.int64)
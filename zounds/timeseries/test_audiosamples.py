@@ -197,3 +197,29 @@ class AudioSamplesTest(unittest2.TestCase):
         # prior to this test, the line above caused a segfault, so the assertion
         # below is fairly worthless, and mostly a formality
         self.assertIsNotNone(raw)
+
+    def test_gather(self):
+        samples = AudioSamples(
+            np.random.normal(0, 1, 11025 * 5), SR11025())
+        slices = [
+            TimeSlice(start=Seconds(1), duration=Seconds(1)),
+            TimeSlice(start=Seconds(3), duration=Seconds(2)),
+        ]
+        block, lengths = samples.gather(slices)
+        self.assertEqual((2, 22050), block.shape)
+        np.testing.assert_array_equal([11025, 22050], lengths)
+        np.testing.assert_allclose(samples[slices[0]], block[0, :11025])
+        np.testing.assert_allclose(samples[slices[1]], block[1])
+
+    def test_gather_ragged(self):
+        samples = AudioSamples(
+            np.random.normal(0, 1, (11025 * 5, 2)), SR11025())
+        slices = [
+            TimeSlice(start=Seconds(1), duration=Seconds(1)),
+            TimeSlice(start=Seconds(3), duration=Seconds(2)),
+        ]
+        values, offsets = samples.gather(slices, ragged=True)
+        self.assertIsInstance(values, AudioSamples)
+        self.assertEqual(2, values.channels)
+        np.testing.assert_array_equal([0, 11025, 33075], offsets)
+        np.testing.assert_allclose(samples[slices[1]], values[11025:])
@@ -1,7 +1,8 @@
 import unittest2
 from .constantrate import ConstantRateTimeSeries
 from zounds.core import ArrayWithUnits, IdentityDimension
-from zounds.timeseries import TimeDimension, Seconds, Milliseconds, TimeSlice
+from zounds.timeseries import \
+    TimeDimension, Seconds, Milliseconds, TimeSlice, VariableRateTimeSeries
 import numpy as np
 
 
@@ -36,3 +37,81 @@ class ConstantRateTimeSeriesTests(unittest2.TestCase):
         self.assertEqual(
             TimeSlice(start=Milliseconds(500), duration=Seconds(1)), ts2)
         np.testing.assert_allclose(raw[1], d2)
+
+    def _gather_series(self):
+        raw = np.random.random_sample((100, 3))
+        arr = ArrayWithUnits(raw, dimensions=[
+            TimeDimension(frequency=Milliseconds(500), duration=Seconds(1)),
+            IdentityDimension()
+        ])
+        return ConstantRateTimeSeries(arr)
+
+    def _gather_slices(self):
+        return [
+            TimeSlice(start=Seconds(1), duration=Seconds(2)),
+            TimeSlice(start=Seconds(10), duration=Milliseconds(500)),
+            TimeSlice(start=Seconds(45)),
+            TimeSlice(start=Seconds(5), duration=Seconds(5)),
+        ]
+
+    def test_gather_matches_individual_slices(self):
+        crts = self._gather_series()
+        slices = self._gather_slices()
+        block, lengths = crts.gather(slices, fill_value=-1)
+        self.assertEqual((4, max(lengths), 3), block.shape)
+        self.assertIsInstance(block.dimensions[1], TimeDimension)
+        for i, ts in enumerate(slices):
+            expected = crts[ts]
+            length = int(lengths[i])
+            self.assertEqual(len(expected), length)
+            np.testing.assert_allclose(expected, block[i, :length])
+            self.assertTrue(np.all(block[i, length:] == -1))
+
+    def test_gather_ragged_matches_individual_slices(self):
+        crts = self._gather_series()
+        slices = self._gather_slices()
+        values, offsets = crts.gather(slices, ragged=True)
+        self.assertEqual(5, len(offsets))
+        for i, ts in enumerate(slices):
+            np.testing.assert_allclose(
+                crts[ts], values[int(offsets[i]):int(offsets[i + 1])])
+
+    def test_gather_clamps_slices_beyond_end(self):
+        crts = self._gather_series()
+        block, lengths = crts.gather(
+            [TimeSlice(start=Seconds(100), duration=Seconds(1))])
+        np.testing.assert_array_equal([0], lengths)
+        self.assertEqual((1, 0, 3), block.shape)
+
+    def test_gather_with_no_slices(self):
+        crts = self._gather_series()
+        block, lengths = crts.gather([])
+        self.assertEqual((0, 0, 3), block.shape)
+        values, offsets = crts.gather([], ragged=True)
+        self.assertEqual((0, 3), values.shape)
+        np.testing.assert_array_equal([0], offsets)
+
+    def test_gather_variable_rate_time_series(self):
+        crts = self._gather_series()
+        slices = [ts for ts in self._gather_slices() if ts.duration]
+        vrts = VariableRateTimeSeries((ts, np.zeros(0)) for ts in slices)
+        block, lengths = crts.gather(vrts)
+        for i, ts in enumerate(vrts.slices):
+            np.testing.assert_allclose(crts[ts], block[i, :int(lengths[i])])
+
+    def test_timestamps(self):
+        crts = self._gather_series()
+        starts, durations = crts.timestamps()
+        self.assertEqual(np.int64, starts.dtype)
+        self.assertEqual(100, len(starts))
+        self.assertEqual(int(49.5e12), starts[-1])
+        np.testing.assert_array_equal(int(1e12), durations)
+
+    def test_time_slices_match_iter_slices(self):
+        crts = self._gather_series()
+        view = crts.time_slices()
+        self.assertEqual(len(crts), len(view))
+        expected = [ts for ts, _ in crts.iter_slices()]
+        self.assertEqual(expected, list(view))
+        self.assertEqual(
+            TimeSlice(start=Milliseconds(1500), duration=Seconds(1)), view[3])
@@ -1,3 +1,4 @@
+import numpy as np
 import unittest2
 from .timeseries import TimeDimension, TimeSlice
 from .duration import Seconds, Milliseconds
@@ -29,4 +30,59 @@ class TimeDimensionTests(unittest2.TestCase):
     def test_integer_based_slice(self):
         td = TimeDimension(*SR44100(), size=44100 * 5)
         sl = td.integer_based_slice(TimeSlice(duration=Seconds(1)))
-        self.assertEqual(slice(0, 44100), sl)
\ No newline at end of file
+        self.assertEqual(slice(0, 44100), sl)
+    def test_integer_based_slice_of_open_ended_time_slice(self):
+        td = TimeDimension(*SR44100(), size=44100 * 5)
+        sl = td.integer_based_slice(TimeSlice(start=Seconds(4)))
+        self.assertEqual(slice(44100 * 4, 44100 * 5), sl)
+
+    def test_integer_based_slice_ignores_tiny_overlap(self):
+        td = TimeDimension(Seconds(1), size=10)
+        sl = td.integer_based_slice(
+            TimeSlice(start=Seconds(1), duration=Milliseconds(2004)))
+        self.assertEqual(slice(1, 3), sl)
+
+    def test_integer_based_slice_includes_larger_overlap(self):
+        td = TimeDimension(Seconds(1), size=10)
+        sl = td.integer_based_slice(
+            TimeSlice(start=Seconds(1), duration=Milliseconds(2006)))
+        self.assertEqual(slice(1, 4), sl)
+
+    def test_integer_based_slice_with_overlapping_samples(self):
+        td = TimeDimension(Milliseconds(500), Seconds(1), size=10)
+        sl = td.integer_based_slice(
+            TimeSlice(start=Seconds(1), duration=Seconds(1)))
+        self.assertEqual(slice(1, 4), sl)
+
+    def test_integer_based_slices_match_integer_based_slice(self):
+        td = TimeDimension(*SR44100(), size=44100 * 5)
+        slices = [
+            TimeSlice(start=Milliseconds(i * 37), duration=Milliseconds(i))
+            for i in range(1, 100)]
+        starts, stops = td.integer_based_slices(
+            [ts.start for ts in slices], [ts.duration for ts in slices])
+        for ts, start, stop in zip(slices, starts, stops):
+            self.assertEqual(
+                td.integer_based_slice(ts), slice(int(start), int(stop)))
+
+    def test_integer_based_slices_accepts_integer_picoseconds(self):
+        td = TimeDimension(Seconds(1), size=10)
+        starts, stops = td.integer_based_slices(
+            np.array([0, 2, 5]) * int(1e12), np.array([1, 2, 3]) * int(1e12))
+        np.testing.assert_array_equal([0, 2, 5], starts)
+        np.testing.assert_array_equal([1, 4, 8], stops)
+
+    def test_integer_based_slices_extend_to_end_without_durations(self):
+        td = TimeDimension(Seconds(1), size=10)
+        starts, stops = td.integer_based_slices(
+            np.array([0, 2, 5], dtype='timedelta64[s]'))
+        np.testing.assert_array_equal([0, 2, 5], starts)
+        np.testing.assert_array_equal([10, 10, 10], stops)
+
+    def test_picoseconds_are_updated_when_frequency_changes(self):
+        td = TimeDimension(Seconds(1))
+        self.assertEqual(int(1e12), td.frequency_picoseconds)
+        td.frequency = Seconds(2)
+        td.duration = Seconds(2)
+        self.assertEqual(int(2e12), td.frequency_picoseconds)
+        self.assertEqual(int(2e12), td.duration_picoseconds)
@@ -2,7 +2,7 @@ import numpy as np
 import unittest2
 from .duration import \
     Picoseconds, Milliseconds, Seconds, Microseconds, Nanoseconds, Hours
-from .timeseries import TimeSlice, TimeDimension
+from .timeseries import TimeSlice, TimeSliceView, TimeDimension
 from zounds.core import IdentityDimension, ArrayWithUnits
 
 
@@ -153,6 +153,57 @@ class TimeSliceTests(unittest2.TestCase):
         ts2 = TimeSlice(Seconds(2), start=Seconds(3))
         self.assertNotEqual(ts1, ts2)
 
+    def test_integer_picoseconds(self):
+        ts = TimeSlice(Milliseconds(1500), start=Seconds(2))
+        self.assertEqual(int(2e12), ts.start_picoseconds)
+        self.assertEqual(int(1.5e12), ts.duration_picoseconds)
+
+    def test_integer_picoseconds_of_open_ended_slice(self):
+        ts = TimeSlice(start=Seconds(2))
+        self.assertEqual(int(2e12), ts.start_picoseconds)
+        self.assertIsNone(ts.duration_picoseconds)
+
+    def test_integer_picoseconds_are_updated_when_start_changes(self):
+        ts = TimeSlice(Seconds(1), start=Seconds(2))
+        self.assertEqual(int(2e12), ts.start_picoseconds)
+        ts.start = Seconds(3)
+        self.assertEqual(int(3e12), ts.start_picoseconds)
+
+
+
+class TimeSliceViewTests(unittest2.TestCase):
+    def setUp(self):
+        self.view = TimeSliceView(
+            np.arange(5, dtype=np.int64) * int(1e12),
+            np.full(5, int(2e12), dtype=np.int64))
+
+    def test_len(self):
+        self.assertEqual(5, len(self.view))
+
+    def test_raises_for_mismatched_lengths(self):
+        self.assertRaises(
+            ValueError,
+            lambda: TimeSliceView(np.zeros(3), np.zeros(2)))
+
+    def test_integer_index_produces_time_slice(self):
+        self.assertEqual(
+            TimeSlice(start=Seconds(3), duration=Seconds(2)), self.view[3])
+
+    def test_negative_index(self):
+        self.assertEqual(
+            TimeSlice(start=Seconds(4), duration=Seconds(2)), self.view[-1])
+
+    def test_slice_produces_view(self):
+        sliced = self.view[1:3]
+        self.assertIsInstance(sliced, TimeSliceView)
+        self.assertEqual(
+            [TimeSlice(start=Seconds(1), duration=Seconds(2)),
+             TimeSlice(start=Seconds(2), duration=Seconds(2))],
+            list(sliced))
+
+    def test_starts_and_durations_are_timedeltas(self):
+        self.assertEqual(Seconds(2), self.view.starts[2])
+        self.assertEqual(Seconds(2), self.view.durations[2])
 
 class TimeSeriesTests(unittest2.TestCase):
 
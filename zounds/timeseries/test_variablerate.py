@@ -6,7 +6,9 @@ import unittest2
 
 from .duration import Milliseconds
 from .timeseries import TimeSlice
-from .variablerate import VariableRateTimeSeries, VariableRateTimeSeriesFeature
+from .variablerate import \
+    VariableRateTimeSeries, VariableRateTimeSeriesFeature, \
+    VariableRateTimeSeriesEncoder, VariableRateTimeSeriesDecoder
 from zounds.basic import Pooled, stft
 from zounds.segment import TimeSliceFeature
 from zounds.synthesize import NoiseSynthesizer
@@ -233,3 +235,118 @@ class VariableRateTimeSeriesTests(unittest2.TestCase):
         ts = VariableRateTimeSeries(())
         self.assertEqual(Seconds(0), ts.end)
 
+
+    def test_slicing_with_time_slice_matches_brute_force_search(self):
+        rng = np.random.RandomState(0)
+        starts = np.sort(rng.randint(0, 1000, 200))
+        durations = rng.randint(1, 100, 200)
+        ts = VariableRateTimeSeries.from_columns(
+            starts.astype('timedelta64[ms]'),
+            durations.astype('timedelta64[ms]'),
+            np.arange(200))
+        for _ in range(50):
+            start, duration = rng.randint(0, 1100), rng.randint(1, 200)
+            sliced = ts[TimeSlice(
+                start=Milliseconds(start), duration=Milliseconds(duration))]
+            expected = np.where(
+                (starts + durations > start) & (starts < start + duration))[0]
+            np.testing.assert_array_equal(expected, sliced.slicedata)
+
+    def test_can_slice_overlapping_slices_with_time_slice(self):
+        ts = VariableRateTimeSeries((
+            (TimeSlice(start=Seconds(0), duration=Seconds(10)), np.zeros(1)),
+            (TimeSlice(start=Seconds(1), duration=Seconds(1)), np.ones(1)),
+            (TimeSlice(start=Seconds(3), duration=Seconds(1)), np.ones(1)),
+        ))
+        sliced = ts[TimeSlice(start=Seconds(2), duration=Seconds(2))]
+        self.assertEqual(2, len(sliced))
+        self.assertEqual(
+            TimeSlice(start=Seconds(3), duration=Seconds(1)),
+            sliced.slices[1])
+
+    def test_from_columns_accepts_integer_picoseconds(self):
+        ts = VariableRateTimeSeries.from_columns(
+            [int(1e12), 0], [int(1e12), int(1e12)], np.zeros((2, 3)))
+        self.assertEqual(
+            TimeSlice(start=Seconds(0), duration=Seconds(1)), ts.slices[0])
+        self.assertEqual(Seconds(2), ts.end)
+
+    def test_from_columns_raises_for_mismatched_lengths(self):
+        self.assertRaises(
+            ValueError,
+            lambda: VariableRateTimeSeries.from_columns(
+                [0, 1], [1, 1], np.zeros((3, 3))))
+
+    def test_concat_sorts_interleaved_slices(self):
+        ts1 = VariableRateTimeSeries((
+            (TimeSlice(start=Seconds(0), duration=Seconds(1)), np.zeros(1)),
+            (TimeSlice(start=Seconds(2), duration=Seconds(1)), np.zeros(1)),
+        ))
+        ts2 = VariableRateTimeSeries((
+            (TimeSlice(start=Seconds(1), duration=Seconds(1)), np.ones(1)),
+        ))
+        ts3 = ts1.concat(ts2)
+        np.testing.assert_array_equal([[0], [1], [0]], ts3.slicedata)
+
+    def test_repeated_concat_does_not_modify_earlier_instances(self):
+        def chunk(start, value):
+            return VariableRateTimeSeries((
+                (TimeSlice(start=Seconds(start), duration=Seconds(1)),
+                 np.zeros(2) + value),))
+
+        ts = VariableRateTimeSeries(())
+        for i in range(10):
+            ts = ts.concat(chunk(i, i))
+        self.assertEqual(10, len(ts))
+        np.testing.assert_array_equal(np.arange(10), ts.slicedata[:, 0])
+
+        branch1 = ts.concat(chunk(10, 100))
+        branch2 = ts.concat(chunk(10, 200))
+        self.assertEqual(10, len(ts))
+        self.assertEqual(100, branch1.slicedata[-1, 0])
+        self.assertEqual(200, branch2.slicedata[-1, 0])
+        self.assertEqual(Seconds(11), branch1.end)
+
+    def test_integer_index_does_not_build_every_record(self):
+        ts = VariableRateTimeSeries((
+            (TimeSlice(start=Seconds(0), duration=Seconds(1)), np.zeros(2)),
+            (TimeSlice(start=Seconds(1), duration=Seconds(2)), np.ones(2)),
+        ))
+        timeslice, data = ts[-1]
+        self.assertEqual(
+            TimeSlice(start=Seconds(1), duration=Seconds(2)), timeslice)
+        np.testing.assert_array_equal([1, 1], data)
+        self.assertIsNone(ts._slices)
+        self.assertEqual(ts.raw_data[0].timeslice, ts[0].timeslice)
+
+    def test_integer_index_copies_slice_data(self):
+        ts = VariableRateTimeSeries((
+            (TimeSlice(start=Seconds(0), duration=Seconds(1)), np.zeros(2)),
+        ))
+        ts[0].slicedata[:] = 1
+        np.testing.assert_array_equal([[0, 0]], ts.slicedata)
+
+    def test_encoder_and_decoder_roundtrip(self):
+        ts = VariableRateTimeSeries((
+            (TimeSlice(start=Seconds(0), duration=Seconds(1)), np.zeros(3)),
+            (TimeSlice(start=Milliseconds(1500), duration=Picoseconds(7)),
+             np.ones(3)),
+            (TimeSlice(start=Seconds(3), duration=Seconds(1)), np.zeros(3))
+        ))
+        encoded = VariableRateTimeSeriesEncoder()._prepare_data(ts)
+        raw = np.frombuffer(encoded.tobytes(), dtype=encoded.dtype)
+        decoded = VariableRateTimeSeriesDecoder()._wrap_array(raw, None)
+        self.assertIsInstance(decoded, VariableRateTimeSeries)
+        self.assertEqual(list(ts.slices), list(decoded.slices))
+        np.testing.assert_array_equal(ts.slicedata, decoded.slicedata)
+        decoded.slicedata[:] = 2
+
+    def test_timestamps(self):
+        ts = VariableRateTimeSeries((
+            (TimeSlice(start=Seconds(0), duration=Seconds(1)), np.zeros(3)),
+            (TimeSlice(start=Seconds(1), duration=Seconds(2)), np.zeros(3)),
+        ))
+        starts, durations = ts.timestamps()
+        np.testing.assert_array_equal([0, int(1e12)], starts)
+        np.testing.assert_array_equal([int(1e12), int(2e12)], durations)
+        self.assertEqual(list(ts.slices), list(ts.time_slices()))
@@ -1,5 +1,5 @@
 import numpy as np
-from .duration import Picoseconds, Seconds
+from .duration import Picoseconds, Seconds, _picoseconds
 from .samplerate import SampleRate
 from zounds.core import Dimension
 
@@ -45,6 +45,7 @@ class TimeSlice(object):
 
         self.duration = duration
         self.start = start or Picoseconds(0)
+        self._picoseconds = (None, None, None, None)
 
     @classmethod
     def slices(cls, timestamps):
@@ -62,6 +63,32 @@ class TimeSlice(object):
     def end(self):
         return self.start + self.duration
 
+    def _integer_picoseconds(self):
+        start, duration, start_ps, duration_ps = \
+            getattr(self, '_picoseconds', (None, None, None, None))
+        if start is not self.start or duration is not self.duration:
+            start_ps = int(_picoseconds(self.start))
+            duration_ps = None if self.duration is None \
+                else int(_picoseconds(self.duration))
+            self._picoseconds = \
+                (self.start, self.duration, start_ps, duration_ps)
+        return start_ps, duration_ps
+
+    @property
+    def start_picoseconds(self):
+        """
+        The start of this slice, in integer picoseconds
+        """
+        return self._integer_picoseconds()[0]
+
+    @property
+    def duration_picoseconds(self):
+        """
+        The duration of this slice, in integer picoseconds, or `None` if the
+        slice is open-ended
+        """
+        return self._integer_picoseconds()[1]
+
     def __lt__(self, other):
         try:
             return self.start.__lt__(other.start)
@@ -106,10 +133,7 @@ class TimeSlice(object):
         return not self.__eq__(other)
 
     def __hash__(self):
-        start = self.start / Picoseconds(1)
-        duration = \
-            None if self.duration is None else (self.duration / Picoseconds(1))
-        return (start, duration).__hash__()
+        return self._integer_picoseconds().__hash__()
 
     def __repr__(self):
         dur = self.duration / Seconds(1) if self.duration is not None else None
@@ -122,6 +146,72 @@ class TimeSlice(object):
         return self.__repr__()
 
 
+class TimeSliceView(object):
+    """
+    A lightweight, read-only sequence of time slices, backed by arrays of start
+    times and durations in integer picoseconds.  :class:`TimeSlice` instances
+    are only created for the items actually accessed.
+
+    Args:
+        starts (numpy.ndarray): the start of each slice, in integer picoseconds
+        durations (numpy.ndarray): the duration of each slice, in integer
+            picoseconds
+
+    Examples:
+        >>> from zounds import ArrayWithUnits, TimeDimension, Seconds
+        >>> from zounds.timeseries import ConstantRateTimeSeries
+        >>> import numpy as np
+        >>> raw = np.zeros(100)
+        >>> ts = ConstantRateTimeSeries(
+        ...     ArrayWithUnits(raw, [TimeDimension(Seconds(1))]))
+        >>> view = ts.time_slices()
+        >>> len(view)
+        100
+        >>> view[10]
+        TimeSlice(start = 10.0, duration = 1.0)
+    """
+
+    def __init__(self, starts, durations):
+        super(TimeSliceView, self).__init__()
+        if len(starts) != len(durations):
+            raise ValueError(
+                'starts and durations must be the same length, but were '
+                '{a} and {b}'.format(a=len(starts), b=len(durations)))
+        self._starts = starts
+        self._durations = durations
+
+    def __len__(self):
+        return len(self._starts)
+
+    @property
+    def starts(self):
+        """
+        The start time of each slice, as a `numpy.timedelta64` array
+        """
+        return self._starts.view('timedelta64[ps]')
+
+    @property
+    def durations(self):
+        """
+        The duration of each slice, as a `numpy.timedelta64` array
+        """
+        return self._durations.view('timedelta64[ps]')
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return TimeSliceView(self._starts[index], self._durations[index])
+        return TimeSlice(
+            start=Picoseconds(int(self._starts[index])),
+            duration=Picoseconds(int(self._durations[index])))
+
+    def __iter__(self):
+        starts = self._starts.tolist()
+        durations = self._durations.tolist()
+        for start, duration in zip(starts, durations):
+            yield TimeSlice(
+                start=Picoseconds(start), duration=Picoseconds(duration))
+
+
 class TimeDimension(Dimension):
     """
     When applied to an axis of :class:`~zounds.core.ArrayWithUnits`, that axis
@@ -167,8 +257,31 @@ class TimeDimension(Dimension):
                 t=np.timedelta64, t2=duration.__class__))
         self.duration = duration or frequency
         self.frequency = frequency
+        self._picoseconds = (None, None, None, None)
+
+    def _integer_picoseconds(self):
+        frequency, duration, frequency_ps, duration_ps = \
+            getattr(self, '_picoseconds', (None, None, None, None))
+        if frequency is not self.frequency or duration is not self.duration:
+            frequency_ps = int(_picoseconds(self.frequency))
+            duration_ps = int(_picoseconds(self.duration))
+            self._picoseconds = \
+                (self.frequency, self.duration, frequency_ps, duration_ps)
+        return frequency_ps, duration_ps
 
+    @property
+    def frequency_picoseconds(self):
+        """
+        The sampling frequency of this dimension, in integer picoseconds
+        """
+        return self._integer_picoseconds()[0]
 
+    @property
+    def duration_picoseconds(self):
+        """
+        The sampling duration of this dimension, in integer picoseconds
+        """
+        return self._integer_picoseconds()[1]
 
     def __str__(self):
         fs = self.frequency / Picoseconds(int(1e12))
@@ -257,22 +370,62 @@ class TimeDimension(Dimension):
         if not isinstance(ts, TimeSlice):
             return ts
 
-        diff = self.duration - self.frequency
-        start_index = \
-            max(0, np.floor((ts.start - diff) / self.frequency))
-        end = self.end if ts.duration is None else ts.end
+        start = ts.start_picoseconds
+        end = self._end_picoseconds() if ts.duration is None \
+            else start + ts.duration_picoseconds
+        start_index, stop_index = self._index_range(start, end)
+        return slice(max(0, start_index), stop_index)
 
+    def integer_based_slices(self, starts, durations=None):
+        """
+        Transform many time slices into integer indices at once
+
+        Args:
+            starts (numpy.ndarray): the start of each time slice, either as
+                `numpy.timedelta64` values or as integer picoseconds
+            durations (numpy.ndarray): the duration of each time slice, either
+                as `numpy.timedelta64` values or as integer picoseconds.  When
+                not provided, all slices extend to the end of this dimension
+
+        Returns:
+            a tuple of integer arrays, `(start_indices, stop_indices)`
+        """
+        starts = self._as_picoseconds(starts)
+        if durations is None:
+            ends = np.zeros_like(starts) + self._end_picoseconds()
+        else:
+            ends = starts + self._as_picoseconds(durations)
+        start_indices, stop_indices = self._index_range(starts, ends)
+        return np.maximum(0, start_indices), stop_indices
+
+    def _end_picoseconds(self):
+        frequency, duration = self._integer_picoseconds()
+        return (self.size * frequency) + (duration - frequency)
+
+    def _index_range(self, starts, ends):
+        """
+        Compute the index of the first sample overlapped by each time span, and
+        the index just past the last, given integer picoseconds.  This works
+        with python integers and numpy arrays alike
+        """
+        frequency, duration = self._integer_picoseconds()
+        start_indices = (starts - (duration - frequency)) // frequency
 
         # KLUDGE: This is basically arbitrary, but the motivation is that we'd
         # like to differentiate between cases where the slice
         # actually/intentionally overlaps a particular sample, and cases where
         # the slice overlaps the sample by a tiny amount, due to rounding or
-        # lack of precision (e.g. Seconds(1) / SR44100().frequency).
-        ratio = np.round(end / self.frequency, 2)
-
-
-        stop_index = np.ceil(ratio)
-        return slice(int(start_index), int(stop_index))
+        # lack of precision (e.g. Seconds(1) / SR44100().frequency).  Overlaps
+        # of less than half of one percent of a sample are ignored.
+        stop_indices, remainders = divmod(ends, frequency)
+        return start_indices, stop_indices + (remainders * 200 > frequency)
+
+    @staticmethod
+    def _as_picoseconds(x):
+        x = np.asarray(x)
+        if x.dtype.kind == 'm':
+            return _picoseconds(x)
+        return x.astype(np.int64)
 
     def __eq__(self, other):
         return \
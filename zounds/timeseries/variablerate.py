@@ -1,56 +1,197 @@
 import numpy as np
-from .timeseries import TimeSlice
-from .duration import Seconds, Picoseconds
+from .timeseries import TimeSlice, TimeSliceView
+from .duration import Seconds, Picoseconds, _picoseconds
 from featureflow import Feature, BaseNumpyDecoder, NumpyEncoder
-from itertools import chain
+from zounds.nputil import Growable
 
 
 class VariableRateTimeSeries(object):
+    """
+    A sequence of time slices, each with associated data of the same shape and
+    dtype, sorted by start time.
+
+    Start times and durations are stored as columns of integer picoseconds, so
+    slicing with a :class:`TimeSlice` is a bisection, rather than a scan, and
+    :class:`TimeSlice` instances are only created when :attr:`slices` is
+    accessed.
+
+    Args:
+        data (iterable): `(TimeSlice, numpy.ndarray)` pairs, in any order
+    """
+
     def __init__(self, data):
         super(VariableRateTimeSeries, self).__init__()
         if isinstance(data, np.recarray):
-            self._data = data
+            starts = _picoseconds([ts.start for ts in data.timeslice])
+            durations = _picoseconds([ts.duration for ts in data.timeslice])
+            self._init_columns(
+                *self._sorted(starts, durations, data.slicedata))
             return
 
-        data = sorted(list(data), key=lambda x: x[0])
+        data = list(data)
         try:
             example = data[0][1]
-            shape = example.shape
-            dtype = example.dtype
+            slicedata = np.array([x[1] for x in data], dtype=example.dtype)
         except IndexError:
-            shape = (0,)
-            dtype = np.uint8
-        self._data = np.recarray(len(data), dtype=[
-            ('timeslice', TimeSlice),
-            ('slicedata', dtype, shape)])
-        self._data[:] = data
+            slicedata = np.zeros((0, 0), dtype=np.uint8)
+        starts = _picoseconds([x[0].start for x in data])
+        durations = _picoseconds([x[0].duration for x in data])
+        self._init_columns(*self._sorted(starts, durations, slicedata))
+
+    def _init_columns(self, starts, durations, slicedata, growables=None):
+        self._starts = starts
+        self._durations = durations
+        self._slicedata = slicedata
+        # when this instance's columns are the initialized part of these
+        # growable arrays, already-sorted data can be appended in place
+        self._growables = growables
+        self._slices = None
+        self._max_ends = None
+
+    @staticmethod
+    def _sorted(starts, durations, slicedata):
+        if len(starts) and (np.diff(starts) < 0).any():
+            indices = np.argsort(starts, kind='stable')
+            return starts[indices], durations[indices], slicedata[indices]
+        return starts, durations, slicedata
+
+    @classmethod
+    def _from_columns(cls, starts, durations, slicedata, growables=None):
+        ts = cls.__new__(cls)
+        ts._init_columns(starts, durations, slicedata, growables)
+        return ts
+
+    @classmethod
+    def from_columns(cls, starts, durations, slicedata):
+        """
+        Create a new instance directly from start times, durations and
+        slice data, without creating any :class:`TimeSlice` instances
+
+        Args:
+            starts (numpy.ndarray): start times, either as `numpy.timedelta64`
+                values or as integer picoseconds
+            durations (numpy.ndarray): durations, either as `numpy.timedelta64`
+                values or as integer picoseconds
+            slicedata (numpy.ndarray): data for each slice, whose first
+                dimension is the same length as `starts` and `durations`
+        """
+        starts, durations = [
+            _picoseconds(x) if x.dtype.kind == 'm' else x.astype(np.int64)
+            for x in (np.asarray(starts), np.asarray(durations))]
+        slicedata = np.asarray(slicedata)
+        if not (len(starts) == len(durations) == len(slicedata)):
+            raise ValueError(
+                'starts, durations and slicedata must all be the same length, '
+                'but were {a}, {b} and {c}'.format(
+                    a=len(starts), b=len(durations), c=len(slicedata)))
+        return cls._from_columns(*cls._sorted(starts, durations, slicedata))
 
     def __len__(self):
-        return self._data.__len__()
+        return len(self._starts)
 
     def concat(self, other):
-        return VariableRateTimeSeries(
-            chain(self.iter_slices(), other.iter_slices()))
+        """
+        Produce a new instance containing the slices from this instance and
+        `other`.  When `other` begins no earlier than the last slice of this
+        instance, its columns are appended in place, so that repeatedly
+        concatenating chunks of a stream costs time proportional only to the
+        size of each chunk.
+
+        The result may share memory with this instance (and is this instance
+        when `other` is empty), so modifying the result's `slicedata` in
+        place may also modify this instance's.  Appending never changes the
+        slices this instance already holds.  Copy the result before modifying
+        it if both must be independent
+        """
+        if not len(other):
+            return self
+        if not len(self):
+            return other
+
+        if self._slicedata.shape[1:] != other._slicedata.shape[1:]:
+            raise ValueError(
+                'slice data shapes must match, but were {a} and {b}'.format(
+                    a=self._slicedata.shape[1:], b=other._slicedata.shape[1:]))
+
+        if other._starts[0] < self._starts[-1]:
+            return self._from_columns(*self._sorted(
+                np.concatenate([self._starts, other._starts]),
+                np.concatenate([self._durations, other._durations]),
+                np.concatenate([self._slicedata, other._slicedata])))
+
+        growables = self._growables
+        if growables is None or growables[0].logical_size != len(self):
+            # some other instance has already appended to these columns, or
+            # there are none, so begin with a copy
+            growables = [
+                Growable(col.copy(), position=len(self))
+                for col in (self._starts, self._durations, self._slicedata)]
+
+        columns = (other._starts, other._durations, other._slicedata)
+        for growable, col in zip(growables, columns):
+            growable.extend(col)
+        return self._from_columns(
+            *[g.logical_data for g in growables], growables=growables)
+
+    def timestamps(self):
+        """
+        Return a tuple of `(starts, durations)` integer picosecond arrays
+        """
+        return self._starts, self._durations
+
+    def time_slices(self):
+        """
+        Return a :class:`TimeSliceView` of every slice, which avoids
+        creating :class:`TimeSlice` instances that are never accessed
+        """
+        return TimeSliceView(self._starts, self._durations)
 
     def iter_slices(self):
         return zip(self.slices, self.slicedata)
 
+    @property
+    def starts(self):
+        """
+        The start time of each slice, as a `numpy.timedelta64` array
+        """
+        return self._starts.view('timedelta64[ps]')
+
+    @property
+    def durations(self):
+        """
+        The duration of each slice, as a `numpy.timedelta64` array
+        """
+        return self._durations.view('timedelta64[ps]')
+
     @property
     def slices(self):
-        return self._data.timeslice
+        if self._slices is None:
+            self._slices = np.empty(len(self), dtype=object)
+            self._slices[:] = [
+                TimeSlice(start=start, duration=duration)
+                for start, duration in zip(self.starts, self.durations)]
+        return self._slices
 
     @property
     def slicedata(self):
-        return self._data.slicedata
+        return self._slicedata
+
+    def _records(self, n):
+        return np.recarray(n, dtype=[
+            ('timeslice', TimeSlice),
+            ('slicedata', self._slicedata.dtype, self._slicedata.shape[1:])])
 
     @property
     def raw_data(self):
-        return self._data
+        data = self._records(len(self))
+        data.timeslice[:] = self.slices
+        data.slicedata[:] = self._slicedata
+        return data
 
     @property
     def span(self):
         try:
-            start = self._data.timeslice[0].start
+            start = Picoseconds(int(self._starts[0]))
             return TimeSlice(start=start, duration=self.end - start)
         except IndexError:
             return TimeSlice(duration=Seconds(0))
@@ -58,24 +199,56 @@ class VariableRateTimeSeries(object):
     @property
     def end(self):
         try:
-            return self._data.timeslice[-1].end
+            return Picoseconds(int(self._starts[-1] + self._durations[-1]))
         except IndexError:
             return Seconds(0)
 
+    def _overlapping(self, index):
+        """
+        Find the slices that overlap with the `TimeSlice` index, i.e., those
+        that end after it begins, and begin before it ends
+        """
+        start = int(_picoseconds(index.start))
+
+        if index.duration is None:
+            stop = len(self)
+        else:
+            end = start + int(_picoseconds(index.duration))
+            stop = np.searchsorted(self._starts, end, side='left')
+
+        # slices may overlap, so end times aren't necessarily sorted, but the
+        # running maximum of end times is
+        if self._max_ends is None:
+            self._max_ends = np.maximum.accumulate(
+                self._starts + self._durations)
+        begin = np.searchsorted(self._max_ends, start, side='right')
+
+        if begin >= stop:
+            return slice(0, 0)
+
+        mask = self._starts[begin:stop] + self._durations[begin:stop] > start
+        if mask.all():
+            return slice(begin, stop)
+        return np.where(mask)[0] + begin
+
     def __getitem__(self, index):
         if isinstance(index, TimeSlice):
-            # TODO: Consider using a bisection approach here to make this much
-            # faster than this brute-force, O(n) approach
-            # compare the beginning of the index to the _end_ of each sample
-            # compare the end of the index to the beginning of each sample
-            g = ((x.timeslice, x.slicedata) for x in self._data
-                 if x.timeslice.end > index.start and
-                 (index.duration is None or x.timeslice.start < index.end))
-            return VariableRateTimeSeries(g)
+            index = self._overlapping(index)
         elif isinstance(index, int):
-            return self._data[index]
-        else:
-            return VariableRateTimeSeries(self._data[index])
+            index = range(len(self))[index]
+            record = self._records(1)
+            if self._slices is None:
+                record.timeslice[0] = TimeSlice(
+                    start=self.starts[index], duration=self.durations[index])
+            else:
+                record.timeslice[0] = self._slices[index]
+            record.slicedata[0] = self._slicedata[index]
+            return record[0]
+
+        return self._from_columns(*self._sorted(
+            self._starts[index],
+            self._durations[index],
+            self._slicedata[index]))
 
 
 class VariableRateTimeSeriesEncoder(NumpyEncoder):
@@ -88,10 +261,9 @@ class VariableRateTimeSeriesEncoder(NumpyEncoder):
             ('duration', np.int64),
             ('slicedata', data.slicedata.dtype, data.slicedata.shape[1:])
         ])
-        ps = Picoseconds(1)
         output.slicedata[:] = data.slicedata
-        output.start[:] = [ts.start / ps for ts in data.slices]
-        output.duration[:] = [ts.duration / ps for ts in data.slices]
+        output.start[:] = data.starts.view(np.int64)
+        output.duration[:] = data.durations.view(np.int64)
         return output
 
 
@@ -99,15 +271,9 @@ class VariableRateTimeSeriesDecoder(BaseNumpyDecoder):
     def __init__(self):
         super(VariableRateTimeSeriesDecoder, self).__init__()
 
-    def _gen(self, raw):
-        for r in raw:
-            ts = TimeSlice(
-                    start=Picoseconds(r.start),
-                    duration=Picoseconds(r.duration))
-            yield (ts, r.slicedata)
-
     def _wrap_array(self, raw, metadata):
-        return VariableRateTimeSeries(self._gen(raw))
+        return VariableRateTimeSeries.from_columns(
+            raw['start'], raw['duration'], raw['slicedata'].copy())
 
 
 class VariableRateTimeSeriesFeature(Feature):
@@ -73,15 +73,15 @@ class ContentRange(object):
 
     @staticmethod
     def from_timeslice(timeslice, total):
-        one_second = Seconds(1)
+        one_second = 1e12
         stop = None
-        start = timeslice.start / one_second
+        start = timeslice.start_picoseconds / one_second
         if timeslice.duration is not None:
-            stop = start + (timeslice.duration / one_second)
+            stop = start + (timeslice.duration_picoseconds / one_second)
         return ContentRange(
                 'seconds',
-                timeslice.start / one_second,
-                total / one_second,
+                start,
+                total / Seconds(1),
                 stop)
 
     @staticmethod